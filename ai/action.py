@@ -1,3 +1,4 @@
+from __future__ import annotations
 from enum import Enum
 from abc import ABC, abstractmethod
 
@@ -15,10 +16,10 @@ from managers.recipe_manager import recipe_manager as RecipeManager
 
 from managers.pop_manager import pop_manager as PopManager
 from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
+from managers.path_request_manager import path_request_manager as PathRequestManagerInstance
 
-from obj.worldobj.resourcenode import NoResource
 from object_types import Location
-from utils.logger import Logger
+from utils.logger import get_logger
 from world.tile import Tile
 
 class ActionState(Enum):
@@ -27,12 +28,16 @@ class ActionState(Enum):
     DONE = 2
 
 class Action(ABC):
+    # Actions whose conditions or sub-actions depend on what happened while they ran are built again on reset, the others are reset in place
+    rebuild_on_reset: bool = False
+    
     def __init__(self, name: str, entity: Entity, parent_action=None):
         # self.logger.debug("Initialising action %s for entity %s" % (name, entity.name))
         self.name = name
         self.parent_action = parent_action
         
-        self.logger = Logger("ActionType.%s" % name.upper(), logger_manager)
+        # Shared by every action of this name
+        self.logger = get_logger("ActionType.%s" % name.upper(), logger_manager)
         
         self.pop_state = None
         
@@ -42,7 +47,7 @@ class Action(ABC):
         
         self.state = ActionState.INACTIVE
         
-        self.entity = PopManager.get_pop(entity.id)
+        self.entity = entity
         
         self.required_tools = []
         
@@ -68,9 +73,20 @@ class Action(ABC):
     def reset(self):
         self.logger.debug("Resetting action %s" % self, actor=self.entity)
         
-        self.conditions = {"prep": [], "post": []}
         self.deactivate()
         self.retries = 0
+        
+        if self.rebuild_on_reset:
+            self.rebuild()
+        else:
+            self.reset_state()
+    
+    # Puts back what running the action changed, leaving it as it was built. Conditions only read the world and are kept.
+    def reset_state(self):
+        pass
+    
+    def rebuild(self):
+        self.conditions = {"prep": [], "post": []}
         self.determine_conditions()
         self.determine_actions()
     
@@ -140,6 +156,10 @@ class Action(ABC):
     def has_subactions(self):
         return False
     
+    # The move that updating this action would only wait on, None if updating it does more than let the pop walk
+    def get_walking_action(self) -> MoveAction|None:
+        return None
+    
     def check_prep_conditions(self) -> bool:
         for condition in self.conditions["prep"]:
             if condition.check_condition() == False:
@@ -201,6 +221,14 @@ class CompositeAction(Action):
     def add_action(self, action: Action):
         self.actions.append(action)
     
+    def reset_state(self):
+        for action in self.actions:
+            action.reset()
+    
+    def rebuild(self):
+        self.actions = []
+        super().rebuild()
+    
     def start(self) -> bool:
         if not self.is_active():
             self.activate()
@@ -212,6 +240,17 @@ class CompositeAction(Action):
                 return action
         return None
     
+    def get_walking_action(self) -> MoveAction|None:
+        if not self.is_active():
+            return None
+        
+        # Updating only reaches the first unfinished action, which has to be walking itself
+        for action in self.actions:
+            if not action.is_finished():
+                return action.get_walking_action()
+        
+        return None
+    
     def update(self) -> bool:
         result = True
         
@@ -270,16 +309,20 @@ class MoveAction(Action):
         if destination_tile is None:
             return False
         
-        path = world.pathfind(pop=self.entity, target_location=destination_tile.location)
-        
+        # The path is planned with every other pop's after this step's updates, see PathRequestManager
         PopMoveManagerInstance.empty_moves(self.entity)
-        
-        for move in path.moves:
-            PopMoveManagerInstance.move_pop(move)
+        PathRequestManagerInstance.request_path(self.entity, destination_tile.location)
         
         return False # We need to wait for the pop to move
     
+    def get_walking_action(self) -> MoveAction|None:
+        return self if self.is_active() else None
+    
     def update(self):
+        if PathRequestManagerInstance.has_request(self.entity):
+            # The path is not planned yet
+            return True
+        
         move = PopMoveManagerInstance.get_move_for_pop(self.entity)
         
         if move is None:
@@ -329,6 +372,12 @@ class BuildAction(Action):
         return False
 
 class LocateResourceAction(Action):
+    # Number of nearest resource tiles a path is searched for when none was found on start
+    path_candidates: int = 5
+    
+    # Furthest (Manhattan) distance searched for a resource tile
+    max_search_distance: int = 90
+    
     def __init__(self, entity: Entity, resource: Item, parent_action: CompositeAction|None = None):
         self.resource = resource
         self.target_tile = None
@@ -340,6 +389,9 @@ class LocateResourceAction(Action):
     def __str__(self):
         return super().__str__() + ":" + self.resource.name
     
+    def reset_state(self):
+        self.target_tile = None
+    
     def determine_conditions(self):
         # Check if the blackboard has a location for the resource
         max_distance = int(self.entity.world.width / 4)
@@ -368,24 +420,27 @@ class LocateResourceAction(Action):
         target_tile = self.target_tile
         world = self.entity.world
         
-        search_distance = 5
-        
         if target_tile is not None:
             # Add the tile to the blackboard for later actions
             Blackboard.add_resource_location(resource=self.resource, location=target_tile.location)
         else:
-            while target_tile is None and search_distance < 45:
-                search_distance += 5
-                resource_tiles = world.find_tiles_with_resource_near(location=self.entity.location, resource_type=self.resource, distance=search_distance)
+            # Only the closest few tiles are worth a path, a tile much further away in a straight line rarely has the shortest path
+            resource_tiles = world.find_nearest_tiles_with_resource(location=self.entity.location, resource_type=self.resource, count=self.path_candidates, max_distance=self.max_search_distance)
+            
+            for tile in resource_tiles:
+                Blackboard.add_resource_location(resource=self.resource, location=tile.location)
+                
+                locations = world.find_path_locations(self.entity.location, tile.location)
+                
+                # No path, or only part of one from a search that gave up, says nothing about how far the tile really is
+                if not world.is_full_path(locations, tile.location):
+                    continue
                 
-                for tile in resource_tiles:
-                    Blackboard.add_resource_location(resource=self.resource, location=tile.location)
-                    
-                    path = world.pathfind(pop=self.entity, target_location=tile.location)
-                    
-                    if (len(path.moves) < self.shortest_path_length) or target_tile is None:
-                        self.shortest_path_length = len(path.moves)
-                        target_tile = tile
+                path_length = len(locations)
+                
+                if (path_length < self.shortest_path_length) or target_tile is None:
+                    self.shortest_path_length = path_length
+                    target_tile = tile
             
             if target_tile is not None:
                 Blackboard.add_resource_location(resource=self.resource, location=target_tile.location)
@@ -417,7 +472,7 @@ class HarvestAction(Action):
         
         resourcenode = tile.resourcenode
         
-        if type(resourcenode) == type(NoResource()):
+        if not tile.has_resourcenode():
             self.logger.warn("No resource node found at location %s" % str(location), actor=self.entity)
             return False
         else:
@@ -426,11 +481,11 @@ class HarvestAction(Action):
         item = resourcenode.harvestable_resource
         
         # Do checks to see if the pop can harvest the resource with the tool they have
-        if item.harvest_tool is not None and self.gather_tool is not None and self.gather_tool != BareHands() and item.harvest_tool != self.gather_tool:
+        if item.harvest_tool is not None and self.gather_tool is not None and not isinstance(self.gather_tool, BareHands) and item.harvest_tool != self.gather_tool:
             self.logger.warn("Pop does not have the required tool %s to harvest resource %s" % (item.harvest_tool, item.name), actor=self.entity)
             return False
         
-        item_stack = resourcenode.harvest(self.amount)
+        item_stack = tile.harvest_resource(self.amount)
         
         PopManager.give_item_to_pop(pop=self.entity, item=item_stack)
     
@@ -476,7 +531,7 @@ class GatherAction(CompositeAction):
             
             self.add_action(LocateResourceAction(entity=self.entity, resource=item, parent_action=self))
             
-            if self.gather_tool is not None and self.gather_tool != BareHands():
+            if self.gather_tool is not None and not isinstance(self.gather_tool, BareHands):
                 self.add_action(GuaranteeRequiredToolsAction(entity=self.entity, parent_action=self))
             
             self.add_action(MoveAction(entity=self.entity, location=resource_key, parent_action=self))
@@ -553,6 +608,9 @@ class DrinkAction(Action):
         # self.entity.drink(water)
 
 class GuaranteeRequiredToolsAction(CompositeAction):
+    # The tools depend on the resource tile found by the LocateResourceAction before it
+    rebuild_on_reset = True
+    
     def __init__(self, entity: Entity, parent_action: CompositeAction|None = None):
         super().__init__(name="guarantee_required_tools", entity=entity, parent_action=parent_action)
     
@@ -562,6 +620,10 @@ class GuaranteeRequiredToolsAction(CompositeAction):
     def start(self):
         super().start()
     
+    def rebuild(self):
+        self.required_tools = []
+        super().rebuild()
+    
     def determine_conditions(self):
         for tool in self.required_tools:
             item = ItemStack(tool, 1)
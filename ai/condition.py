@@ -1,8 +1,11 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from enum import Enum
+from operator import attrgetter, eq, ge, gt, le, lt
 from typing import List, TYPE_CHECKING
 
+import numpy as np
+
 from obj.item import Item, ItemStack
 
 from managers.pop_manager import pop_manager as PopManager
@@ -12,11 +15,13 @@ from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
 from obj.worldobj.building import Building
 
 from object_types import Location
-from utils.logger import Logger
+from utils.logger import get_logger
 
 from .blackboard import blackboard as Blackboard
 
 if TYPE_CHECKING:
+    import ai.wakeup
+    import obj.worldobj.creatures.pop
     import world
     import world.tile
 
@@ -32,18 +37,39 @@ class PropertyCheckOperator(Enum):
     GREATER_THAN_OR_EQUALS = ">="
     LESS_THAN_OR_EQUALS = "<="
 
+# The comparison behind every operator, works on single values as well as on NumPy arrays
+PROPERTY_CHECK_FUNCTIONS = {
+    PropertyCheckOperator.EQUALS: eq,
+    PropertyCheckOperator.GREATER_THAN: gt,
+    PropertyCheckOperator.LESS_THAN: lt,
+    PropertyCheckOperator.GREATER_THAN_OR_EQUALS: ge,
+    PropertyCheckOperator.LESS_THAN_OR_EQUALS: le,
+}
+
 class CombinedConditionType(Enum):
     AND = "AND"
     OR = "OR"
 
 class Condition(ABC):
+    # Checks every reused outcome against a new check and raises if they differ, for finding a condition with a dependency missing from get_dependencies
+    verify_cache: bool = False
+    
     def __init__(self, type: str):
         self.type = type
         self.inverted = False
         
         self.failure_consequence = ConditionFailureConsequence.REPEAT
         
-        self.logger = Logger(type, logger_manager)
+        # (sim step, dependencies, outcome of check) of the last check, see get_dependencies
+        self.cached_check: tuple[int, tuple, bool]|None = None
+        
+        self.logger = get_logger(type, logger_manager)
+    
+    def __getstate__(self):
+        # Tile versions start over in a loaded world, so a loaded condition checks again
+        state = self.__dict__.copy()
+        state["cached_check"] = None
+        return state
     
     def __str__(self):
         return self.type
@@ -52,6 +78,18 @@ class Condition(ABC):
         return self.inverted
     
     def check_condition(self):
+        dependencies = self.get_dependencies()
+        cached_check = self.cached_check
+        
+        # Goals and actions check the same conditions many times per step, the outcome only changes with its dependencies
+        if dependencies is not None and cached_check is not None and cached_check[0] == logger_manager.sim_step and cached_check[1] == dependencies:
+            check_outcome = cached_check[2]
+            
+            if self.verify_cache and self.check() != check_outcome:
+                raise ValueError("Condition %s changed outcome without a change in its dependencies %s" % (self, dependencies))
+            
+            return self.inverted is not check_outcome
+        
         if self.inverted:
             self.logger.debug("Inverted condition: %s" % self)
         else:
@@ -59,8 +97,20 @@ class Condition(ABC):
         
         check_outcome = self.check()
         self.logger.debug("%s, %s" % ("Yes" if check_outcome else "No", self.outcome_response()))
+        
+        if dependencies is not None:
+            self.cached_check = (logger_manager.sim_step, dependencies, check_outcome)
+        
         return self.inverted is not check_outcome
     
+    # Versions of everything check reads, its outcome is reused within a sim step while they stay the same. None checks every time.
+    def get_dependencies(self) -> tuple|None:
+        return None
+    
+    # Adds what check reads to a sleeping pop's wake watch. False if the condition can not tell, then the pop stays awake.
+    def watch(self, wake_watch: ai.wakeup.WakeWatch) -> bool:
+        return False
+    
     def invert(self):
         self.inverted = True
         return self
@@ -82,6 +132,9 @@ class CombinedCondition(Condition):
     @abstractmethod
     def check(self): ...
     
+    def watch(self, wake_watch: ai.wakeup.WakeWatch) -> bool:
+        return all([condition.watch(wake_watch) for condition in self.conditions])
+    
     def __str__(self):
         str_conditions = [str(condition) for condition in self.conditions]
         str_conditions = ", ".join(str_conditions)
@@ -178,6 +231,9 @@ class SelectorCondition(Condition):
         str_conditions = ", ".join(str_conditions)
         return "SelectorCondition: %s" % str_conditions
     
+    def watch(self, wake_watch: ai.wakeup.WakeWatch) -> bool:
+        return all([condition.watch(wake_watch) for condition in self.conditions])
+    
     def check(self):
         for condition in self.conditions:
             if condition.check_condition():
@@ -201,6 +257,14 @@ class OnLocationCondition(Condition):
     def check(self):
         return self.entity.location == self.location
     
+    def get_dependencies(self) -> tuple|None:
+        return (self.entity.location,)
+    
+    def watch(self, wake_watch: ai.wakeup.WakeWatch) -> bool:
+        # The location changes with every step of a walk, whether it is this one does not
+        wake_watch.watch_outcome(self)
+        return True
+    
     def outcome_response(self):
         return "I am at %s" % str(self.entity.location)
 
@@ -215,6 +279,13 @@ class HasItemsCondition(Condition):
     def __str__(self):
         return "Do I own: %s?" % self.item
     
+    def get_dependencies(self) -> tuple|None:
+        return (self.entity.inventory.version,)
+    
+    def watch(self, wake_watch: ai.wakeup.WakeWatch) -> bool:
+        # A wake watch always compares the version of its own pop's inventory
+        return self.entity is wake_watch.pop
+    
     def check(self):
         target_inventory = self.entity.inventory
         inv_items = target_inventory.items
@@ -262,6 +333,13 @@ class BuildingExistsCondition(Condition):
         
         return building.type == self.building.type
     
+    def get_dependencies(self) -> tuple|None:
+        return (self.target_tile.version,)
+    
+    def watch(self, wake_watch: ai.wakeup.WakeWatch) -> bool:
+        wake_watch.watch_tile(self.target_tile)
+        return True
+    
     def outcome_response(self):
         if self.target_tile.has_building():
             if self.target_tile.building.type == self.building.type:
@@ -290,6 +368,13 @@ class ResourceExistsCondition(Condition):
             return False
         
         return resourcenode.harvestable_resource is self.resource
+    
+    def get_dependencies(self) -> tuple|None:
+        return (self.target_tile.version,)
+    
+    def watch(self, wake_watch: ai.wakeup.WakeWatch) -> bool:
+        wake_watch.watch_tile(self.target_tile)
+        return True
 
 class EntityPropertyCondition(Condition):
     def __init__(self, entity_id: int, property: str, value, operator: PropertyCheckOperator = PropertyCheckOperator.EQUALS):
@@ -298,6 +383,10 @@ class EntityPropertyCondition(Condition):
         self.property = property
         self.value = value
         self.operator = operator
+        
+        # Looked up once, checks only call them. property may be a dotted path.
+        self.get_property = attrgetter(property)
+        self.compare = PROPERTY_CHECK_FUNCTIONS[operator]
     
         self.failure_consequence = ConditionFailureConsequence.ABORT
     
@@ -305,11 +394,22 @@ class EntityPropertyCondition(Condition):
         return "Is my %s %s %s?" % (self.property, self.operator.value, self.value)
     
     def check(self):
-        result = eval("self.entity." + self.property + " " + self.operator.value + " " + str(self.value))
-        return result
+        return self.compare(self.get_property(self.entity), self.value)
+    
+    def watch(self, wake_watch: ai.wakeup.WakeWatch) -> bool:
+        # A property like food changes every step, only crossing the threshold matters
+        wake_watch.watch_outcome(self)
+        return True
+    
+    # This condition's check for every pop in pops at once, as a boolean array. Properties in the pops' attribute store are compared as one array.
+    def check_pops(self, pops: list[obj.worldobj.creatures.pop.Pop]) -> np.ndarray:
+        if PopManager.attributes.is_stored(self.property):
+            return self.compare(PopManager.attributes.get_values(self.property, pops), self.value)
+        
+        return np.array([self.compare(self.get_property(pop), self.value) for pop in pops], dtype=bool)
     
     def outcome_response(self):
-        prop_value = eval("self.entity." + self.property)
+        prop_value = self.get_property(self.entity)
         if self.check():
             return "My %s is %s and thus %s %s" % (self.property, prop_value, self.operator.value, self.value)
         else:
@@ -329,6 +429,11 @@ class BlackboardContainsLocationCondition(Condition):
     def __str__(self):
         return "Do I know about the location of %s?" % self.resource
     
+    def watch(self, wake_watch: ai.wakeup.WakeWatch) -> bool:
+        # Depends on the blackboard and the distance to the pop, checking it is cheaper than tracking both
+        wake_watch.watch_outcome(self)
+        return True
+    
     def check(self):
         resource_locations = Blackboard.get(key="resource_location:" + str(self.resource if type(self.resource) == str else (self.resource.name if isinstance(self.resource, Item) else None)))
         
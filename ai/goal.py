@@ -7,12 +7,12 @@ from obj.worldobj.entity import Entity
 from obj.worldobj.building import Building
 from ai.condition import AndCondition, Condition, BuildingExistsCondition, HasItemsCondition, EntityPropertyCondition, OrCondition, PropertyCheckOperator
 from ai.action import Action, CompositeAction, CraftAxeAction, CraftPickaxeAction, MoveAction, BuildAction, GatherAction
+from ai.wakeup import WakeWatch
 
-from managers.pop_manager import pop_manager as PopManager
 from managers.logger_manager import logger_manager
 
 from object_types import Location
-from utils.logger import Logger
+from utils.logger import get_logger
 
 class GoalType(Enum):
     RANDOM_SEARCH = "Random Search"
@@ -34,6 +34,9 @@ class GoalState(Enum):
 class Goal(ABC):
     actions: List[Action]
     
+    # Goals whose actions depend on the pop's state when they are made build them again on reset, the others reset their actions in place
+    rebuild_on_reset: bool = False
+    
     def __init__(self, type: GoalType):
         self.type = type
         
@@ -42,9 +45,8 @@ class Goal(ABC):
         
         self.fulfilled = False
         
-        self.logger = Logger(str(type), logger_manager)
-        
-        self.entity = PopManager.get_pop(self.entity.id)
+        # Shared by every goal of this type
+        self.logger = get_logger(str(type), logger_manager)
         
         self.priority = GoalPriority.MEDIUM
         
@@ -57,15 +59,19 @@ class Goal(ABC):
     
     def reset(self):
         self.fulfilled = False
-        self.actions = []
-        self.conditions = {"prep": [], "post": []}
-        
         self.tries = 0
         
         self.logger.debug("Goal reset.", actor=self.entity)
         
-        self.determine_conditions()
-        self.determine_actions()
+        if self.rebuild_on_reset or len(self.actions) == 0:
+            self.actions = []
+            self.conditions = {"prep": [], "post": []}
+            
+            self.determine_conditions()
+            self.determine_actions()
+        else:
+            for action in self.actions:
+                action.reset()
     
     def __str__(self):
         return f"Goal: {type(self)} | {self.type}"
@@ -128,9 +134,12 @@ class Goal(ABC):
                 self.logger.debug(f"Action {action} is active, update it.", actor=self.entity)
                 result = action.update()
                 if not result:
-                    is_not_move_action = not isinstance(action, CompositeAction) or not isinstance(action.get_active_action(), MoveAction)
-                    is_not_move_action = is_not_move_action and not isinstance(action, MoveAction)
-                    if is_not_move_action:
+                    # Walking is no failed try, also not inside composite actions nested in composite actions
+                    active_action = action
+                    while isinstance(active_action, CompositeAction):
+                        active_action = active_action.get_active_action()
+                    
+                    if not isinstance(active_action, MoveAction):
                         self.tries += 1
             else:
                 self.logger.debug(f"Action {action} is not active, start it.", actor=self.entity)
@@ -213,6 +222,23 @@ class Goal(ABC):
     def add_post_condition(self, condition: Condition):
         self.conditions["post"].append(condition)
     
+    # The move this goal waits on if executing it would only let the pop walk, see Action.get_walking_action
+    def get_walking_action(self) -> MoveAction|None:
+        for action in self.actions:
+            if not action.is_finished():
+                return action.get_walking_action()
+        
+        return None
+    
+    # Adds the conditions of this goal and its actions to a sleeping pop's wake watch, see Condition.watch
+    def watch(self, wake_watch: WakeWatch) -> bool:
+        conditions = self.conditions["prep"] + self.conditions["post"]
+        
+        for action in self.actions:
+            conditions += action.conditions["prep"] + action.conditions["post"]
+        
+        return all([condition.watch(wake_watch) for condition in conditions])
+    
     @abstractmethod
     def determine_conditions(self): ...
     
@@ -260,6 +286,9 @@ class GatherGoal(Goal):
         self.actions.append(GatherAction(entity=self.entity, target_item=self.itemstack))
 
 class FoodGoal(Goal):
+    # The amount to gather depends on the food when the actions are made
+    rebuild_on_reset = True
+    
     def __init__(self, entity: Entity, min_food_value: int = 70):
         self.entity = entity
         self.min_food_value = min_food_value
@@ -277,6 +306,9 @@ class FoodGoal(Goal):
             self.actions.append(GatherAction(entity=self.entity, target_item=ItemStack(item=Food(), amount=15 + self.min_food_value - self.entity.food)))
 
 class DrinkGoal(Goal):
+    # The amount to gather depends on the water when the actions are made
+    rebuild_on_reset = True
+    
     def __init__(self, entity: Entity, min_food_value: int = 70):
         self.entity = entity
         self.itemstack = (Liquid, 50)
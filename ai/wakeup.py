@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from managers.logger_manager import logger_manager
+from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import ai.condition
+    import obj.worldobj.creatures.pop
+    import world.tile
+    import world.tilemanager
+
+# What the goals of a sleeping pop depend on, see PopGoalManager.sleep. Conditions add the state they read (see Condition.watch):
+# version counters for the pop's inventory and for tiles, and the outcome of conditions that are cheap enough to check every step.
+# has_changed tells if any of it changed, the pop's route ran out or the sleep lasted until wake_step.
+class WakeWatch:
+    def __init__(self, pop: obj.worldobj.creatures.pop.Pop, wake_step: int):
+        self.pop = pop
+        self.wake_step = wake_step
+        
+        self.inventory_version = pop.inventory.version
+        
+        # id of a tile manager -> (tile manager, its version when the pop fell asleep)
+        self.tile_versions: dict[int, tuple[world.tilemanager.TileManager, int]] = {}
+        
+        # Conditions with their outcome when the pop fell asleep
+        self.outcomes: list[tuple[ai.condition.Condition, bool]] = []
+    
+    def watch_tile(self, tile: world.tile.Tile):
+        tile_manager = tile.tile_manager
+        self.tile_versions[id(tile_manager)] = (tile_manager, tile_manager.version)
+    
+    def watch_outcome(self, condition: ai.condition.Condition):
+        self.outcomes.append((condition, condition.check()))
+    
+    def has_changed(self) -> bool:
+        if logger_manager.sim_step >= self.wake_step:
+            return True
+        
+        if self.pop.inventory.version != self.inventory_version:
+            return True
+        
+        if PopMoveManagerInstance.get_move_for_pop(self.pop) is None:
+            return True
+        
+        for tile_manager, version in self.tile_versions.values():
+            if tile_manager.version != version:
+                return True
+        
+        for condition, outcome in self.outcomes:
+            if condition.check() != outcome:
+                return True
+        
+        return False
\ No newline at end of file
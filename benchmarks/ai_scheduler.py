@@ -0,0 +1,83 @@
+import argparse
+import random
+import statistics
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from world.world import world
+from managers.ai_scheduler import ai_scheduler
+from managers.logger_manager import logger_manager
+from managers.pop_manager import pop_manager as PopManager
+from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
+from managers.item_manager import item_manager as ItemManager
+from managers.recipe_manager import recipe_manager as RecipeManager
+
+# Step times for growing populations, with every pop performing its goals every step and with the AIScheduler's budget of goal updates per step.
+# Every run starts from the same world with fresh pops, only the budget differs.
+# Usage: python benchmarks/ai_scheduler.py --pops 20 40 80 --steps 50 --budget 10
+
+def prepare_world(size: int, chunk_size: int, seed: int):
+    world.seed = seed
+    world.set_chunk_size(chunk_size)
+    world.width = size
+    world.height = size
+    world.chunk_manager.lazy = False
+    world.pop_move_manager = PopMoveManagerInstance
+    PopMoveManagerInstance.world = world
+    
+    world.prepare()
+
+def remove_pops():
+    for pop in list(PopManager.get_pops()):
+        PopManager.kill_pop(pop)
+
+def run_steps(pop_count: int, steps: int, seed: int) -> list[float]:
+    remove_pops()
+    
+    rng = random.Random(seed)
+    for _ in range(pop_count):
+        world.add_pop_at((rng.randint(20, world.width - 21), rng.randint(20, world.height - 21)))
+    
+    step_times = []
+    
+    for step in range(steps):
+        start_time = time.perf_counter()
+        world.update()
+        step_times.append(time.perf_counter() - start_time)
+        
+        logger_manager.sim_step += 1
+    
+    return step_times
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark step times with and without an AI budget")
+    parser.add_argument("--pops", type=int, nargs="+", default=[20, 40, 80])
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=10, help="Pops performing their goals per step")
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    ItemManager.register_items()
+    RecipeManager.register_recipes()
+    PopManager.add_pop_move_manager(PopMoveManagerInstance)
+    
+    prepare_world(args.size, args.chunk_size, args.seed)
+    
+    print("%-6s %-10s %10s %10s %10s" % ("pops", "budget", "mean", "p95", "max"))
+    
+    for pop_count in args.pops:
+        for budget in [None, args.budget]:
+            ai_scheduler.set_budget(budget, None)
+            
+            step_times = sorted(run_steps(pop_count, args.steps, args.seed))
+            p95 = step_times[int(0.95 * (len(step_times) - 1))]
+            
+            print("%-6s %-10s %9.1fms %9.1fms %9.1fms" % (pop_count, budget or "none", 1000 * statistics.mean(step_times), 1000 * p95, 1000 * step_times[-1]))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,118 @@
+import argparse
+import hashlib
+import random
+import shutil
+import subprocess
+import sys
+import os
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from world.world import world
+from managers.ai_scheduler import ai_scheduler
+from managers.checkpoint_manager import checkpoint_manager
+from managers.logger_manager import logger_manager
+from managers.path_request_manager import path_request_manager
+from managers.pop_manager import pop_manager as PopManager
+from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
+from managers.item_manager import item_manager as ItemManager
+from managers.recipe_manager import recipe_manager as RecipeManager
+
+# Checks that a run saved part way and resumed from its checkpoint ends in the same state as the run that was never interrupted,
+# with a budget of paths and of goal updates per step so deferred path requests and the AI scheduler's turns have to survive the checkpoint.
+# The resumed run loads in a process of its own, like a simulation started with resume, so nothing carries over from the first run but the checkpoint.
+# Also times saving and loading.
+# The defaults save with a path request pending and the scheduler part way through its turns.
+# Usage: python benchmarks/checkpoint_resume.py --pops 20 --save-step 7 --steps 40 --paths-per-step 2 --goal-updates 7
+
+def prepare_world(size: int, chunk_size: int, seed: int):
+    world.seed = seed
+    world.set_chunk_size(chunk_size)
+    world.width = size
+    world.height = size
+    world.chunk_manager.lazy = False
+    world.pop_move_manager = PopMoveManagerInstance
+    PopMoveManagerInstance.world = world
+    
+    world.prepare()
+
+def run_steps(start: int, end: int):
+    for step in range(start, end):
+        world.update()
+        logger_manager.sim_step = step + 1
+
+def get_pop_state_hash() -> str:
+    pop_state = sorted((pop.name, tuple(pop.location), pop.food, pop.water, str(pop.get_current_goal())) for pop in PopManager.get_pops())
+    
+    return hashlib.md5(str(pop_state).encode()).hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a budgeted run resumes from a checkpoint step for step")
+    parser.add_argument("--pops", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--save-step", type=int, default=7)
+    parser.add_argument("--paths-per-step", type=int, default=2)
+    parser.add_argument("--goal-updates", type=int, default=7, help="Pops performing their goals per step")
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--resume-from", help="Checkpoint directory to resume from, used for the resumed run")
+    args = parser.parse_args()
+    
+    ItemManager.register_items()
+    RecipeManager.register_recipes()
+    PopManager.add_pop_move_manager(PopMoveManagerInstance)
+    
+    path_request_manager.max_paths_per_step = args.paths_per_step
+    ai_scheduler.set_budget(args.goal_updates, None)
+    
+    if args.resume_from is not None:
+        checkpoint_manager.directory = args.resume_from
+        prepare_world(args.size, args.chunk_size, args.seed)
+        
+        start_time = time.perf_counter()
+        start = checkpoint_manager.load(world)
+        load_time = time.perf_counter() - start_time
+        
+        run_steps(start, args.steps)
+        
+        print("%.1f %s" % (1000 * load_time, get_pop_state_hash()))
+        return
+    
+    checkpoint_manager.directory = tempfile.mkdtemp(prefix="checkpoint_resume_")
+    
+    # The uninterrupted run, saving on the way
+    random.seed(args.seed)
+    prepare_world(args.size, args.chunk_size, args.seed)
+    
+    for _ in range(args.pops):
+        world.add_pop_at((random.randint(20, world.width - 21), random.randint(20, world.height - 21)))
+    
+    run_steps(0, args.save_step)
+    
+    pending_requests = len(path_request_manager.requests)
+    
+    start_time = time.perf_counter()
+    checkpoint_manager.save(world, args.save_step)
+    save_time = time.perf_counter() - start_time
+    
+    run_steps(args.save_step, args.steps)
+    uninterrupted_hash = get_pop_state_hash()
+    
+    resumed = subprocess.run([sys.executable, os.path.abspath(__file__)] + sys.argv[1:] + ["--resume-from", checkpoint_manager.directory], capture_output=True, text=True, check=True)
+    load_time, resumed_hash = resumed.stdout.strip().splitlines()[-1].split()
+    
+    shutil.rmtree(checkpoint_manager.directory)
+    
+    print("saved at step %s with %s path requests pending, save %.1fms, load %sms" % (args.save_step, pending_requests, 1000 * save_time, load_time))
+    print("uninterrupted %s" % uninterrupted_hash)
+    print("resumed       %s" % resumed_hash)
+    
+    if resumed_hash != uninterrupted_hash:
+        print("The resumed run differs from the uninterrupted run")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+import argparse
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from world.generator import MapGenerator
+from world.map_gen_method import MapGenerationMethod
+
+# Compares the map generation methods on the same parameters the world uses for its terrain map.
+# Persistence and lacunarity are the MapGenerator.generate_map defaults. The implementations are called directly, so the map cache is never read or written.
+# Usage: python benchmarks/map_generation.py --sizes 128 256 512 --band-sizes 64 256
+
+def time_method(impl: MapGenerationMethod, size: int, chunk_size: int, band_size: int|None, octaves: int, seed: int) -> float:
+    generator = MapGenerator(seed=seed, impl=impl, band_size=band_size)
+    total_map_size = (size, size)
+    
+    start = time.perf_counter()
+    
+    if impl == MapGenerationMethod.SERIAL:
+        generator.gen_serial_impl(total_map_size, chunk_size=chunk_size, octaves=octaves, persistence=0.3, lacunarity=2)
+    elif impl == MapGenerationMethod.CONCURRENT:
+        generator.gen_concurrent_impl(total_map_size, chunk_size=chunk_size, octaves=octaves, persistence=0.3, lacunarity=2)
+    else:
+        generator.gen_vectorized_impl(total_map_size, octaves=octaves, persistence=0.3, lacunarity=2)
+    
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the map generation methods")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128, 256, 512])
+    parser.add_argument("--band-sizes", type=int, nargs="+", default=[64, 256])
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--octaves", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-serial", action="store_true", help="Skip the serial method, which is slow on large maps")
+    args = parser.parse_args()
+    
+    cases = []
+    if not args.skip_serial:
+        cases.append(("serial", MapGenerationMethod.SERIAL, None))
+    cases.append(("concurrent", MapGenerationMethod.CONCURRENT, None))
+    cases.append(("vectorized (whole map)", MapGenerationMethod.VECTORIZED, None))
+    for band_size in args.band_sizes:
+        cases.append(("vectorized (%s rows)" % band_size, MapGenerationMethod.VECTORIZED, band_size))
+    
+    print("%-26s %s" % ("method", " ".join("%10s" % ("%sx%s" % (size, size)) for size in args.sizes)))
+    
+    for label, impl, band_size in cases:
+        timings = [time_method(impl, size, args.chunk_size, band_size, args.octaves, args.seed) for size in args.sizes]
+        print("%-26s %s" % (label, " ".join("%9.3fs" % timing for timing in timings)))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,113 @@
+import argparse
+import math
+import random
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from world.world import world
+from world.pathfinder import grid_pathfinder
+from managers.item_manager import item_manager as ItemManager
+from managers.recipe_manager import recipe_manager as RecipeManager
+
+# Compares plain A* with jump point search (GridPathfinder.search_jump_points) on generated worlds: expanded nodes, wall time and path cost.
+# Queries go between random land tiles, searched within the same padded box World.find_path_locations uses.
+# With --open-terrain every land tile gets the cost of plains, the best case for jump points.
+# Usage: python benchmarks/path_search.py --sizes 256 512 --queries 200
+
+def prepare_world(size: int, chunk_size: int, seed: int, open_terrain: bool):
+    world.seed = seed
+    world.set_chunk_size(chunk_size)
+    world.width = size
+    world.height = size
+    world.chunk_manager.lazy = False
+    
+    world.prepare()
+    
+    if open_terrain:
+        costs = grid_pathfinder.get_cost_array()
+        costs[(costs > 0) & (costs < 1000)] = grid_pathfinder.min_cost
+        grid_pathfinder.uniform = None
+
+def get_queries(size: int, count: int, max_distance: int, seed: int) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+    rng = random.Random(seed)
+    costs = grid_pathfinder.get_cost_array()
+    
+    def random_land_tile(near: tuple[int, int]|None = None) -> tuple[int, int]:
+        while True:
+            if near is None:
+                location = (rng.randrange(size), rng.randrange(size))
+            else:
+                location = ((near[0] + rng.randint(-max_distance, max_distance)) % size, (near[1] + rng.randint(-max_distance, max_distance)) % size)
+            
+            if 0 < costs[location] < 1000:
+                return location
+    
+    queries = []
+    for _ in range(count):
+        start = random_land_tile()
+        queries.append((start, random_land_tile(near=start)))
+    
+    return queries
+
+def get_path_cost(path: list[tuple[int, int]]) -> float:
+    cost = 0.0
+    
+    for (x, y), (next_x, next_y) in zip(path, path[1:]):
+        distance = math.sqrt(2) if x != next_x and y != next_y else 1
+        cost += distance * grid_pathfinder.get_cost(grid_pathfinder.get_node((next_x, next_y)))
+    
+    return cost
+
+def run_queries(queries: list, padding: int, jump_points: bool) -> tuple[int, float, list[float]]:
+    expanded_nodes = 0
+    path_costs = []
+    
+    if jump_points:
+        # Built once per world, not part of any query
+        grid_pathfinder.get_uniform()
+    
+    start_time = time.perf_counter()
+    
+    for start, target in queries:
+        path = grid_pathfinder.find_path(start, target, padding=padding, jump_points=jump_points)
+        
+        expanded_nodes += grid_pathfinder.expanded_nodes
+        path_costs.append(get_path_cost(path))
+    
+    return expanded_nodes, time.perf_counter() - start_time, path_costs
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark A* against jump point search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--max-distance", type=int, default=32, help="Largest offset between start and target on each axis")
+    parser.add_argument("--padding", type=int, default=world.path_search_padding)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--open-terrain", action="store_true", help="Give every land tile the cost of plains")
+    args = parser.parse_args()
+    
+    ItemManager.register_items()
+    RecipeManager.register_recipes()
+    
+    print("%-10s %-14s %12s %10s %12s" % ("world", "finder", "expanded", "time", "cost ratio"))
+    
+    for size in args.sizes:
+        prepare_world(size, args.chunk_size, args.seed, args.open_terrain)
+        queries = get_queries(size, args.queries, args.max_distance, args.seed)
+        
+        astar_expanded, astar_time, astar_costs = run_queries(queries, args.padding, jump_points=False)
+        jump_expanded, jump_time, jump_costs = run_queries(queries, args.padding, jump_points=True)
+        
+        # Both finders are exact, so every ratio should be 1
+        ratios = [jump_cost / astar_cost for astar_cost, jump_cost in zip(astar_costs, jump_costs) if astar_cost > 0]
+        
+        label = "%sx%s" % (size, size)
+        print("%-10s %-14s %12s %9.3fs %12s" % (label, "A*", astar_expanded, astar_time, "1.000"))
+        print("%-10s %-14s %12s %9.3fs %12.3f" % (label, "jump points", jump_expanded, jump_time, max(ratios) if len(ratios) > 0 else 1))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
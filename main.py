@@ -10,6 +10,10 @@ import tkinter as tk
 
 from managers.logger_manager import logger_manager
 from world.world import world, World
+from world.generation_scheduler import generation_scheduler
+from managers.path_request_manager import path_request_manager
+from managers.ai_scheduler import ai_scheduler
+from managers.checkpoint_manager import checkpoint_manager
 from managers.pop_manager import pop_manager as PopManager
 from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
 from managers.recipe_manager import recipe_manager as RecipeManager
@@ -24,8 +28,9 @@ logger = Logger("general", logger_manager)
 with open("config.json", "r") as f:
     config = json.load(f)
 
-def run_simulation(world: World, max_simulation_steps=1000, render=False, render_frequency=1000):
-    step_nr = 0
+def run_simulation(world: World, max_simulation_steps=1000, render=False, render_frequency=1000, checkpoint_frequency=0):
+    # A resumed simulation continues from the step of its checkpoint
+    step_nr = logger_manager.sim_step
     
     sim_seed = world.seed
 
@@ -244,6 +249,9 @@ def run_simulation(world: World, max_simulation_steps=1000, render=False, render
         if not paused:
             step_nr += 1
             logger_manager.sim_step = step_nr
+            
+            if checkpoint_frequency > 0 and step_nr % checkpoint_frequency == 0:
+                checkpoint_manager.save(world, step_nr)
         
         # break
 
@@ -264,17 +272,31 @@ def prep_simulation():
     seed = config["seed"]
     chunk_size = config["chunk_size"]
     
+    # Defaults to one worker per CPU
+    generation_scheduler.set_max_workers(config.get("generation_workers"))
+    
+    # Defaults to planning paths in the simulation's own process
+    path_request_manager.set_max_workers(config.get("path_workers", 0))
+    
+    # Defaults to every pop performing its goals and having its path planned in the step it asks
+    path_request_manager.max_paths_per_step = config.get("max_paths_per_step")
+    ai_scheduler.set_budget(config.get("ai_goal_updates_per_step"), config.get("ai_goal_update_time"))
+    
+    # Lazy chunks are only generated when something uses them, for worlds too large to generate up front
+    world.chunk_manager.lazy = config.get("lazy_chunks", False)
+    world.chunk_manager.max_loaded_chunks = config.get("max_loaded_chunks")
+    
     # Import all recipes from the recipes.json file
     ItemManager.register_items()
     RecipeManager.register_recipes()
     
     # TODO: Generate worlds in different sizes to test the performance of the world generation algorithm
     
-    world = prep_world(world_width, world_height, initial_pop_count, seed, chunk_size)
+    world = prep_world(world_width, world_height, initial_pop_count, seed, chunk_size, resume=config.get("resume", False))
 
     return world
 
-def prep_world(width, height, initial_pop_count, seed, chunk_size):
+def prep_world(width, height, initial_pop_count, seed, chunk_size, resume=False):
     pop_move_manager = PopMoveManagerInstance
     
     PopManager.add_pop_move_manager(pop_move_manager)
@@ -291,6 +313,11 @@ def prep_world(width, height, initial_pop_count, seed, chunk_size):
     
     world.prepare()
     
+    if resume and checkpoint_manager.has_checkpoint(world):
+        # Pops come from the checkpoint instead
+        checkpoint_manager.load(world)
+        return world
+    
     for i in range(initial_pop_count):
         world.add_pop_at((random.randint(20, world.width-21), random.randint(20, world.height-21)))
     
@@ -299,12 +326,19 @@ def prep_world(width, height, initial_pop_count, seed, chunk_size):
 def main():
     world = prep_simulation()
     
+    # Generation is done, free the worker processes before the simulation starts
+    generation_scheduler.shutdown()
+    
     max_simulation_steps = config["max_simulation_steps"]
     render_frequency = config["render_frequency"]
     
     do_render = True # Set to True to render each step of the simulation to an image file
 
-    run_simulation(world, max_simulation_steps=max_simulation_steps, render=do_render, render_frequency=render_frequency)
+    checkpoint_frequency = config.get("checkpoint_frequency", 0)
+    
+    run_simulation(world, max_simulation_steps=max_simulation_steps, render=do_render, render_frequency=render_frequency, checkpoint_frequency=checkpoint_frequency)
+    
+    path_request_manager.shutdown()
 
     logger.info("Simulation complete")
 
@@ -336,4 +370,3 @@ if __name__ == "__main__":
             print("Finished printing stats")
     else:
         main()
-
@@ -0,0 +1,148 @@
+from __future__ import annotations
+import time
+
+from typing import TYPE_CHECKING
+
+from utils.logger import Logger
+
+from .logger_manager import logger_manager
+
+if TYPE_CHECKING:
+    import obj.worldobj.creatures.pop
+    import obj.worldobj.creatures.popattributes
+
+# Decides which pops perform their goals in a step. Performing goals is where pops plan, search for resources and ask for paths,
+# so with a budget set only that many pops do it per step and the others wait for a later step. Pops that are urgent go first, up to
+# urgent_share of the budget: those running low on food or water and those with a goal of high priority. The rest of the budget goes to
+# every pop in turn, in the order of the pop list and continuing each step where the last one stopped. Counting down food and water and eating are not scheduled, see Pop.update.
+class AIScheduler:
+    # Most pops performing their goals per step, None for no limit
+    max_goal_updates: int|None = None
+    
+    # Seconds per step to spend on performing goals, None for no limit. Turned into a number of pops from the average time a pop took so far.
+    max_goal_update_time: float|None = None
+    
+    # Pops with less food or water than this are urgent, the amount FoodGoal and WaterGoal start at by default
+    urgent_food: int = 70
+    
+    # Part of the budget urgent pops can take before the others get their turn
+    urgent_share: float = 0.5
+    
+    # Weight of the last step in the average time per pop
+    time_smoothing: float = 0.1
+    
+    def __init__(self):
+        # Index in the pop list where the next step continues taking turns
+        self.next_index = 0
+        
+        # Average seconds one pop took to perform its goals
+        self.average_update_time: float|None = None
+        
+        # Time spent on performing goals this step and the number of pops it was spent on
+        self.step_update_time = 0.0
+        self.step_update_count = 0
+        
+        self.logger = Logger("ai_scheduler", logger_manager)
+    
+    def set_budget(self, max_goal_updates: int|None, max_goal_update_time: float|None):
+        self.max_goal_updates = max_goal_updates
+        self.max_goal_update_time = max_goal_update_time
+    
+    # Where the turns and the time per pop stand, so a resumed run schedules the same pops as the run it was saved from. The budget itself comes from the config.
+    def get_state(self) -> dict:
+        return {
+            "next_index": self.next_index,
+            "average_update_time": self.average_update_time,
+            "step_update_time": self.step_update_time,
+            "step_update_count": self.step_update_count,
+        }
+    
+    def load_state(self, state: dict):
+        self.next_index = state["next_index"]
+        self.average_update_time = state["average_update_time"]
+        self.step_update_time = state["step_update_time"]
+        self.step_update_count = state["step_update_count"]
+    
+    def get_update_limit(self) -> int|None:
+        limits = []
+        
+        if self.max_goal_updates is not None:
+            limits.append(self.max_goal_updates)
+        
+        if self.max_goal_update_time is not None and self.average_update_time is not None and self.average_update_time > 0:
+            # At least one pop per step, or the average would never be measured again
+            limits.append(max(1, int(self.max_goal_update_time / self.average_update_time)))
+        
+        return min(limits) if len(limits) > 0 else None
+    
+    # Ids of the pops that perform their goals this step, None if every pop does
+    def schedule(self, pops: list[obj.worldobj.creatures.pop.Pop], attributes: obj.worldobj.creatures.popattributes.PopAttributeStore) -> set[int]|None:
+        limit = self.get_update_limit()
+        
+        if limit is None or len(pops) == 0:
+            return None
+        
+        start = self.next_index % len(pops)
+        indices = list(range(start, len(pops))) + list(range(start))
+        
+        hungry = (attributes.get_values("food", pops) < self.urgent_food) | (attributes.get_values("water", pops) < self.urgent_food)
+        hungry = hungry.tolist()
+        
+        urgent = [index for index in indices if hungry[index] or pops[index].pop_goal_manager.has_urgent_goal()]
+        
+        scheduled = set()
+        
+        # Urgent pops first, within their share so the other pops still get turns, then everyone in turn
+        for index in urgent:
+            if len(scheduled) >= max(1, int(limit * self.urgent_share)):
+                break
+            
+            if self.can_schedule(pops[index]):
+                scheduled.add(pops[index].id)
+        
+        for index in indices:
+            if len(scheduled) >= limit:
+                break
+            
+            if pops[index].id not in scheduled and self.can_schedule(pops[index]):
+                scheduled.add(pops[index].id)
+                self.next_index = index + 1
+        
+        deferred = len(pops) - len(scheduled)
+        if deferred > 0:
+            self.logger.debug("Scheduled %s pops, %s urgent, %s wait or sleep" % (len(scheduled), len(urgent), deferred))
+        
+        return scheduled
+    
+    def can_schedule(self, pop: obj.worldobj.creatures.pop.Pop) -> bool:
+        # Sleeping pops do not perform their goals anyway
+        return not pop.pop_goal_manager.is_asleep()
+    
+    def perform_goals(self, pop: obj.worldobj.creatures.pop.Pop):
+        # A pop that is only walking skips its goals until something they depend on changes, see PopGoalManager.sleep
+        if pop.pop_goal_manager.is_asleep():
+            return
+        
+        if self.max_goal_update_time is None:
+            pop.update_goals()
+            return
+        
+        started = time.perf_counter()
+        pop.update_goals()
+        self.step_update_time += time.perf_counter() - started
+        self.step_update_count += 1
+    
+    def finish_step(self):
+        if self.step_update_count > 0:
+            update_time = self.step_update_time / self.step_update_count
+            
+            if self.average_update_time is None:
+                self.average_update_time = update_time
+            else:
+                self.average_update_time += self.time_smoothing * (update_time - self.average_update_time)
+        
+        self.step_update_time = 0.0
+        self.step_update_count = 0
+
+
+ai_scheduler = AIScheduler()
\ No newline at end of file
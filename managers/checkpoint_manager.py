@@ -0,0 +1,239 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import importlib
+import json
+import os
+import pickle
+import random
+import shutil
+
+import numpy as np
+
+from ai.blackboard import blackboard as Blackboard
+from managers.pop_manager import pop_manager as PopManager
+from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
+from managers.path_request_manager import path_request_manager as PathRequestManagerInstance
+from managers.ai_scheduler import ai_scheduler
+from managers.logger_manager import logger_manager
+
+from world.io import save_chunk_state, load_chunk_state
+from world.tilestore import RESOURCE_NODE_TYPES, BUILDING_TYPES, register_type
+
+from utils.logger import Logger
+
+if TYPE_CHECKING:
+    import world
+    import world.chunk
+
+CHECKPOINT_VERSION = 4
+
+# Writes the simulation to disk and restores it again.
+# A checkpoint directory holds one file per chunk, a pickle of the pops, their attributes, routes and pending path requests, the AI scheduler's turns and the blackboard, and an index telling which checkpoint holds each chunk's latest file.
+# Only chunks that changed since the previous checkpoint are written, every other chunk keeps pointing at the file of an earlier checkpoint.
+# Files are never overwritten: manifest.json is replaced last and decides which checkpoint is current, files it no longer refers to are removed afterwards.
+class CheckpointManager:
+    def __init__(self, directory="checkpoints"):
+        self.directory = directory
+        
+        # Number of the last checkpoint written or loaded in this run, -1 if there is none
+        self.checkpoint_number = -1
+        # Per chunk, the number of the checkpoint that holds its latest file, -1 if it was never written
+        self.chunk_checkpoints: np.ndarray|None = None
+        
+        # Maps type ids in the loaded checkpoint's chunk files to the ids of this run
+        self.resource_id_map: np.ndarray|None = None
+        self.building_id_map: np.ndarray|None = None
+        
+        self.logger = Logger("checkpoint_manager", logger_manager)
+    
+    def get_world_directory(self, world: world.World) -> str:
+        return os.path.join(self.directory, "%s_%sx%s" % (world.seed, world.width, world.height))
+    
+    def get_chunk_file_path(self, world: world.World, chunk_x: int, chunk_y: int, number: int) -> str:
+        return os.path.join(self.get_world_directory(world), "chunks", "%s_%s_%s.chunk" % (chunk_x, chunk_y, number))
+    
+    def get_manifest_path(self, world: world.World) -> str:
+        return os.path.join(self.get_world_directory(world), "manifest.json")
+    
+    def has_checkpoint(self, world: world.World) -> bool:
+        return os.path.exists(self.get_manifest_path(world))
+    
+    def get_type_names(self, types: list[type]) -> list[str]:
+        # Index 0 is always "nothing" and is never looked up
+        return [""] + ["%s:%s" % (object_type.__module__, object_type.__qualname__) for object_type in types[1:]]
+    
+    def get_type_id_map(self, type_names: list[str], types: list[type]) -> np.ndarray:
+        id_map = np.zeros(max(len(type_names), 1), dtype=np.uint8)
+        
+        for saved_id, type_name in enumerate(type_names[1:], start=1):
+            module_name, qualname = type_name.split(":")
+            
+            object_type = importlib.import_module(module_name)
+            for name in qualname.split("."):
+                object_type = getattr(object_type, name)
+            
+            id_map[saved_id] = register_type(types, object_type)
+        
+        return id_map
+    
+    def save(self, world: world.World, step: int):
+        world_directory = self.get_world_directory(world)
+        chunks = world.chunk_manager.chunks
+        
+        if self.chunk_checkpoints is None:
+            # A new run starts a new series of checkpoints, the chunk files of an earlier run are not part of it
+            if os.path.exists(world_directory):
+                shutil.rmtree(world_directory)
+            
+            self.chunk_checkpoints = np.full((len(chunks), len(chunks[0])), -1, dtype=np.int32)
+        
+        os.makedirs(os.path.join(world_directory, "chunks"), exist_ok=True)
+        
+        number = self.checkpoint_number + 1
+        chunk_checkpoints = self.chunk_checkpoints.copy()
+        
+        saved_chunks = []
+        for chunk in world.chunk_manager.get_loaded_chunks():
+            tile_manager = chunk.tile_manager
+            
+            if not tile_manager.unsaved:
+                continue
+            
+            chunk_x, chunk_y = chunk.location[0] // chunk.size, chunk.location[1] // chunk.size
+            
+            arrays, colour_overrides = tile_manager.get_state()
+            save_chunk_state(self.get_chunk_file_path(world, chunk_x, chunk_y, number), arrays, colour_overrides)
+            
+            chunk_checkpoints[chunk_x, chunk_y] = number
+            saved_chunks.append(chunk)
+        
+        # Pops, goals, actions and routes refer to each other, so they go into a single pickle to keep those references intact
+        state = {
+            "pops": PopManager.pops,
+            "pop_id_counter": PopManager._id_counter,
+            "pop_attributes": PopManager.attributes,
+            "routes": PopMoveManagerInstance.routes,
+            # Requests deferred by max_paths_per_step, in the order they came in
+            "path_requests": list(PathRequestManagerInstance.requests.values()),
+            "ai_scheduler": ai_scheduler.get_state(),
+            "blackboard": Blackboard._data,
+            "random_state": random.getstate(),
+        }
+        
+        with open(os.path.join(world_directory, "state_%s.pkl" % number), "wb") as writer:
+            pickle.dump(state, writer, protocol=pickle.HIGHEST_PROTOCOL)
+        
+        np.save(os.path.join(world_directory, "chunks_%s.npy" % number), chunk_checkpoints)
+        
+        manifest = {
+            "version": CHECKPOINT_VERSION,
+            "number": number,
+            "step": step,
+            "seed": world.seed,
+            "width": world.width,
+            "height": world.height,
+            "chunk_size": world.chunk_size,
+            "resource_node_types": self.get_type_names(RESOURCE_NODE_TYPES),
+            "building_types": self.get_type_names(BUILDING_TYPES),
+        }
+        
+        manifest_path = self.get_manifest_path(world)
+        with open(manifest_path + ".tmp", "w") as writer:
+            json.dump(manifest, writer)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        
+        # The new checkpoint is complete, remove what only the previous one used
+        for chunk in saved_chunks:
+            chunk_x, chunk_y = chunk.location[0] // chunk.size, chunk.location[1] // chunk.size
+            chunk.tile_manager.unsaved = False
+            
+            previous_number = self.chunk_checkpoints[chunk_x, chunk_y]
+            if previous_number >= 0:
+                os.remove(self.get_chunk_file_path(world, chunk_x, chunk_y, previous_number))
+        
+        if self.checkpoint_number >= 0:
+            os.remove(os.path.join(world_directory, "state_%s.pkl" % self.checkpoint_number))
+            os.remove(os.path.join(world_directory, "chunks_%s.npy" % self.checkpoint_number))
+        
+        self.checkpoint_number = number
+        self.chunk_checkpoints = chunk_checkpoints
+        
+        self.logger.debug("Saved checkpoint %s at step %s, %s chunks written" % (number, step, len(saved_chunks)))
+    
+    # Restores the latest checkpoint into a prepared world and returns its step.
+    # Chunks of a lazy world are restored when they are generated, see restore_chunk.
+    def load(self, world: world.World) -> int:
+        world_directory = self.get_world_directory(world)
+        
+        with open(self.get_manifest_path(world), "r") as reader:
+            manifest = json.load(reader)
+        
+        if manifest["version"] != CHECKPOINT_VERSION:
+            raise ValueError("Checkpoint version %s is not supported." % manifest["version"])
+        
+        for key in ["seed", "width", "height", "chunk_size"]:
+            if manifest[key] != getattr(world, key):
+                raise ValueError("Checkpoint %s %s does not match the world's %s." % (key, manifest[key], getattr(world, key)))
+        
+        number = manifest["number"]
+        
+        self.checkpoint_number = number
+        self.chunk_checkpoints = np.load(os.path.join(world_directory, "chunks_%s.npy" % number))
+        self.resource_id_map = self.get_type_id_map(manifest["resource_node_types"], RESOURCE_NODE_TYPES)
+        self.building_id_map = self.get_type_id_map(manifest["building_types"], BUILDING_TYPES)
+        
+        for chunk in world.chunk_manager.get_loaded_chunks():
+            self.restore_chunk(world, chunk)
+        
+        # Tiles in the pickle are looked up in the world, so the chunks have to be restored first
+        with open(os.path.join(world_directory, "state_%s.pkl" % number), "rb") as reader:
+            state = pickle.load(reader)
+        
+        PopManager.pops.clear()
+        PopManager.pops.update(state["pops"])
+        PopManager._id_counter = state["pop_id_counter"]
+        PopManager.attributes = state["pop_attributes"]
+        
+        PopMoveManagerInstance.routes = state["routes"]
+        
+        PathRequestManagerInstance.requests = {pop.id: (pop, target) for pop, target in state["path_requests"]}
+        
+        ai_scheduler.load_state(state["ai_scheduler"])
+        
+        Blackboard._data = state["blackboard"]
+        
+        random.setstate(state["random_state"])
+        
+        for pop in PopManager.get_pops():
+            world.get_tile(pop.location).add_pop(pop)
+        
+        logger_manager.sim_step = manifest["step"]
+        
+        self.logger.debug("Loaded checkpoint %s at step %s" % (number, manifest["step"]), printMessage=True)
+        
+        return manifest["step"]
+    
+    def restore_chunk(self, world: world.World, chunk: world.chunk.Chunk) -> bool:
+        if self.chunk_checkpoints is None:
+            return False
+        
+        chunk_x, chunk_y = chunk.location[0] // chunk.size, chunk.location[1] // chunk.size
+        number = self.chunk_checkpoints[chunk_x, chunk_y]
+        
+        if number < 0:
+            return False
+        
+        arrays, colour_overrides = load_chunk_state(self.get_chunk_file_path(world, chunk_x, chunk_y, number), chunk.size)
+        
+        arrays["resource_ids"] = self.resource_id_map[arrays["resource_ids"]]
+        arrays["building_ids"] = self.building_id_map[arrays["building_ids"]]
+        
+        chunk.tile_manager.load_state(arrays, colour_overrides)
+        chunk.tile_manager.unsaved = False
+        chunk.dirty = True
+        
+        return True
+
+
+checkpoint_manager = CheckpointManager()
\ No newline at end of file
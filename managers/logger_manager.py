@@ -4,5 +4,9 @@ from dataclasses import dataclass, field
 class LoggerManager:
     loggers: dict = field(default_factory=dict)
     sim_step: int = 0
+    
+    def __reduce__(self):
+        # Pickled references to the manager load as the running manager
+        return "logger_manager"
 
 logger_manager = LoggerManager()
\ No newline at end of file
@@ -0,0 +1,134 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from managers.logger_manager import logger_manager
+from managers.pop_manager import pop_manager as PopManagerInstance
+from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
+
+from object_types import Location
+from utils.logger import Logger
+
+from world.pathfinder import grid_pathfinder, find_paths_shared
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import obj.worldobj.creatures.pop
+    import world
+
+# Collects the paths pops ask for during a step and plans them all at once, after every pop has been updated.
+# Pairs of start and target that need a grid search are searched once, on worker processes that share the world's pathing costs when there are enough of them.
+# Every path is then handed to its pop in the order the requests came in, so the result does not depend on the number of workers.
+class PathRequestManager:
+    # Fewer grid searches than this are not worth sending to the workers
+    min_parallel_requests: int = 8
+    
+    # Most paths planned per step, None for no limit. Requests over the limit are planned in a later step, in the order they came in.
+    max_paths_per_step: int|None = None
+    
+    def __init__(self, max_workers: int = 0):
+        # 0 plans every path in the simulation's own process
+        self.max_workers = max_workers
+        self.executor: ProcessPoolExecutor|None = None
+        
+        # Pop id -> (pop, target location), a pop asking again replaces its earlier request
+        self.requests: dict[int, tuple[obj.worldobj.creatures.pop.Pop, Location]] = {}
+        
+        self.logger = Logger("path_request_manager", logger_manager)
+    
+    def set_max_workers(self, max_workers: int|None):
+        max_workers = max_workers or 0
+        
+        if max_workers == self.max_workers:
+            return
+        
+        # The pool size is fixed once started, so the next batch starts a new pool
+        self.shutdown()
+        self.max_workers = max_workers
+    
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.logger.debug("Starting path planning pool with %s workers" % self.max_workers)
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        
+        return self.executor
+    
+    def request_path(self, pop: obj.worldobj.creatures.pop.Pop, target: Location):
+        self.requests[pop.id] = (pop, tuple(target))
+    
+    def has_request(self, pop: obj.worldobj.creatures.pop.Pop) -> bool:
+        return pop.id in self.requests
+    
+    def solve(self, world: world.World):
+        if len(self.requests) == 0:
+            return
+        
+        # A pop that died after asking has left the world, its request is dropped before it can take a place in the budget
+        requests = [(pop, target) for pop, target in self.requests.values() if pop.id in PopManagerInstance.pops]
+        self.requests = {}
+        
+        if self.max_paths_per_step is not None and len(requests) > self.max_paths_per_step:
+            # Their pops keep waiting, see MoveAction.update
+            self.requests = {pop.id: (pop, target) for pop, target in requests[self.max_paths_per_step:]}
+            requests = requests[:self.max_paths_per_step]
+            
+            self.logger.debug("Deferred %s path requests to the next step" % len(self.requests))
+        
+        # Paths found by the workers, by start and target. Kept here as well as in the world's cache, which skips paths that are empty or partial.
+        found: dict[tuple[Location, Location], np.ndarray] = {}
+        
+        if self.max_workers > 0 and not world.chunk_manager.lazy:
+            keys = list(dict.fromkeys((tuple(pop.location), target) for pop, target in requests))
+            keys = [key for key in keys if world.needs_grid_search(*key)]
+            
+            if len(keys) >= self.min_parallel_requests:
+                found = self.find_paths_parallel(world, keys)
+        
+        for pop, target in requests:
+            key = (tuple(pop.location), target)
+            
+            locations = found[key] if key in found else world.find_path_locations(key[0], target)
+            
+            PopMoveManagerInstance.set_route(pop, locations)
+    
+    def find_paths_parallel(self, world: world.World, keys: list[tuple[Location, Location]]) -> dict[tuple[Location, Location], np.ndarray]:
+        shared_memory_name = grid_pathfinder.share_costs()
+        
+        # A few batches per worker, so one batch of long searches does not leave the other workers idle
+        batch_count = min(len(keys), self.max_workers * 4)
+        batches = [keys[index::batch_count] for index in range(batch_count)]
+        
+        futures = [
+            self.get_executor().submit(
+                find_paths_shared, shared_memory_name, grid_pathfinder.width, grid_pathfinder.height, grid_pathfinder.min_cost, batch, world.path_search_padding, world.jump_point_search,
+                world.max_path_search_nodes, world.max_path_cost
+            )
+            for batch in batches
+        ]
+        
+        found = {}
+        
+        for batch, future in zip(batches, futures):
+            for key, locations in zip(batch, future.result()):
+                locations = np.array(locations, dtype=np.int32).reshape((-1, 2))
+                
+                if world.is_full_path(locations, key[1]):
+                    world.add_cached_path(key, locations)
+                
+                found[key] = locations
+        
+        self.logger.debug("Planned %s paths on %s workers" % (len(keys), self.max_workers))
+        
+        return found
+    
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        
+        grid_pathfinder.release_shared_costs()
+
+
+path_request_manager = PathRequestManager()
\ No newline at end of file
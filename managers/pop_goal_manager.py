@@ -3,9 +3,11 @@ from typing import List, TYPE_CHECKING
 
 from ai.action import CompositeAction
 from ai.goal import Goal, GoalPriority
+from ai.wakeup import WakeWatch
 from utils.logger import Logger
 
 from managers.logger_manager import logger_manager
+from managers.path_request_manager import path_request_manager as PathRequestManagerInstance
 
 if TYPE_CHECKING:
     import ai
@@ -13,15 +15,32 @@ if TYPE_CHECKING:
 
 class PopGoalManager:
     goals: List[ai.goal.Goal]
+    
+    # A sleeping pop wakes after this many steps even if nothing it depends on changed
+    max_sleep_steps: int = 100
+    
     def __init__(self, pop):
         self.goals = []
         self.active_action = None
         self.pop = pop
         
+        # The goal the last perform_goals executed, if it was the current goal
+        self.executed_goal: Goal|None = None
+        
+        # Set while the pop sleeps, see sleep
+        self.wake_watch: WakeWatch|None = None
+        
         self.logger = Logger(pop.name + "_goal_manager", logger_manager)
     
+    def __getstate__(self):
+        # The watch refers to tile managers of this world, a loaded pop evaluates its goals again
+        state = self.__dict__.copy()
+        state["wake_watch"] = None
+        return state
+    
     def add_goal(self, goal: Goal):
         self.goals.append(goal)
+        self.wake_watch = None
     
     def get_active_foreground_goal(self) -> Goal|None:
         for goal in self.goals:
@@ -33,6 +52,8 @@ class PopGoalManager:
         current_goal = self.get_current_goal()
         passed_current_goal = False
         
+        self.executed_goal = None
+        
         for goal in self.goals:
             # If we are past the current goal, and we find a new goal, we should not execute it.
             if current_goal is not None and passed_current_goal and goal is not current_goal:
@@ -43,6 +64,7 @@ class PopGoalManager:
                 
                 if goal is current_goal:
                     passed_current_goal = True
+                    self.executed_goal = goal
                 else:
                     # We have a goal that is higher priority than the current goal, so we need to reset the currently active goal
                     if current_goal is not None:
@@ -63,5 +85,36 @@ class PopGoalManager:
         
         return None
     
+    # Puts the pop to sleep if performing its goals again would only let it walk on: the current goal was executed and waits on a move
+    # whose route is planned. Until the pop wakes (see is_asleep) its goals are not performed, which gives the same result as performing
+    # them every step as long as nothing they depend on changes.
+    def sleep(self):
+        goal = self.executed_goal
+        
+        if goal is None or goal.fulfilled or goal.get_walking_action() is None or PathRequestManagerInstance.has_request(self.pop):
+            return
+        
+        wake_watch = WakeWatch(self.pop, logger_manager.sim_step + self.max_sleep_steps)
+        
+        # Every goal is watched, the current goal and the foreground goals after it are checked while performing goals
+        if all([goal.watch(wake_watch) for goal in self.goals]) and not wake_watch.has_changed():
+            self.wake_watch = wake_watch
+    
+    def is_asleep(self) -> bool:
+        if self.wake_watch is None:
+            return False
+        
+        if self.wake_watch.has_changed():
+            self.wake_watch = None
+            return False
+        
+        return True
+    
+    def has_urgent_goal(self) -> bool:
+        for goal in self.goals:
+            if goal.priority is GoalPriority.HIGH and not goal.fulfilled:
+                return True
+        return False
+    
     def get_pop_goals(self) -> List[ai.goal.Goal]:
         return self.goals
\ No newline at end of file
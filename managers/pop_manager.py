@@ -1,8 +1,10 @@
 from __future__ import annotations
 from typing import List, TYPE_CHECKING
 
+from obj.worldobj.creatures.popattributes import PopAttributeStore
 from utils.logger import Logger
 
+from .ai_scheduler import ai_scheduler
 from .pop_move_manager import PopMoveManager
 from .logger_manager import logger_manager
 
@@ -14,6 +16,8 @@ class PopManager():
     pops: dict[int, obj.worldobj.creatures.pop.Pop] = {}
     
     def __init__(self):
+        self.attributes = PopAttributeStore()
+        
         self.logger = Logger("pop_manager", logger_manager)
     
     def add_pop_move_manager(self, pop_move_manager: PopMoveManager):
@@ -70,6 +74,9 @@ class PopManager():
         self.logger.debug("Killing pop", actor=pop)
         self.remove_pop(pop)
         self.remove_pop_from_world(pop)
+        self.pop_move_manager.remove_pop(pop)
+        
+        self.attributes.remove(pop.attribute_slot)
         pop.world.trigger_force_render()
     
     def remove_pop_from_world(self, pop: obj.worldobj.creatures.pop.Pop):
@@ -77,12 +84,22 @@ class PopManager():
         pop.world.get_tile(pop.location).remove_pop(pop)
     
     def update(self):
-        dead_pops = []
-        for pop in self.get_pops():
-            pop.update()
+        pops = list(self.get_pops())
+        
+        # With a budget set, only some pops get a turn to perform their goals this step
+        scheduled = ai_scheduler.schedule(pops, self.attributes)
+        
+        for pop in pops:
+            if scheduled is None or pop.id in scheduled:
+                ai_scheduler.perform_goals(pop)
             
-            if pop.is_dead():
-                dead_pops.append(pop)
+            pop.update()
+        
+        ai_scheduler.finish_step()
+        
+        # Pops only change their own health, so checking every pop after all updates finds the same pops as checking each one after its update
+        dead = self.attributes.get_values("health", pops) <= 0
+        dead_pops = [pop for pop, is_dead in zip(pops, dead.tolist()) if is_dead]
         
         for dead_pop in dead_pops:
             self.kill_pop(dead_pop)
@@ -1,63 +1,194 @@
 from __future__ import annotations
 
-from path.popmove import PopMove
+import numpy as np
+
+from path.routestore import RouteStore
 from utils.logger import Logger
 
 from managers.logger_manager import logger_manager
 
-from typing import TYPE_CHECKING, List
+from object_types import Location
+
+from world.pagedgrid import PagedGrid
+from world.pathfinder import grid_pathfinder
+
+from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     import obj.worldobj.creatures.pop
     import world
-    import path
 
 class PopMoveManager:
-    popmoves: dict[int, List[PopMove]] = {}
     world: world.World
     
     def __init__(self):
         self.logger = Logger("pop_move_manager", logger_manager)
+        
+        self.routes = RouteStore()
+        
+        # Set when pathing costs changed since the queued routes were last checked
+        self.routes_changed = False
+        
+        # Speed multiplier of every tile's terrain, indexed x * height + y like the pathing costs. NaN until a pop first steps onto the tile,
+        # pages only exist where pops walked.
+        self.tile_speeds = PagedGrid(0, 0, grid_pathfinder.cost_page_size)
+        
+        grid_pathfinder.change_listeners.append(self.invalidate_routes)
     
+    def reset_tile_speeds(self, width: int, height: int):
+        self.tile_speeds = PagedGrid(width, height, grid_pathfinder.cost_page_size)
+    
+    def invalidate_routes(self, location, width: int, height: int):
+        self.routes_changed = True
+        
+        if (self.tile_speeds.width, self.tile_speeds.height) == (grid_pathfinder.width, grid_pathfinder.height):
+            # The terrain of these tiles may have changed
+            self.tile_speeds.clear_block(location, width, height)
+    
+    def get_nodes(self, locations: np.ndarray) -> np.ndarray:
+        return (locations[:, 0] % grid_pathfinder.width).astype(np.int64) * grid_pathfinder.height + locations[:, 1] % grid_pathfinder.height
+    
+    # Terrain speed multipliers of the tiles at nodes (see get_nodes)
+    def get_tile_speeds(self, nodes: np.ndarray) -> np.ndarray:
+        if (self.tile_speeds.width, self.tile_speeds.height) != (grid_pathfinder.width, grid_pathfinder.height):
+            self.reset_tile_speeds(grid_pathfinder.width, grid_pathfinder.height)
+        
+        speeds = self.tile_speeds.get_values(nodes)
+        
+        unknown = np.flatnonzero(np.isnan(speeds))
+        for index, node in zip(unknown.tolist(), nodes[unknown].tolist()):
+            speeds[index] = self.tile_speeds[node] = self.world.get_tile(divmod(node, grid_pathfinder.height)).terrain.speed_multiplier
+        
+        return speeds
+    
+    # Moves every pop with a route one step's worth along it. Progress is added for all moving pops at once,
+    # only the pops that enter a new tile (or are blocked) are handled one by one.
     def handle_moves(self):
-        # Move pops along their paths
-        for popid in self.popmoves:
-            if len(self.popmoves[popid]) == 0:
-                continue
-            
-            move = self.popmoves[popid][0]
+        if self.routes_changed:
+            self.repair_routes()
+        
+        routes = self.routes
+        
+        slots = routes.get_moving_slots()
+        if len(slots) == 0:
+            return
+        
+        next_steps = routes.get_next_steps(slots)
+        nodes = self.get_nodes(next_steps)
+        
+        # Pops already standing on their next step skip it
+        arrived = routes.is_at(slots, next_steps)
+        
+        # Pops whose next tile can no longer be entered do not move
+        blocked = (grid_pathfinder.get_costs(nodes) == 0) & ~arrived
+        
+        for slot in slots[blocked].tolist():
+            # Route around it and try again next step
+            self.repair_route(routes.pops[slot], 0)
+        
+        stepping = ~(arrived | blocked)
+        
+        progress = routes.progress[slots] + routes.speeds[slots] * self.get_tile_speeds(nodes)
+        routes.progress[slots[stepping]] = progress[stepping]
+        
+        done = stepping & (progress >= 1)
+        
+        routes.advance(slots[arrived])
+        
+        slots, next_steps = slots[done], next_steps[done]
+        
+        for slot, (x, y) in zip(slots.tolist(), next_steps.tolist()):
+            pop = routes.pops[slot]
             
-            if move.pop.location == move.destination_tile.location:
-                # Pop is already at the destination
-                self.popmoves[popid] = self.popmoves[popid][1:]
-                continue
+            self.move_pop_to_tile(pop=pop, destination=self.world.get_tile((x, y)))
+            self.logger.debug("Step: Pop %s moved to next tile (%s)" % (pop.name, (x, y)), actor=pop)
             
-            move.progress_move()
+            routes.locations[slot] = pop.location
+        
+        routes.advance(slots)
+    
+    # Per location in an (n, 2) array, whether its tile can no longer be entered.
+    # Read from the pathing costs rather than the tiles, they are what the routes were planned on.
+    def get_blocked_steps(self, locations: np.ndarray) -> np.ndarray:
+        if len(locations) == 0:
+            return np.zeros(0, dtype=bool)
+        
+        return grid_pathfinder.get_costs(self.get_nodes(locations)) == 0
+    
+    def get_blocked_step_index(self, locations: np.ndarray, start_index: int = 0) -> int|None:
+        blocked = np.flatnonzero(self.get_blocked_steps(locations[start_index:]))
+        
+        return int(blocked[0]) + start_index if len(blocked) > 0 else None
+    
+    # Checks every queued route for tiles that can no longer be entered and repairs the routes that have one
+    def repair_routes(self):
+        self.routes_changed = False
+        
+        for pop in [self.routes.pops[slot] for slot in self.routes.get_moving_slots().tolist()]:
+            blocked_index = self.get_blocked_step_index(self.routes.get_remaining(pop))
             
-            if move.is_done():
-                # self.logger.debug("Pop %s has arrived at %s" % (move.pop.name, move.destination_tile.location))
-                self.move_pop_to_tile(pop=move.pop, destination=move.destination_tile)
-                self.logger.debug("Step: Pop %s moved to next tile (%s)" % (move.pop.name, move.destination_tile.location), actor=move.pop)
-                self.popmoves[popid] = self.popmoves[popid][1:]
+            # A detour only avoids the blocked tiles it was planned around, repair until none are left
+            while blocked_index is not None:
+                self.repair_route(pop, blocked_index)
+                blocked_index = self.get_blocked_step_index(self.routes.get_remaining(pop))
+    
+    # Replaces the blocked part of a pop's route, starting blocked_index steps ahead, with a detour to the first tile after it that can still be entered.
+    # The steps before and after the detour are kept, only when no detour is found is the rest of the route searched again.
+    def repair_route(self, pop: obj.worldobj.creatures.pop.Pop, blocked_index: int):
+        steps = self.routes.get_remaining(pop).copy()
+        
+        blocked = self.get_blocked_steps(steps)
+        
+        rejoin_index = blocked_index + 1
+        while rejoin_index < len(steps) and blocked[rejoin_index]:
+            rejoin_index += 1
+        
+        # Progress towards the next step is kept, unless that step is the one being replaced
+        progress = float(self.routes.progress[self.routes.slots[pop.id]]) if blocked_index > 0 else 0.0
+        
+        if rejoin_index >= len(steps):
+            # The destination itself is blocked, the pop goes as far as it can
+            self.logger.debug("Route of pop %s ends on a blocked tile, stopping before it" % pop.name, actor=pop)
+            self.routes.set_route(pop, steps[:blocked_index], progress)
+            return
+        
+        start = tuple(steps[blocked_index - 1].tolist()) if blocked_index > 0 else pop.location
+        rejoin = tuple(steps[rejoin_index].tolist())
+        
+        detour = np.array(grid_pathfinder.find_path(start, rejoin, padding=self.world.path_search_padding), dtype=np.int32).reshape((-1, 2))
+        remaining_steps = steps[rejoin_index + 1:]
+        
+        if len(detour) == 0:
+            # No way around nearby, search the rest of the route from scratch
+            detour = self.world.find_path_locations(start, tuple(steps[-1].tolist()))
+            remaining_steps = steps[:0]
+        
+        if len(detour) == 0:
+            self.logger.debug("Route of pop %s is blocked at %s, no way around it" % (pop.name, tuple(steps[blocked_index].tolist())), actor=pop)
+            self.routes.set_route(pop, steps[:blocked_index], progress)
+            return
+        
+        self.logger.debug("Repaired route of pop %s around %s, %s steps replaced by %s" % (pop.name, tuple(steps[blocked_index].tolist()), rejoin_index - blocked_index + 1, len(detour) - 1), actor=pop)
+        
+        # The detour starts on the tile before the blocked one, which the kept steps already reach
+        self.routes.set_route(pop, np.concatenate([steps[:blocked_index], detour[1:], remaining_steps]), progress)
+    
+    # Replaces the pop's queued route with locations, an (n, 2) array as returned by World.find_path_locations
+    def set_route(self, pop: obj.worldobj.creatures.pop.Pop, locations: np.ndarray):
+        self.logger.debug("Queued route for pop %s:%s with %s steps" % (pop.name, pop.location, len(locations)), actor=pop)
+        
+        self.routes.set_route(pop, locations)
     
     def empty_moves(self, pop):
         self.logger.debug("Emptying moves for pop %s" % pop.name, actor=pop)
-        self.popmoves[pop.id] = []
+        self.routes.clear(pop)
     
-    def get_move_for_pop(self, pop: obj.worldobj.creatures.pop.Pop):
-        if pop.id not in self.popmoves or len(self.popmoves[pop.id]) == 0:
-            return None
-        else:
-            return self.popmoves[pop.id][0]
+    def remove_pop(self, pop):
+        self.routes.remove(pop)
     
-    def move_pop(self, popmove: path.PopMove):
-        # print("Moving pop %s to %s" % (popmove.pop.name, popmove.destination_tile.location))
-        if popmove.pop.id not in self.popmoves:
-            self.popmoves[popmove.pop.id] = []
-        
-        self.logger.debug("Queued move for pop %s:%s to %s (len:%s)" % (popmove.pop.name, popmove.pop.location, popmove.destination_tile.location, len(self.popmoves[popmove.pop.id])), actor=popmove.pop)
-        
-        self.popmoves[popmove.pop.id].append(popmove)
+    # The next location on the pop's route, None if it has nowhere to go
+    def get_move_for_pop(self, pop: obj.worldobj.creatures.pop.Pop) -> Location|None:
+        return self.routes.get_next_step(pop)
     
     def move_pop_to_tile(self, pop: obj.worldobj.creatures.pop.Pop, destination: world.tile.Tile):
         # print("Moving pop %s to %s" % (pop.location, direction))
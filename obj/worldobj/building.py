@@ -4,6 +4,9 @@ from world.worldobject import WorldObject, WORLD_OBJECT_TYPE
 from obj.item import ItemStack, Wood, Stone
 
 class Building(WorldObject):
+    # Whether pops can walk through the tile the building stands on
+    passable: bool = True
+    
     def __init__(self, name, description, materials:List[ItemStack]):
         self.name = name
         self.description = description
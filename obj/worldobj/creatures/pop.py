@@ -7,10 +7,12 @@ import random
 from dataclasses import dataclass, field
 
 from crafting.recipe import Recipe
+from managers.pop_manager import pop_manager as PopManager
 from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
 from managers.pop_goal_manager import PopGoalManager
 
 from ..entity import Entity, EntityState
+from .popattributes import StoredAttribute
 
 from ai.goal import FoodGoal, BuildGoal, Goal, GuaranteeBasicToolsGoal
 
@@ -36,7 +38,15 @@ class PopGoal(Enum):
 class Pop(Entity):
     world: world.World
     
+    # Kept in the PopManager's attribute store, see PopAttributeStore
+    health = StoredAttribute()
+    food = StoredAttribute()
+    water = StoredAttribute()
+    
     def __init__(self, name, location, world, age=0, role='worker', health=100, food=100, water=100, state=EntityState.IDLE, speed=1):
+        self.attribute_store = PopManager.attributes
+        self.attribute_slot = self.attribute_store.add()
+        
         super().__init__(name, location, world, age, role, health, food, water, state, speed)
         self.carry_weight = 10
         self.colour = (random.randint(0,255), random.randint(0,255), random.randint(0,255))
@@ -86,7 +96,7 @@ class Pop(Entity):
         
         self.food += food.item.nutrition
     
-    def update(self):
+    def update_goals(self):
         self.pop_goal_manager.perform_goals()
         
         current_goal = self.pop_goal_manager.get_active_foreground_goal()
@@ -108,8 +118,11 @@ class Pop(Entity):
                 target_tile_has_no_building = not tile.has_building()
             # random_location = (random.randint(0, self.world.width - 1), random.randint(0, self.world.height - 1))
             self.pop_goal_manager.add_goal(BuildGoal(entity=self, building=Hut(), target_location=build_location))
-        
-        
+        else:
+            self.pop_goal_manager.sleep()
+    
+    # Goals are performed separately, when the AIScheduler gives the pop a turn (see PopManager.update)
+    def update(self):
         # Count down food and water
         if self.food > 0:
             self.food -= 1
@@ -149,9 +162,13 @@ class Pop(Entity):
 @dataclass
 class Inventory:
     items: dict[Item, ItemStack] = field(default_factory=dict)
+    # Goes up with every change to the items, see Condition.get_dependencies
+    version: int = 0
     logger: Logger = Logger("inventory", logger_manager)
     
     def add_item(self, added_item: ItemStack):
+        self.version += 1
+        
         for item in self.items:
             if item == added_item.item.name:
                 self.items[item].amount += added_item.amount
@@ -170,6 +187,7 @@ class Inventory:
             return
         
         self.items[itemstack.item.name].amount -= itemstack.amount
+        self.version += 1
         self.logger.debug("Removed %s from inventory" % itemstack.item.name, actor=None)
     
     def has_item(self, item):
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import numpy as np
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import obj.worldobj.creatures.pop
+
+# The numeric attributes of all pops as one array per attribute. Every pop gets a slot when it is created and reads and writes its values
+# through StoredAttribute like plain attributes, while checking an attribute for all pops at once (see EntityPropertyCondition.check_pops)
+# is a single comparison on an array.
+class PopAttributeStore:
+    # Attribute name -> dtype of its array
+    attributes: dict[str, type] = {"health": np.int64, "food": np.int64, "water": np.int64}
+    
+    def __init__(self, slot_capacity: int = 64):
+        self.arrays: dict[str, np.ndarray] = {name: np.zeros(slot_capacity, dtype=dtype) for name, dtype in self.attributes.items()}
+        
+        self.slot_count = 0
+        self.free_slots: list[int] = []
+    
+    def add(self) -> int:
+        if len(self.free_slots) > 0:
+            return self.free_slots.pop()
+        
+        slot = self.slot_count
+        self.slot_count += 1
+        
+        if slot >= len(self.arrays["health"]):
+            self.grow_slots(2 * len(self.arrays["health"]))
+        
+        return slot
+    
+    def remove(self, slot: int):
+        for array in self.arrays.values():
+            array[slot] = 0
+        
+        self.free_slots.append(slot)
+    
+    def grow_slots(self, slot_capacity: int):
+        for name, array in self.arrays.items():
+            grown = np.zeros(slot_capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            self.arrays[name] = grown
+    
+    def is_stored(self, name: str) -> bool:
+        return name in self.arrays
+    
+    def get_slots(self, pops: list[obj.worldobj.creatures.pop.Pop]) -> np.ndarray:
+        return np.fromiter((pop.attribute_slot for pop in pops), dtype=np.int64, count=len(pops))
+    
+    # The values of an attribute for every pop in pops, in the same order
+    def get_values(self, name: str, pops: list[obj.worldobj.creatures.pop.Pop]) -> np.ndarray:
+        return self.arrays[name][self.get_slots(pops)]
+
+# An attribute of a pop kept in its PopAttributeStore
+class StoredAttribute:
+    def __set_name__(self, owner: type, name: str):
+        self.name = name
+    
+    def __get__(self, pop: obj.worldobj.creatures.pop.Pop|None, owner: type|None = None):
+        if pop is None:
+            return self
+        
+        return pop.attribute_store.arrays[self.name][pop.attribute_slot].item()
+    
+    def __set__(self, pop: obj.worldobj.creatures.pop.Pop, value):
+        pop.attribute_store.arrays[self.name][pop.attribute_slot] = value
\ No newline at end of file
@@ -1,2 +1 @@
-from .pathtile import PathTile
-from .popmove import PopMove
\ No newline at end of file
+from .pathtile import PathTile
\ No newline at end of file
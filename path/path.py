@@ -1,9 +0,0 @@
-from path.popmove import PopMove
-
-class Path:
-    def __init__(self, pop):
-        self.pop = pop
-        self.moves = []
-    
-    def add_move(self, popmove: PopMove):
-        self.moves.append(popmove)
\ No newline at end of file
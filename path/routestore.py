@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import numpy as np
+
+from object_types import Location
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import obj.worldobj.creatures.pop
+
+# The queued routes of all pops as one structure of arrays. The steps of every route live in a single int32 coordinate buffer,
+# and every pop gets a slot holding where its route starts in that buffer, its length, a cursor to the next step and the progress made towards that step.
+# Following a route only moves its cursor, steps are never copied until the buffer runs full and the steps still ahead are packed together.
+# Slots also keep their pop's location and speed, so moving every pop a step needs no pop objects except for the pops entering a new tile.
+class RouteStore:
+    def __init__(self, step_capacity: int = 1024, slot_capacity: int = 64):
+        self.steps = np.zeros((step_capacity, 2), dtype=np.int32)
+        # Steps in use, new routes are written after them
+        self.step_count = 0
+        
+        self.offsets = np.zeros(slot_capacity, dtype=np.int64)
+        self.lengths = np.zeros(slot_capacity, dtype=np.int32)
+        self.cursors = np.zeros(slot_capacity, dtype=np.int32)
+        self.progress = np.zeros(slot_capacity, dtype=np.float64)
+        self.locations = np.zeros((slot_capacity, 2), dtype=np.int32)
+        self.speeds = np.zeros(slot_capacity, dtype=np.float64)
+        
+        # Pop id -> slot, and the pop in every slot (None for a free slot)
+        self.slots: dict[int, int] = {}
+        self.pops: list[obj.worldobj.creatures.pop.Pop|None] = []
+        self.free_slots: list[int] = []
+    
+    def get_slot(self, pop: obj.worldobj.creatures.pop.Pop) -> int:
+        slot = self.slots.get(pop.id)
+        
+        if slot is None:
+            if len(self.free_slots) > 0:
+                slot = self.free_slots.pop()
+                self.pops[slot] = pop
+            else:
+                slot = len(self.pops)
+                self.pops.append(pop)
+                
+                if slot >= len(self.offsets):
+                    self.grow_slots(2 * len(self.offsets))
+            
+            self.slots[pop.id] = slot
+            self.lengths[slot] = 0
+            self.cursors[slot] = 0
+            self.progress[slot] = 0
+        
+        return slot
+    
+    def grow_slots(self, slot_capacity: int):
+        for name in ["offsets", "lengths", "cursors", "progress", "locations", "speeds"]:
+            array = getattr(self, name)
+            grown = np.zeros((slot_capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+    
+    # Replaces the pop's route with locations, an (n, 2) array. Progress is towards the first of them.
+    def set_route(self, pop: obj.worldobj.creatures.pop.Pop, locations: np.ndarray, progress: float = 0.0):
+        slot = self.get_slot(pop)
+        length = len(locations)
+        
+        # The old route's steps are left behind, they are dropped the next time the buffer is packed
+        self.lengths[slot] = 0
+        self.cursors[slot] = 0
+        self.progress[slot] = progress
+        self.locations[slot] = pop.location
+        self.speeds[slot] = pop.speed
+        
+        if self.step_count + length > len(self.steps):
+            self.pack(length)
+        
+        self.steps[self.step_count:self.step_count + length] = locations
+        self.offsets[slot] = self.step_count
+        self.lengths[slot] = length
+        self.step_count += length
+    
+    def clear(self, pop: obj.worldobj.creatures.pop.Pop):
+        slot = self.slots.get(pop.id)
+        
+        if slot is not None:
+            self.lengths[slot] = 0
+            self.cursors[slot] = 0
+            self.progress[slot] = 0
+    
+    def remove(self, pop: obj.worldobj.creatures.pop.Pop):
+        slot = self.slots.pop(pop.id, None)
+        
+        if slot is not None:
+            self.lengths[slot] = 0
+            self.cursors[slot] = 0
+            self.pops[slot] = None
+            self.free_slots.append(slot)
+    
+    # Moves the steps still ahead of every route to the front of the buffer, growing it if they and free_steps more steps do not fit in half of it
+    def pack(self, free_steps: int = 0):
+        slots = np.flatnonzero(self.cursors < self.lengths)
+        remaining = self.lengths[slots] - self.cursors[slots]
+        
+        step_count = int(remaining.sum())
+        step_capacity = len(self.steps)
+        while step_count + free_steps > step_capacity // 2:
+            step_capacity *= 2
+        
+        steps = np.zeros((step_capacity, 2), dtype=np.int32)
+        offsets = np.zeros(len(slots), dtype=np.int64)
+        offsets[1:] = np.cumsum(remaining)[:-1]
+        
+        for slot, offset, length in zip(slots.tolist(), offsets.tolist(), remaining.tolist()):
+            start = self.offsets[slot] + self.cursors[slot]
+            steps[offset:offset + length] = self.steps[start:start + length]
+        
+        self.steps = steps
+        self.step_count = step_count
+        
+        self.offsets[slots] = offsets
+        self.lengths[slots] = remaining
+        self.cursors[slots] = 0
+    
+    def get_remaining(self, pop: obj.worldobj.creatures.pop.Pop) -> np.ndarray:
+        slot = self.slots.get(pop.id)
+        
+        if slot is None:
+            return self.steps[:0]
+        
+        return self.steps[self.offsets[slot] + self.cursors[slot]:self.offsets[slot] + self.lengths[slot]]
+    
+    def get_next_step(self, pop: obj.worldobj.creatures.pop.Pop) -> Location|None:
+        slot = self.slots.get(pop.id)
+        
+        if slot is None or self.cursors[slot] >= self.lengths[slot]:
+            return None
+        
+        x, y = self.steps[self.offsets[slot] + self.cursors[slot]].tolist()
+        
+        return (x, y)
+    
+    def get_moving_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.cursors[:len(self.pops)] < self.lengths[:len(self.pops)])
+    
+    def get_next_steps(self, slots: np.ndarray) -> np.ndarray:
+        # Gathered as one int64 per (x, y) pair, which is several times faster than gathering rows
+        return self.steps.view(np.int64).ravel()[self.offsets[slots] + self.cursors[slots]].view(np.int32).reshape((-1, 2))
+    
+    # Per slot, whether its pop stands on the matching location in an (n, 2) array
+    def is_at(self, slots: np.ndarray, locations: np.ndarray) -> np.ndarray:
+        return self.locations.view(np.int64).ravel()[slots] == locations.view(np.int64).ravel()
+    
+    # The routes in slots move on to their next step, with no progress towards it yet
+    def advance(self, slots: np.ndarray):
+        self.cursors[slots] += 1
+        self.progress[slots] = 0
\ No newline at end of file
@@ -27,6 +27,10 @@ class Logger:
         self.manager = manager
         manager.loggers[name] = self
     
+    def __reduce__(self):
+        # Pickle only the name, a loaded logger registers itself again and starts without messages
+        return (Logger, (self.name, self.manager))
+    
     def log(self, log_level, message: str, *args, actor: obj.worldobj.entity.Entity = None, printMessage=False, level_name: str = None):
         log_level = level_name if level_name else log_level
         log_message = LogMessage(self.name, message, log_level, *args, actor = actor, sim_step = self.manager.sim_step)
@@ -85,4 +89,13 @@ class Logger:
             with open(f"logs/{self.name}_{str(log_level).split('.')[1]}.log", "a") as f:
                 for message in self.messages:
                     f.write(str(message) + "\n")
-                self.messages[log_level] = []
\ No newline at end of file
+                self.messages[log_level] = []
+
+# The logger registered under name, created the first time it is asked for. Objects made over and over, like goals, actions and conditions, share one per type.
+def get_logger(name: str, manager: LoggerManager) -> Logger:
+    logger = manager.loggers.get(name)
+    
+    if logger is None:
+        logger = Logger(name, manager)
+    
+    return logger
\ No newline at end of file
@@ -1,5 +1,4 @@
 from dataclasses import dataclass
-from obj.worldobj.resourcenode import NoResource
 from world.tile import Tile
 
 from utils.rendertype import MapRenderType
@@ -16,7 +15,7 @@ class TileRenderer():
         num_pops = len(tile.pops)
         has_building = tile.has_building()
         num_animals = len(tile.animals)
-        has_resourcenode = hasattr(tile, 'resourcenode') and type(tile.resourcenode) is not type(NoResource())
+        has_resourcenode = tile.has_resourcenode()
         
         coordinate_colour = None
         
@@ -61,5 +60,4 @@ class TileRenderer():
     
     def get_terrain_colour(self) -> tuple:
         # Combine the terrain and biome colours
-        return self.tile.terrain.colour
-    
\ No newline at end of file
+        return self.tile.terrain.colour
\ No newline at end of file
@@ -1,19 +1,23 @@
 from pathfinding.core.grid import Grid
 from pathfinding.finder.a_star import AStarFinder, DiagonalMovement
 
+import numpy as np
+
+from world.terrain import terrain_registry
 from world.tilemanager import TileManager
+from world.tilestore import TileStore
 from observer import Subject, RenderableObserver
 
 class Chunk(Subject, RenderableObserver):
     tile_manager: TileManager
-    def __init__(self, location, size=16):
+    def __init__(self, location, store: TileStore, size=16):
         super().__init__()
         
         self.initialised = False
         self.location = location
         self.dirty = True # True if the chunk has been modified since the last time it was rendered
         self.size = size
-        self.tile_manager = TileManager(chunk=self)
+        self.tile_manager = TileManager(chunk=self, store=store)
         self.dirty = True
         
         self.best_pathing_tile = None
@@ -33,16 +37,7 @@ class Chunk(Subject, RenderableObserver):
         subject.dirty = True
     
     def get_terrains(self):
-        tiles = self.get_tiles()
-        
-        terrains = []
-        
-        for tile_row in tiles:
-            for tile in tile_row:
-                if terrains.count(tile.terrain) == 0:
-                    terrains.append(tile.terrain)
-        
-        return terrains
+        return [terrain_registry.by_id(terrain_id) for terrain_id in np.unique(self.tile_manager.terrain_ids)]
     
     # Get tile with best paths to all borders of the chunk
     def get_best_pathing_tile(self):
@@ -50,7 +45,6 @@ class Chunk(Subject, RenderableObserver):
             return self.best_pathing_tile
         
         best_pathing_cost = 0
-        nodepath = None
         
         pathfinder = AStarFinder(diagonal_movement=DiagonalMovement.always)
         
@@ -77,11 +71,13 @@ class Chunk(Subject, RenderableObserver):
                 for border_tile_coordinate in border_tile_coordinates:
                     target_x, target_y = border_tile_coordinate
                     
-                    while nodepath is None:
-                        try:
-                            nodepath, runs = pathfinder.find_path(start=grid.node(x, y), end=grid.node(target_x, target_y), graph=grid)
-                        except Exception as e:
-                            print("Error finding path:", e)
+                    # One search per border, searching again would only fail the same way. A border without a path adds no cost.
+                    grid.cleanup()
+                    try:
+                        nodepath, runs = pathfinder.find_path(start=grid.node(x, y), end=grid.node(target_x, target_y), graph=grid)
+                    except Exception as e:
+                        print("Error finding path:", e)
+                        continue
                     
                     # Calculate pathing cost based on cost of nodes in nodepath
                     for node in nodepath:
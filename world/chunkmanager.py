@@ -1,5 +1,5 @@
 from __future__ import annotations
-from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
 from dataclasses import field
 import os
 import pickle
@@ -7,6 +7,8 @@ import pickle
 from dataclasses import dataclass
 
 from world.chunk import Chunk
+from world.generation_scheduler import generation_scheduler
+from world.tilestore import TileStore
 
 from typing import List, TYPE_CHECKING
 
@@ -20,10 +22,24 @@ class ChunkManager:
     chunk_size: int = 0
     best_pathing_tiles: dict = field(default_factory=dict)
     
+    # In lazy mode a chunk is only generated the first time it is requested, until then its slot in chunks is None
+    lazy: bool = False
+    # Lazy mode only: when more chunks than this are loaded, the least recently used chunks that can be generated again are dropped
+    max_loaded_chunks: int|None = None
+    # Lazily loaded chunks by chunk coordinates, least recently used first
+    loaded_chunks: OrderedDict = field(default_factory=OrderedDict)
+    
     def initialize_chunks(self):
+        if self.lazy:
+            self.chunks = [[None for _ in range(self.world.height // self.chunk_size)] for _ in range(self.world.width // self.chunk_size)]
+            self.loaded_chunks.clear()
+            return
+        
+        store = self.world.tile_store
+        
         self.chunks = [
-            [Chunk((-1, -1)) for _ in range(self.world.height // self.chunk_size)]
-            for _ in range(self.world.width // self.chunk_size)
+            [Chunk(location=(x * self.chunk_size, y * self.chunk_size), store=store, size=self.chunk_size) for y in range(self.world.height // self.chunk_size)]
+            for x in range(self.world.width // self.chunk_size)
         ]
     
     def add_chunk(self, chunk: Chunk):
@@ -46,19 +62,68 @@ class ChunkManager:
     def get_chunk_at(self, location) -> Chunk:
         x, y = location
         # return self.chunks[x][y]
-        return self.chunks[x // self.chunk_size][y // self.chunk_size]
+        chunk_x, chunk_y = x // self.chunk_size, y // self.chunk_size
+        
+        if self.lazy:
+            return self.load_chunk(chunk_x, chunk_y)
+        
+        return self.chunks[chunk_x][chunk_y]
+    
+    def load_chunk(self, chunk_x: int, chunk_y: int) -> Chunk:
+        chunk = self.chunks[chunk_x][chunk_y]
+        
+        if chunk is not None:
+            self.loaded_chunks.move_to_end((chunk_x, chunk_y))
+            return chunk
+        
+        # Every lazily loaded chunk has its own store, so memory grows with the explored area instead of the world size
+        location = (chunk_x * self.chunk_size, chunk_y * self.chunk_size)
+        chunk = Chunk(location=location, store=TileStore(self.chunk_size, self.chunk_size, origin=location), size=self.chunk_size)
+        
+        self.world.generate_chunk(chunk)
+        
+        self.chunks[chunk_x][chunk_y] = chunk
+        self.loaded_chunks[(chunk_x, chunk_y)] = chunk
+        
+        self.evict_chunks()
+        
+        return chunk
+    
+    # A chunk can be dropped if generating it again gives the same chunk
+    def can_evict_chunk(self, chunk: Chunk) -> bool:
+        tile_manager = chunk.tile_manager
+        
+        return len(tile_manager.pops) == 0 and len(tile_manager.buildings) == 0 and not tile_manager.has_modified_resources()
+    
+    def evict_chunks(self):
+        if self.max_loaded_chunks is None:
+            return
+        
+        # Never evict the most recently used chunk, it is the one that was just requested
+        for chunk_coordinates in list(self.loaded_chunks.keys())[:-1]:
+            if len(self.loaded_chunks) <= self.max_loaded_chunks:
+                break
+            
+            chunk = self.loaded_chunks[chunk_coordinates]
+            
+            if self.can_evict_chunk(chunk):
+                del self.loaded_chunks[chunk_coordinates]
+                chunk.tile_manager.remove_resourcenodes_from_index()
+                self.chunks[chunk_coordinates[0]][chunk_coordinates[1]] = None
+    
+    def get_loaded_chunks(self) -> List[Chunk]:
+        return [chunk for chunk_row in self.chunks for chunk in chunk_row if chunk is not None]
     
     def make_all_dirty(self):
-        for chunk_row in self.chunks:
-            for chunk in chunk_row:
-                chunk.dirty = True
+        for chunk in self.get_loaded_chunks():
+            chunk.dirty = True
     
     def get_dirty_chunks(self) -> List[List[Chunk]]:
         dirty_chunks = []
         for chunk_row in self.chunks:
             dirty_row = []
             for chunk in chunk_row:
-                if chunk.dirty:
+                if chunk is not None and chunk.dirty:
                     dirty_row.append(chunk)
             dirty_chunks.append(dirty_row)
         return dirty_chunks
@@ -66,6 +131,10 @@ class ChunkManager:
     def get_chunk(self, location) -> Chunk:
         chunk_x = int(location[0] / self.chunk_size) % len(self.chunks)
         chunk_y = int(location[1] / self.chunk_size) % len(self.chunks[chunk_x])
+        
+        if self.lazy:
+            return self.load_chunk(chunk_x, chunk_y)
+        
         return self.chunks[chunk_x][chunk_y]
     
     def get_file_name(self):
@@ -78,15 +147,14 @@ class ChunkManager:
             self.best_pathing_tiles = pickle.load(open(filename, "rb"))
             return
         
-        with ProcessPoolExecutor(max_workers=64) as executor:
-            threads = []
-            for chunk_row in self.chunks:
-                for chunk in chunk_row:
-                    threads.append(executor.submit(self.prepare_best_pathing_tile, chunk))
-            
-            for thread in threads:
-                result = thread.result()
-                self.best_pathing_tiles[result.location] = result
+        # Runs on the same workers that generated the maps
+        threads = []
+        for chunk in self.get_loaded_chunks():
+            threads.append(generation_scheduler.submit(self.prepare_best_pathing_tile, chunk))
+        
+        for thread in threads:
+            result = thread.result()
+            self.best_pathing_tiles[result.location] = result
         
         filename = self.get_file_name()
         
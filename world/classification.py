@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import numpy as np
+
+from world.biome import BiomeType, Temperature
+from world.terrain import TerrainHeight, terrain_registry
+from world.terrain import Ocean, ShallowCoastalWater, Plains, Hills, Mountain, MountainPeak, Unland
+
+# Terrain bands in order of height, a height below the first threshold is Ocean and every threshold starts the next band
+TERRAIN_HEIGHT_THRESHOLDS = [TerrainHeight.SHALLOW_COASTAL_WATER, TerrainHeight.LAND, TerrainHeight.HILLS, TerrainHeight.MOUNTAIN, TerrainHeight.MOUNTAIN_PEAK]
+TERRAIN_HEIGHT_BANDS = [Ocean, ShallowCoastalWater, Plains, Hills, Mountain, MountainPeak]
+
+# Order of the biome types returned by classify_biome_types
+BIOME_TYPES = [BiomeType.ARCTIC, BiomeType.TEMPERATE, BiomeType.TROPICAL, BiomeType.DESERT]
+
+def classify_terrain(height_map: np.ndarray) -> np.ndarray:
+    # Compare in the map's own precision, so rounded map values land in the same band as they do when compared one by one
+    thresholds = np.asarray(TERRAIN_HEIGHT_THRESHOLDS, dtype=height_map.dtype)
+    band_ids = np.array([terrain_registry.get(terrain_type).id for terrain_type in TERRAIN_HEIGHT_BANDS], dtype=np.uint8)
+    
+    terrain_ids = band_ids[np.digitize(height_map, thresholds)]
+    
+    # Values that fall in no band at all (NaN) become Unland
+    terrain_ids[np.isnan(height_map)] = terrain_registry.get(Unland).id
+    
+    return terrain_ids
+
+def classify_biome_types(height_map: np.ndarray, temperature_map: np.ndarray) -> np.ndarray:
+    land = TerrainHeight.LAND
+    cold = np.asarray(Temperature.COLD, dtype=temperature_map.dtype)
+    hot = np.asarray(Temperature.HOT, dtype=temperature_map.dtype)
+    
+    is_land = height_map > np.asarray(land, dtype=height_map.dtype)
+    
+    conditions = [
+        is_land & (temperature_map < cold),
+        is_land & (temperature_map > cold) & (temperature_map < hot),
+        is_land & (temperature_map > hot),
+    ]
+    
+    # Everything else, including temperatures exactly on a threshold, is desert
+    return np.select(conditions, [0, 1, 2], default=BIOME_TYPES.index(BiomeType.DESERT)).astype(np.uint8)
\ No newline at end of file
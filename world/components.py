@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import numpy as np
+
+from object_types import Location
+
+from .pathfinder import NEIGHBOURS, GridPathfinder, grid_pathfinder
+
+# Groups of tiles that can reach each other, over the pathing costs of a GridPathfinder. A path between two tiles of different components
+# does not exist, so asking for one is answered without a search. Components are labelled once per world and kept up to date as tiles change:
+# a tile that opens up joins the components around it. A tile that closes is only taken out, the component it may split stays one,
+# which at worst lets a search find out the target can not be reached.
+# Worlds whose chunks are generated lazily have tiles nobody knows the cost of yet, those skip this check.
+class ConnectedComponents:
+    # Tiles changed in one go above which the labels are built again rather than updated tile by tile
+    max_tiles_per_update: int = 64
+    
+    def __init__(self, pathfinder: GridPathfinder):
+        self.pathfinder = pathfinder
+        
+        # Per node, the label of its component, -1 if it can not be entered. A label is the smallest node of the component when it was labelled.
+        self.labels: np.ndarray|None = None
+        
+        # Label -> the label it was merged into after tiles opened up
+        self.merged: dict[int, int] = {}
+        
+        # Label for the next tile that opens up, above every node so it is used by no other tile
+        self.next_label = 0
+        
+        pathfinder.change_listeners.append(self.invalidate)
+    
+    def reset(self):
+        self.labels = None
+        self.merged = {}
+        self.next_label = 0
+    
+    def get_labels(self) -> np.ndarray|None:
+        if self.labels is None and self.pathfinder.cost_loader is None and self.pathfinder.is_initialized():
+            self.labels = self.label()
+            self.merged = {}
+            self.next_label = self.pathfinder.width * self.pathfinder.height
+        
+        return self.labels
+    
+    # Union-find over all tiles at once: every round each pair of neighbouring passable tiles hooks the larger of their labels onto the smaller,
+    # then labels are followed to their root until none changes. A few rounds label a whole world.
+    def label(self) -> np.ndarray:
+        width, height = self.pathfinder.width, self.pathfinder.height
+        
+        passable = self.pathfinder.get_cost_array() > 0
+        nodes = np.arange(width * height, dtype=np.int64).reshape((width, height))
+        
+        # Every neighbouring pair once, diagonal steps connect tiles like they do in a search
+        pairs = []
+        for dx, dy in [(1, 0), (0, 1), (1, 1), (1, -1)]:
+            neighbours = np.roll(nodes, (-dx, -dy), axis=(0, 1))
+            both = passable & np.roll(passable, (-dx, -dy), axis=(0, 1))
+            pairs.append((nodes[both], neighbours[both]))
+        
+        sources = np.concatenate([source for source, _ in pairs])
+        targets = np.concatenate([target for _, target in pairs])
+        
+        labels = np.arange(width * height, dtype=np.int64)
+        
+        while True:
+            source_labels, target_labels = labels[sources], labels[targets]
+            
+            changed = source_labels != target_labels
+            if not changed.any():
+                break
+            
+            np.minimum.at(labels, np.maximum(source_labels[changed], target_labels[changed]), np.minimum(source_labels[changed], target_labels[changed]))
+            
+            while True:
+                roots = labels[labels]
+                if np.array_equal(roots, labels):
+                    break
+                labels = roots
+        
+        labels[~passable.ravel()] = -1
+        
+        return labels.astype(np.int32)
+    
+    def find(self, label: int) -> int:
+        root = label
+        while root in self.merged:
+            root = self.merged[root]
+        
+        # Point every label on the way straight at the root
+        while label != root:
+            parent = self.merged[label]
+            self.merged[label] = root
+            label = parent
+        
+        return root
+    
+    def get_component(self, location: Location) -> int|None:
+        labels = self.get_labels()
+        
+        if labels is None:
+            return None
+        
+        label = int(labels[self.pathfinder.get_node(location)])
+        
+        return self.find(label) if label >= 0 else -1
+    
+    # False only if no path from start to target can exist
+    def is_reachable(self, start: Location, target: Location) -> bool:
+        target_component = self.get_component(target)
+        
+        if target_component is None:
+            return True
+        
+        return target_component >= 0 and self.get_component(start) == target_component
+    
+    def invalidate(self, location: Location, width: int, height: int):
+        if self.labels is None:
+            return
+        
+        if width * height > self.max_tiles_per_update:
+            self.reset()
+            return
+        
+        pathfinder = self.pathfinder
+        
+        for x in range(location[0], location[0] + width):
+            for y in range(location[1], location[1] + height):
+                node = pathfinder.get_node((x, y))
+                
+                passable = pathfinder.costs[node] > 0
+                was_passable = self.labels[node] >= 0
+                
+                if was_passable and not passable:
+                    self.labels[node] = -1
+                elif passable and not was_passable:
+                    self.open_tile(node)
+    
+    # A tile that opened up joins every component around it under a new label. Its node can not be the label, a tile that opened
+    # before may have been given it and been merged into another label since.
+    def open_tile(self, node: int):
+        x, y = divmod(node, self.pathfinder.height)
+        
+        label = self.next_label
+        self.next_label += 1
+        
+        self.labels[node] = label
+        
+        for dx, dy, _ in NEIGHBOURS:
+            neighbour_label = int(self.labels[self.pathfinder.get_node((x + dx, y + dy))])
+            
+            if neighbour_label >= 0:
+                root = self.find(neighbour_label)
+                
+                if root != label:
+                    self.merged[root] = label
+
+
+connected_components = ConnectedComponents(grid_pathfinder)
\ No newline at end of file
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import numpy as np
+
+from object_types import Location
+
+from .pathfinder import NEIGHBOURS
+
+# Cheapest path cost from every tile to the nearest of a set of goal tiles, over the pathing costs of a GridPathfinder.
+# Many pops looking for the same kind of target share one field: the nearest goal and the path to it are lookups instead of searches.
+# A field covers a box of the world starting at origin, paths only run through the box and tiles outside it have no distance.
+class DistanceField:
+    def __init__(self, goals: frozenset[Location]):
+        self.goals = goals
+        self.goal_list: list[Location] = sorted(goals)
+        
+        # Size of the box and where it starts in the world, wrapping around the world edges
+        self.width = 0
+        self.height = 0
+        self.origin: Location = (0, 0)
+        self.world_width = 0
+        self.world_height = 0
+        
+        # Flat arrays indexed x * height + y, like the pathfinder's costs
+        self.distances: np.ndarray|None = None
+        # Index in goal_list of the goal each tile's cheapest path leads to, -1 if no goal can be reached
+        self.nearest_goals: np.ndarray|None = None
+        # Next tile on each tile's cheapest path, -1 for the goals themselves and tiles that can not reach one
+        self.next_nodes: np.ndarray|None = None
+    
+    # Multi-source Dijkstra from the goals outwards, in delta-stepping rounds: every round expands all pending tiles that are within
+    # delta of the cheapest pending tile at once, as NumPy arrays. Expanding only the cheapest tiles keeps tiles from being improved over and over again.
+    # cost_array holds the costs of the box starting at origin, in a world of world_size (the box itself by default). Paths wrap around
+    # the edges of the box only where it spans the whole world.
+    def compute(self, cost_array: np.ndarray, delta: float|None = None, origin: Location = (0, 0), world_size: tuple[int, int]|None = None):
+        self.width, self.height = cost_array.shape
+        width, height = self.width, self.height
+        
+        self.origin = (int(origin[0]), int(origin[1]))
+        self.world_width, self.world_height = world_size if world_size is not None else (width, height)
+        wrap_x, wrap_y = width == self.world_width, height == self.world_height
+        
+        # Tiles that are not generated yet (NaN) can not be entered
+        costs = np.nan_to_num(cost_array, nan=0.0).ravel()
+        
+        if delta is None:
+            # A few steps over the cheapest terrain
+            passable_costs = costs[costs > 0]
+            delta = 4 * float(passable_costs.min()) if len(passable_costs) > 0 else 1.0
+        
+        distances = np.full(width * height, np.inf)
+        nearest_goals = np.full(width * height, -1, dtype=np.int32)
+        next_nodes = np.full(width * height, -1, dtype=np.int64)
+        
+        # Goals outside the box can not be reached through it
+        goal_nodes = np.array([self.get_node(goal) for goal in self.goal_list], dtype=np.int64)
+        goal_indices = np.arange(len(goal_nodes), dtype=np.int32)
+        
+        reachable = goal_nodes >= 0
+        reachable[reachable] = costs[goal_nodes[reachable]] > 0
+        distances[goal_nodes[reachable]] = 0
+        nearest_goals[goal_nodes[reachable]] = goal_indices[reachable]
+        
+        pending = np.unique(goal_nodes[reachable])
+        
+        while len(pending) > 0:
+            pending_distances = distances[pending]
+            expand = pending_distances <= pending_distances.min() + delta
+            
+            frontier = pending[expand]
+            pending = pending[~expand]
+            
+            frontier_x, frontier_y = np.divmod(frontier, height)
+            
+            # A path from a neighbour through a frontier tile pays for the step onto the frontier tile
+            frontier_costs = costs[frontier]
+            frontier_distances = distances[frontier]
+            
+            neighbour_xs = np.concatenate([frontier_x + dx for dx, _, _ in NEIGHBOURS])
+            neighbour_ys = np.concatenate([frontier_y + dy for _, dy, _ in NEIGHBOURS])
+            candidates = np.concatenate([frontier_distances + distance * frontier_costs for _, _, distance in NEIGHBOURS])
+            sources = np.tile(frontier, len(NEIGHBOURS))
+            
+            if wrap_x:
+                neighbour_xs %= width
+            if wrap_y:
+                neighbour_ys %= height
+            
+            inside = (neighbour_xs >= 0) & (neighbour_xs < width) & (neighbour_ys >= 0) & (neighbour_ys < height)
+            neighbours = neighbour_xs[inside] * height + neighbour_ys[inside]
+            candidates, sources = candidates[inside], sources[inside]
+            
+            improved = (candidates < distances[neighbours]) & (costs[neighbours] > 0)
+            neighbours, candidates, sources = neighbours[improved], candidates[improved], sources[improved]
+            
+            # Several frontier tiles can improve the same neighbour, the cheapest one wins
+            order = np.lexsort((candidates, neighbours))
+            neighbours, candidates, sources = neighbours[order], candidates[order], sources[order]
+            
+            first = np.ones(len(neighbours), dtype=bool)
+            first[1:] = neighbours[1:] != neighbours[:-1]
+            neighbours, candidates, sources = neighbours[first], candidates[first], sources[first]
+            
+            distances[neighbours] = candidates
+            nearest_goals[neighbours] = nearest_goals[sources]
+            next_nodes[neighbours] = sources
+            
+            # Improved tiles are expanded (again) in a later round
+            pending = np.union1d(pending, neighbours)
+        
+        self.distances = distances
+        self.nearest_goals = nearest_goals
+        self.next_nodes = next_nodes
+    
+    # Index of a world location in the box, -1 if it lies outside the box
+    def get_node(self, location: Location) -> int:
+        x = (location[0] - self.origin[0]) % self.world_width
+        y = (location[1] - self.origin[1]) % self.world_height
+        
+        if x >= self.width or y >= self.height:
+            return -1
+        
+        return x * self.height + y
+    
+    def get_location(self, node: int) -> Location:
+        x, y = divmod(node, self.height)
+        
+        return ((x + self.origin[0]) % self.world_width, (y + self.origin[1]) % self.world_height)
+    
+    def contains(self, location: Location) -> bool:
+        return self.get_node(location) >= 0
+    
+    # Whether a block of tiles starting at location overlaps the box, so changing them can change the field
+    def overlaps(self, location: Location, width: int, height: int) -> bool:
+        overlaps_x = (location[0] - self.origin[0]) % self.world_width < self.width or (self.origin[0] - location[0]) % self.world_width < width
+        overlaps_y = (location[1] - self.origin[1]) % self.world_height < self.height or (self.origin[1] - location[1]) % self.world_height < height
+        
+        return overlaps_x and overlaps_y
+    
+    def get_distance(self, location: Location) -> float:
+        node = self.get_node(location)
+        
+        return float(self.distances[node]) if node >= 0 else np.inf
+    
+    def get_nearest_goal(self, location: Location) -> Location|None:
+        node = self.get_node(location)
+        
+        if node < 0 or self.nearest_goals[node] < 0:
+            return None
+        
+        return self.goal_list[self.nearest_goals[node]]
+    
+    # Locations from start to its nearest goal, both included. Empty if no goal can be reached.
+    def get_path(self, start: Location) -> list[Location]:
+        node = self.get_node(start)
+        
+        if node < 0 or self.nearest_goals[node] < 0:
+            return []
+        
+        next_nodes = self.next_nodes
+        
+        path = [self.get_location(node)]
+        
+        while next_nodes[node] >= 0:
+            node = int(next_nodes[node])
+            path.append(self.get_location(node))
+        
+        return path
\ No newline at end of file
@@ -0,0 +1,59 @@
+from __future__ import annotations
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import os
+
+from utils.logger import Logger
+
+from managers.logger_manager import logger_manager
+
+# Owns the process pool used while generating a world, so the terrain, temperature and resource density maps and the pathing tiles all run on the same workers.
+# The pool is started on first use and lives until shutdown is called.
+class GenerationScheduler:
+    # Tasks smaller than this many map cells are merged with their neighbours, a single noise call on a tiny grid costs more in overhead than in work
+    min_cells_per_task: int = 64 * 64
+    
+    # Every worker gets at least this many tasks, so one slow task does not leave the others idle
+    tasks_per_worker: int = 4
+    
+    def __init__(self, max_workers: int|None = None):
+        self.max_workers = max_workers
+        self.executor: ProcessPoolExecutor|None = None
+        
+        self.logger = Logger("generation_scheduler", logger_manager)
+    
+    def set_max_workers(self, max_workers: int|None):
+        if max_workers == self.max_workers:
+            return
+        
+        # The pool size is fixed once started, so the next submit starts a new pool
+        self.shutdown()
+        self.max_workers = max_workers
+    
+    def get_worker_count(self) -> int:
+        return self.max_workers or os.cpu_count() or 1
+    
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.logger.debug("Starting generation pool with %s workers" % self.get_worker_count())
+            self.executor = ProcessPoolExecutor(max_workers=self.get_worker_count())
+        
+        return self.executor
+    
+    def submit(self, fn, *args, **kwargs) -> Future:
+        return self.get_executor().submit(fn, *args, **kwargs)
+    
+    def get_batch_size(self, task_count: int, cells_per_task: int) -> int:
+        # Merge tasks until a batch is big enough to be worth sending to a worker, without making fewer batches than the workers can share
+        batch_size = max(1, self.min_cells_per_task // max(1, cells_per_task))
+        batch_size = min(batch_size, max(1, task_count // (self.get_worker_count() * self.tasks_per_worker)))
+        
+        return batch_size
+    
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+generation_scheduler = GenerationScheduler()
\ No newline at end of file
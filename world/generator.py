@@ -1,4 +1,7 @@
-from concurrent.futures import ProcessPoolExecutor
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
 
 import os
 
@@ -19,14 +22,154 @@ from object_types import Location
 from world.terrain.terrain import Terrain
 
 from .map_gen_method import MapGenerationMethod
+from .io import load_noise_map, save_noise_map
+from .generation_scheduler import generation_scheduler
 
+# Noise instances of the seeds a worker process has generated chunks for, so a seed's permutation table is only built once per process
+worker_noise: dict[int, Noise] = {}
+
+def get_worker_noise(seed: int) -> Noise:
+    if seed not in worker_noise:
+        worker_noise[seed] = Noise(seed=seed)
+    
+    return worker_noise[seed]
+
+# Runs in a worker process. The chunks are written straight into the shared map, only their count goes back to the parent.
+def generate_map_chunks_shared(shared_memory_name: str, total_map_size: tuple[int, int], seed: int, chunk_locations: list[Location], chunk_size: int, octaves=4, persistence=0.3, lacunarity: int=2) -> int:
+    shared_memory = SharedMemory(name=shared_memory_name)
+    
+    try:
+        # Same layout as add_chunk_to_map_data: the chunk at (x, y) starts at index x * width + y and its local x runs along a map row
+        map_data = np.ndarray((total_map_size[0] * total_map_size[1],), dtype=np.float32, buffer=shared_memory.buf).reshape(-1, total_map_size[0])
+        
+        chunk_x, chunk_y = np.array(chunk_locations).T[:, :, None, None]
+        local = np.arange(chunk_size)
+        row_offsets, column_offsets = local[None, :, None], local[None, None, :]
+        
+        # Every chunk of the batch is evaluated in one noise call. Point by point this gives exactly the values a grid mode call per chunk would,
+        # the cell at map_data[x + a, y + b] gets the noise at ((x * chunk_size + b) * 0.1, (y * chunk_size + a) * 0.1).
+        shape = (len(chunk_locations), chunk_size, chunk_size)
+        noise_x = np.broadcast_to((chunk_x * chunk_size + column_offsets) * 0.1, shape)
+        noise_y = np.broadcast_to((chunk_y * chunk_size + row_offsets) * 0.1, shape)
+        
+        chunks_map_data = get_worker_noise(seed).noise2(x=noise_x.ravel(), y=noise_y.ravel(), octaves=octaves, persistence=persistence*3, lacunarity=lacunarity, grid_mode=False)
+        
+        map_data[chunk_x + row_offsets, chunk_y + column_offsets] = np.round(chunks_map_data * 10, 1).reshape(shape)
+        
+        del map_data
+    finally:
+        shared_memory.close()
+    
+    return len(chunk_locations)
+
+# One map to generate, see MapGenerator.generate_map for the parameters
+@dataclass
+class MapRequest:
+    generator: MapGenerator
+    total_map_size: tuple[int, int]
+    chunk_size: int = 16
+    octaves: int = 4
+    persistence: float = 0.3
+    lacunarity: float = 2
+    name: str = "Default"
+    
+    def get_cache_parameters(self) -> dict:
+        return {"seed": self.generator.seed, "octaves": self.octaves, "persistence": self.persistence, "lacunarity": self.lacunarity, "chunk_size": self.chunk_size, "method": self.generator.impl.value, "size": self.total_map_size}
+    
+    def generate_chunk(self, location: Location) -> np.ndarray:
+        return self.generator.generate_chunk(location, self.chunk_size, self.octaves, self.persistence, self.lacunarity)
+
+# Generates several maps at once. Cached maps are loaded, the chunks of every concurrent map that is not cached go into one shared process pool.
+def generate_maps(requests: list[MapRequest], force_new=False) -> list[np.ndarray]:
+    maps: list[np.ndarray|None] = [None for _ in requests]
+    concurrent_requests = []
+    
+    for index, request in enumerate(requests):
+        if request.chunk_size == 0:
+            request.chunk_size = request.total_map_size[0] // 4
+        
+        generator = request.generator
+        generator.guarantee_map_file_path()
+        
+        if force_new == False:
+            # Cached maps are memory mapped read-only, nothing is read until a value is used
+            maps[index] = load_noise_map(generator.get_map_file_path(request.total_map_size, request.chunk_size, request.octaves, request.persistence, request.lacunarity, request.name), **request.get_cache_parameters())
+            
+            if maps[index] is not None:
+                continue
+        
+        if generator.impl == MapGenerationMethod.SERIAL:
+            maps[index] = generator.gen_serial_impl(request.total_map_size, request.chunk_size, request.octaves, request.persistence, request.lacunarity, force_new, request.name)
+        elif generator.impl == MapGenerationMethod.CONCURRENT:
+            concurrent_requests.append(index)
+        elif generator.impl == MapGenerationMethod.VECTORIZED:
+            maps[index] = generator.gen_vectorized_impl(total_map_size=request.total_map_size, octaves=request.octaves, persistence=request.persistence, lacunarity=request.lacunarity)
+        else:
+            raise ValueError("Unimplemented generation type. Please use another implementation.")
+    
+    if len(concurrent_requests) > 0:
+        for index, map_data in zip(concurrent_requests, generate_concurrent_maps([requests[index] for index in concurrent_requests])):
+            maps[index] = map_data
+    
+    for request, map_data in zip(requests, maps):
+        if len(map_data) == 0:
+            raise ValueError("Generated map data is empty. Please check the parameters and try again.")
+        
+        if isinstance(map_data, np.memmap):
+            continue
+        
+        generator = request.generator
+        save_noise_map(generator.get_map_file_path(request.total_map_size, request.chunk_size, request.octaves, request.persistence, request.lacunarity, request.name), map_data, **request.get_cache_parameters())
+    
+    return maps
+
+def generate_concurrent_maps(requests: list[MapRequest]) -> list[np.ndarray]:
+    # Every map gets a float32 buffer in shared memory, the workers fill it in place
+    shared_memories = [SharedMemory(create=True, size=request.total_map_size[0] * request.total_map_size[1] * np.dtype(np.float32).itemsize) for request in requests]
+    
+    try:
+        threads = []
+        chunk_count = 0
+        for request, shared_memory in zip(requests, shared_memories):
+            total_map_size, chunk_size = request.total_map_size, request.chunk_size
+            
+            chunk_locations = [(i, j) for i in range(0, total_map_size[0], chunk_size) for j in range(0, total_map_size[1], chunk_size)]
+            chunk_count += len(chunk_locations)
+            
+            # Small chunks are sent to the workers in batches
+            batch_size = generation_scheduler.get_batch_size(len(chunk_locations), chunk_size * chunk_size)
+            
+            for batch_start in range(0, len(chunk_locations), batch_size):
+                threads.append(generation_scheduler.submit(generate_map_chunks_shared, shared_memory.name, total_map_size, request.generator.seed, chunk_locations[batch_start:batch_start + batch_size], chunk_size, request.octaves, request.persistence, request.lacunarity))
+        
+        thread_count = len(threads)
+        
+        finished_threads = 0
+        finished_chunks = 0
+        print(f"Processing {chunk_count} chunks in {thread_count} batches in parallel...")
+        
+        for thread in as_completed(threads):
+            # Raises the worker's exception, if there was one
+            finished_chunks += thread.result()
+            
+            finished_threads += 1
+            
+            if finished_threads % 100 == 0 or finished_threads == thread_count:
+                print(f"Processed chunk {finished_chunks}/{chunk_count}. {round((finished_chunks) / chunk_count * 100, 2)}% complete.")
+        
+        # Copy the maps out before the shared memory goes away
+        return [np.ndarray((request.total_map_size[0] * request.total_map_size[1],), dtype=np.float32, buffer=shared_memory.buf).copy() for request, shared_memory in zip(requests, shared_memories)]
+    finally:
+        for shared_memory in shared_memories:
+            shared_memory.close()
+            shared_memory.unlink()
 
 class MapGenerator:
     seed: int = 0
     noise: Noise
     terrain: Noise
 
-    def __init__(self, seed:int|None = None, impl: MapGenerationMethod = MapGenerationMethod.SERIAL):
+    def __init__(self, seed:int|None = None, impl: MapGenerationMethod = MapGenerationMethod.SERIAL, band_size: int|None = None):
         if impl not in MapGenerationMethod:
             raise ValueError("Invalid implementation type. Use a valid enum value.")
         if seed is None:
@@ -36,6 +179,9 @@ class MapGenerator:
         self.terrain = Noise(seed=seed)
 
         self.impl = impl
+        
+        # Number of map rows the vectorized method evaluates per noise call, None evaluates the whole map in one call
+        self.band_size = band_size
 
         self.logger = None
     
@@ -46,86 +192,63 @@ class MapGenerator:
         if os.path.exists("map/" + str(self.seed)) == False:
             os.mkdir("map/" + str(self.seed))
     
-    def gen_serial_impl(self, size, chunk_size=16, octaves=4, persistence=0.3, lacunarity: int=2, force_new=False, name="Default") -> List[float]:
-        map_data = []
-        # return map_data
-        
-        mapfilepath = "map/" + str(self.seed) + "/" + name + "_" + str(size[0]) + "x" + str(size[1]) + ".map"
-        
-        self.guarantee_map_file_path()
-        
-        if force_new == False:
-            if os.path.exists(mapfilepath) == True:
-                with open(mapfilepath, 'r') as reader:
-                    map_data = reader.read().split(',')
-                    return list(map(float, map_data))
-
-        xrange = np.arange(x * chunk_size, (x + 1) * chunk_size)
-        yrange = np.arange(y * chunk_size, (y + 1) * chunk_size)
-        
-        map_data = self.noise.noise2(x=xrange, y=yrange, octaves=octaves, persistence=persistence, lacunarity=lacunarity*1.111, grid_mode=True)
+    def get_map_file_path(self, size, chunk_size, octaves, persistence, lacunarity, name) -> str:
+        # Every parameter that changes the generated values is part of the file name, so changing one never reuses a stale map
+        parameters = "%s_c%s_o%s_p%s_l%s" % (self.impl.value, chunk_size, octaves, persistence, lacunarity)
+        return "map/" + str(self.seed) + "/" + name + "_" + str(size[0]) + "x" + str(size[1]) + "_" + parameters + ".npmap"
+    
+    def gen_serial_impl(self, size, chunk_size=16, octaves=4, persistence=0.3, lacunarity: int=2, force_new=False, name="Default") -> np.ndarray:
+        # Same chunks as the concurrent method, generated one after the other in this process
+        map_data = np.zeros(size[0] * size[1])
         
-        compressed_map_data = [round(num*10, 1) for num in map_data]
+        for i in range(0, size[0], chunk_size):
+            for j in range(0, size[1], chunk_size):
+                chunk_map_data, local_coordinate = self.generate_map_chunk_async(i, j, chunk_size, octaves, persistence, lacunarity, force_new, name)
+                self.add_chunk_to_map_data(map_data=map_data, chunk_map_data=chunk_map_data, size=size, chunk_size=chunk_size, chunk_location=local_coordinate)
         
-        with open(mapfilepath, 'w') as writer:
-            writer.write(','.join(map(str, compressed_map_data)))
+        compressed_map_data = np.round(map_data, 1)
         
         return compressed_map_data
     
-    def gen_concurrent_impl(self, total_map_size, chunk_size=16, octaves=4, persistence=0.3, lacunarity: int=2.22, force_new=False, name="Default") -> List[float]:
-        if chunk_size == 0:
-            chunk_size = total_map_size[0] // 4
-        mapfilepath = "map/" + str(self.seed) + "/" + name + "_" + str(total_map_size[0]) + "x" + str(total_map_size[1]) + ".map"
+    def gen_concurrent_impl(self, total_map_size, chunk_size=16, octaves=4, persistence=0.3, lacunarity: int=2.22, force_new=False, name="Default") -> np.ndarray:
+        return generate_concurrent_maps([MapRequest(self, total_map_size, chunk_size, octaves, persistence, lacunarity, name)])[0]
+    
+    def gen_vectorized_impl(self, total_map_size, octaves=4, persistence=0.3, lacunarity: int=2) -> np.ndarray:
+        width, height = total_map_size
+        band_size = self.band_size or height
         
-        self.guarantee_map_file_path()
-
-        if force_new == False:
-            if os.path.exists(mapfilepath) == True:
-                with open(mapfilepath, 'r') as reader:
-                    map_data = reader.read().split(',')
-                    return list(map(float, map_data))
-        
-        map_data = [0.0 for _ in range(total_map_size[0] * total_map_size[1])]
-        with ProcessPoolExecutor(max_workers=12) as executor:
-            threads = []
-            for i in range(0, total_map_size[0], chunk_size):
-                for j in range(0, total_map_size[1], chunk_size):
-                    threads.append(executor.submit(self.generate_map_chunk_async, i, j, chunk_size, octaves, persistence, lacunarity, force_new, name))
+        # Rows of the map, every band writes its rows straight into this buffer
+        map_data = np.zeros((height, width))
+        
+        column_coordinates = np.arange(width) * 0.1
+        row_coordinates = np.arange(height) * 0.1
+        
+        def generate_band(band_start: int):
+            band_end = min(band_start + band_size, height)
             
-            thread_count = len(threads)
-
-            finished_threads = 0
-            print(f"Processing {thread_count} chunks in parallel...")
+            # Grid mode returns [x][y], the map is stored row by row
+            band = self.noise.noise2(x=column_coordinates, y=row_coordinates[band_start:band_end], octaves=octaves, persistence=persistence*3, lacunarity=lacunarity, grid_mode=True)
             
-
-            for thread in threads:
-                result = thread.result()
-                chunk_map_data, local_coordinate = result
-                self.add_chunk_to_map_data(map_data=map_data, chunk_map_data=chunk_map_data, size=(total_map_size[0], total_map_size[1]), chunk_size=chunk_size, chunk_location=local_coordinate)
-
-                finished_threads += 1
-
-                if finished_threads % 100 == 0 or finished_threads == thread_count:
-                    print(f"Processed chunk {finished_threads}/{thread_count}. {round((finished_threads) / thread_count * 100, 2)}% complete.")
+            map_data[band_start:band_end] = np.round(band.T * 10, 1)
         
-        compressed_map_data = [round(num, 1) for num in map_data]
+        # The noise is evaluated with NumPy operations on whole bands, which release the GIL, so threads are enough and nothing has to be pickled
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(executor.map(generate_band, range(0, height, band_size)))
         
-        with open(mapfilepath, 'w') as writer:
-            writer.write(','.join(map(str, compressed_map_data)))
-        
-        return compressed_map_data
+        return map_data.reshape(-1)
     
-    def generate_map(self, total_map_size, chunk_size=16, octaves=4, persistence=0.3, lacunarity: int=2, force_new=False, name="Default") -> List[float]:
-        if self.impl == MapGenerationMethod.SERIAL:
-            compressed_map_data = self.gen_serial_impl(total_map_size, chunk_size, octaves, persistence, lacunarity, force_new, name)
-        elif self.impl == MapGenerationMethod.CONCURRENT:
-            compressed_map_data = self.gen_concurrent_impl(total_map_size=total_map_size, chunk_size=chunk_size, octaves=octaves, persistence=persistence, lacunarity=lacunarity, force_new=force_new, name=name)
-        else:
-            raise ValueError("Unimplemented generation type. Please use another implementation.")
-        if not compressed_map_data:
-            raise ValueError("Generated map data is empty. Please check the parameters and try again.")
+    def generate_map(self, total_map_size, chunk_size=16, octaves=4, persistence=0.3, lacunarity: int=2, force_new=False, name="Default") -> np.ndarray:
+        return generate_maps([MapRequest(self, total_map_size, chunk_size, octaves, persistence, lacunarity, name)], force_new)[0]
+    
+    # Values of the chunk at location (world coordinates, a multiple of chunk_size) as an [x, y] array, without generating the rest of the map.
+    # They are the same as the chunk's cells in a concurrent map of the same chunk size, after get_map_array.
+    def generate_chunk(self, location: Location, chunk_size: int, octaves=4, persistence=0.3, lacunarity: int=2) -> np.ndarray:
+        xrange = (location[1] * chunk_size + np.arange(chunk_size)) * 0.1
+        yrange = (location[0] * chunk_size + np.arange(chunk_size)) * 0.1
         
-        return compressed_map_data
+        chunk_map_data = self.noise.noise2(x=xrange, y=yrange, octaves=octaves, persistence=persistence*3, lacunarity=lacunarity, grid_mode=True)
+        
+        return np.round(chunk_map_data * 10, 1).astype(np.float32)
     
     def add_chunk_to_map_data(self, map_data: list[float], chunk_map_data: list[float], size: tuple[int, int], chunk_size: int, chunk_location: Location):
         width, height = size
@@ -0,0 +1,381 @@
+from __future__ import annotations
+
+import heapq
+import math
+
+from object_types import Location
+
+from .pathfinder import NEIGHBOURS, GridPathfinder, grid_pathfinder
+
+# Chunk level (HPA*) pathfinding on top of a GridPathfinder.
+# Where two neighbouring chunks touch, the passable tile pairs across the border form entrances, and every entrance gets a portal: one tile on each side.
+# Per chunk the cheapest costs between its portals are computed once and cached, so a long trip is an A* over portals that only looks at the chunks it crosses.
+# The path is then refined tile by tile, one chunk at a time. Cached data of a chunk is dropped when the cost of one of its tiles changes.
+class HierarchicalPathfinder:
+    # Longest stretch of border one portal stands for, a longer entrance gets a portal per stretch
+    max_entrance_width: int = 8
+    
+    def __init__(self, pathfinder: GridPathfinder):
+        self.pathfinder = pathfinder
+        self.chunk_size = 16
+        
+        # (chunk x, chunk y, axis) -> portals on the border with the next chunk along that axis, as (node in this chunk, node in the next chunk)
+        self.entrances: dict[tuple[int, int, int], list[tuple[int, int]]] = {}
+        
+        # Chunk -> portal node in the chunk -> (portal node, cost) for every portal it can reach, inside the chunk or straight across the border
+        self.chunk_edges: dict[Location, dict[int, list[tuple[int, float]]]] = {}
+        
+        # (width, height) -> per local tile index, the (neighbour index, step distance) pairs that stay inside a block of that size
+        self.local_neighbours: dict[tuple[int, int], list[list[tuple[int, float]]]] = {}
+        
+        # Portals the last search expanded, and whether it gave up on reaching its target because of max_nodes or max_cost
+        self.expanded_nodes = 0
+        self.capped = False
+        
+        pathfinder.change_listeners.append(self.invalidate)
+    
+    def reset(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.entrances = {}
+        self.chunk_edges = {}
+    
+    def get_chunk_count(self) -> tuple[int, int]:
+        return (-(-self.pathfinder.width // self.chunk_size), -(-self.pathfinder.height // self.chunk_size))
+    
+    def get_chunk(self, node: int) -> Location:
+        x, y = divmod(node, self.pathfinder.height)
+        return (x // self.chunk_size, y // self.chunk_size)
+    
+    def get_chunk_distance(self, location: Location, other: Location) -> int:
+        chunk_count_x, chunk_count_y = self.get_chunk_count()
+        
+        dx = abs(location[0] // self.chunk_size - other[0] // self.chunk_size)
+        dy = abs(location[1] // self.chunk_size - other[1] // self.chunk_size)
+        
+        return max(min(dx, chunk_count_x - dx), min(dy, chunk_count_y - dy))
+    
+    def get_chunk_ranges(self, chunk: Location) -> tuple[tuple[int, int], tuple[int, int]]:
+        # Search ranges (see GridPathfinder.search) that keep a search inside the chunk, the last chunk on an axis can be smaller
+        x, y = chunk[0] * self.chunk_size, chunk[1] * self.chunk_size
+        
+        return ((x, min(self.chunk_size, self.pathfinder.width - x) - 1), (y, min(self.chunk_size, self.pathfinder.height - y) - 1))
+    
+    def invalidate(self, location: Location, width: int, height: int):
+        if len(self.entrances) == 0 and len(self.chunk_edges) == 0:
+            return
+        
+        chunk_count_x, chunk_count_y = self.get_chunk_count()
+        
+        for chunk_x in range(location[0] // self.chunk_size, (location[0] + width - 1) // self.chunk_size + 1):
+            for chunk_y in range(location[1] // self.chunk_size, (location[1] + height - 1) // self.chunk_size + 1):
+                previous_x = (chunk_x - 1) % chunk_count_x
+                previous_y = (chunk_y - 1) % chunk_count_y
+                
+                # The chunk's own borders and the ones its previous neighbours own
+                for border in [(chunk_x, chunk_y, 0), (chunk_x, chunk_y, 1), (previous_x, chunk_y, 0), (chunk_x, previous_y, 1)]:
+                    self.entrances.pop(border, None)
+                
+                # Every chunk sharing one of those borders has different portals now
+                for chunk in [(chunk_x, chunk_y), (previous_x, chunk_y), ((chunk_x + 1) % chunk_count_x, chunk_y), (chunk_x, previous_y), (chunk_x, (chunk_y + 1) % chunk_count_y)]:
+                    self.chunk_edges.pop(chunk, None)
+    
+    def get_entrances(self, chunk_x: int, chunk_y: int, axis: int) -> list[tuple[int, int]]:
+        border = (chunk_x, chunk_y, axis)
+        
+        if border not in self.entrances:
+            self.entrances[border] = self.find_entrances(chunk_x, chunk_y, axis)
+        
+        return self.entrances[border]
+    
+    def find_entrances(self, chunk_x: int, chunk_y: int, axis: int) -> list[tuple[int, int]]:
+        pathfinder = self.pathfinder
+        (start_x, size_x), (start_y, size_y) = self.get_chunk_ranges((chunk_x, chunk_y))
+        
+        # Tiles along the border, in this chunk and in the next one
+        if axis == 0:
+            insides = [pathfinder.get_node((start_x + size_x, y)) for y in range(start_y, start_y + size_y + 1)]
+            outsides = [pathfinder.get_node((start_x + size_x + 1, y)) for y in range(start_y, start_y + size_y + 1)]
+        else:
+            insides = [pathfinder.get_node((x, start_y + size_y)) for x in range(start_x, start_x + size_x + 1)]
+            outsides = [pathfinder.get_node((x, start_y + size_y + 1)) for x in range(start_x, start_x + size_x + 1)]
+        
+        # Every tile on this side crosses to the cheapest of the three tiles it touches on the other side, land that only touches diagonally is still connected
+        pairs = []
+        for index, inside in enumerate(insides):
+            if pathfinder.get_cost(inside) == 0:
+                pairs.append(None)
+                continue
+            
+            candidates = [outsides[other_index] for other_index in [index, index - 1, index + 1] if 0 <= other_index < len(outsides) and pathfinder.get_cost(outsides[other_index]) > 0]
+            
+            if len(candidates) == 0:
+                pairs.append(None)
+                continue
+            
+            outside = min(candidates, key=lambda node: self.get_step_cost(inside, node))
+            pairs.append((inside, outside, max(pathfinder.get_cost(inside), pathfinder.get_cost(outside))))
+        
+        # Split the border into runs of pairs that can be crossed, and long runs into stretches of at most max_entrance_width.
+        # A run also ends where crossing gets an order of magnitude cheaper or more expensive, so a strip of land along a lake gets its own portal.
+        stretches = []
+        stretch = []
+        stretch_band = None
+        for pair in pairs:
+            if pair is None:
+                if len(stretch) > 0:
+                    stretches.append(stretch)
+                stretch = []
+                continue
+            
+            band = math.floor(math.log10(pair[2] / pathfinder.min_cost))
+            
+            if len(stretch) == self.max_entrance_width or (len(stretch) > 0 and band != stretch_band):
+                stretches.append(stretch)
+                stretch = []
+            
+            stretch.append(pair)
+            stretch_band = band
+        
+        if len(stretch) > 0:
+            stretches.append(stretch)
+        
+        # The portal of a stretch is its cheapest pair to cross, closest to the middle if there are more
+        portals = []
+        for stretch in stretches:
+            middle = (len(stretch) - 1) / 2
+            index = min(range(len(stretch)), key=lambda i: (self.get_step_cost(stretch[i][0], stretch[i][1]) + self.get_step_cost(stretch[i][1], stretch[i][0]), abs(i - middle)))
+            portals.append(stretch[index][:2])
+        
+        return portals
+    
+    # Cost of the single (straight or diagonal) step from node onto the neighbouring next_node
+    def get_step_cost(self, node: int, next_node: int) -> float:
+        height = self.pathfinder.height
+        
+        diagonal = node // height != next_node // height and node % height != next_node % height
+        
+        return (math.sqrt(2) if diagonal else 1) * self.pathfinder.get_cost(next_node)
+    
+    def get_portals(self, chunk: Location) -> list[tuple[int, int]]:
+        # Portals on the chunk's borders as (node in this chunk, node in the neighbouring chunk)
+        chunk_count_x, chunk_count_y = self.get_chunk_count()
+        chunk_x, chunk_y = chunk
+        
+        portals = self.get_entrances(chunk_x, chunk_y, 0) + self.get_entrances(chunk_x, chunk_y, 1)
+        portals += [(outside, inside) for inside, outside in self.get_entrances((chunk_x - 1) % chunk_count_x, chunk_y, 0)]
+        portals += [(outside, inside) for inside, outside in self.get_entrances(chunk_x, (chunk_y - 1) % chunk_count_y, 1)]
+        
+        return portals
+    
+    def get_chunk_edges(self, chunk: Location) -> dict[int, list[tuple[int, float]]]:
+        if chunk in self.chunk_edges:
+            return self.chunk_edges[chunk]
+        
+        pathfinder = self.pathfinder
+        range_x, range_y = self.get_chunk_ranges(chunk)
+        
+        portals = self.get_portals(chunk)
+        portal_nodes = {inside for inside, _ in portals}
+        
+        edges = {node: [] for node in portal_nodes}
+        
+        for inside, outside in portals:
+            # Crossing the border is a single step onto the other side
+            edges[inside].append((outside, self.get_step_cost(inside, outside)))
+        
+        for node in portal_nodes:
+            costs = self.get_costs_in_chunk(chunk, node)
+            
+            for other in portal_nodes:
+                if other != node and other in costs:
+                    edges[node].append((other, costs[other]))
+        
+        self.chunk_edges[chunk] = edges
+        
+        return edges
+    
+    def get_local_neighbours(self, width: int, height: int) -> list[list[tuple[int, float]]]:
+        if (width, height) not in self.local_neighbours:
+            self.local_neighbours[(width, height)] = [
+                [((x + dx) * height + y + dy, distance) for dx, dy, distance in NEIGHBOURS if 0 <= x + dx < width and 0 <= y + dy < height]
+                for x in range(width) for y in range(height)
+            ]
+        
+        return self.local_neighbours[(width, height)]
+    
+    # Cheapest cost from node to every tile of the chunk it can reach without leaving the chunk, or with reverse, from every such tile to node.
+    # Works on a copy of the chunk's costs, which keeps the inner loop free of wrapping and range checks.
+    def get_costs_in_chunk(self, chunk: Location, node: int, reverse: bool = False) -> dict[int, float]:
+        pathfinder = self.pathfinder
+        (start_x, size_x), (start_y, size_y) = self.get_chunk_ranges(chunk)
+        width, height = size_x + 1, size_y + 1
+        
+        # Makes sure the chunk is generated
+        pathfinder.get_cost(start_x * pathfinder.height + start_y)
+        
+        costs = pathfinder.get_cost_block((start_x, start_y), width, height).ravel().tolist()
+        neighbours = self.get_local_neighbours(width, height)
+        
+        x, y = divmod(node, pathfinder.height)
+        local_node = (x - start_x) * height + (y - start_y)
+        
+        g_costs = {local_node: 0.0}
+        closed = set()
+        open_heap = [(0.0, local_node)]
+        
+        while open_heap:
+            g_cost, local_node = heapq.heappop(open_heap)
+            
+            if local_node in closed:
+                continue
+            closed.add(local_node)
+            
+            node_cost = costs[local_node]
+            
+            for neighbour, distance in neighbours[local_node]:
+                cost = costs[neighbour]
+                
+                if cost == 0 or neighbour in closed:
+                    continue
+                
+                neighbour_g_cost = g_cost + distance * (node_cost if reverse else cost)
+                
+                if neighbour_g_cost < g_costs.get(neighbour, math.inf):
+                    g_costs[neighbour] = neighbour_g_cost
+                    heapq.heappush(open_heap, (neighbour_g_cost, neighbour))
+        
+        return {(start_x + local_node // height) * pathfinder.height + start_y + local_node % height: g_cost for local_node, g_cost in g_costs.items()}
+    
+    # Locations from start to target, both included. Empty if the target can not be reached.
+    # The portal search expands at most max_nodes portals and gives up once every path left would cost more than max_cost, like
+    # GridPathfinder.find_path. Expanding a portal can generate the chunks around it, so in lazy worlds the limits also bound the chunks
+    # a target that can not be reached makes the search generate. A search that gave up returns an empty path, or with partial
+    # the path to the portal it found closest to the target.
+    def find_path(self, start: Location, target: Location, max_nodes: int|None = None, max_cost: float|None = None, partial: bool = False) -> list[Location]:
+        pathfinder = self.pathfinder
+        
+        start_node = pathfinder.get_node(start)
+        target_node = pathfinder.get_node(target)
+        
+        self.capped = False
+        
+        if pathfinder.get_cost(target_node) == 0:
+            return []
+        
+        start_chunk = self.get_chunk(start_node)
+        target_chunk = self.get_chunk(target_node)
+        
+        # The start and target are linked to the portals of their own chunk for this search only
+        start_costs = self.get_costs_in_chunk(start_chunk, start_node)
+        start_edges = [(node, start_costs[node]) for node in self.get_chunk_edges(start_chunk) if node in start_costs]
+        
+        target_costs = self.get_costs_in_chunk(target_chunk, target_node, reverse=True)
+        
+        if start_chunk == target_chunk and start_node in target_costs:
+            start_edges.append((target_node, target_costs[start_node]))
+        
+        target_edges = {node: target_costs[node] for node in self.get_chunk_edges(target_chunk) if node in target_costs}
+        
+        node_path = self.search_portals(start_node, target_node, start_edges, target_edges, max_nodes, max_cost, partial)
+        
+        if node_path is None:
+            return []
+        
+        return self.refine_path(node_path)
+    
+    def search_portals(self, start_node: int, target_node: int, start_edges: list[tuple[int, float]], target_edges: dict[int, float], max_nodes: int|None = None, max_cost: float|None = None, partial: bool = False) -> list[int]|None:
+        pathfinder = self.pathfinder
+        height = pathfinder.height
+        target_x, target_y = divmod(target_node, height)
+        
+        g_costs = {start_node: 0.0}
+        parents = {start_node: None}
+        closed = set()
+        
+        start_heuristic = pathfinder.get_heuristic(*divmod(start_node, height), target_x, target_y)
+        open_heap = [(start_heuristic, start_heuristic, start_node)]
+        
+        # The expanded portal closest to the target, where a partial path leads
+        closest_node, closest_heuristic = start_node, start_heuristic
+        
+        while open_heap:
+            f_cost, node_heuristic, node = heapq.heappop(open_heap)
+            
+            if node in closed:
+                continue
+            
+            if node == target_node:
+                self.expanded_nodes = len(closed)
+                return self.get_node_path(parents, node)
+            
+            # Every portal left in the heap costs at least f_cost
+            if (max_nodes is not None and len(closed) >= max_nodes) or (max_cost is not None and f_cost > max_cost):
+                self.capped = True
+                break
+            
+            closed.add(node)
+            
+            if node_heuristic < closest_heuristic:
+                closest_node, closest_heuristic = node, node_heuristic
+            
+            if node == start_node:
+                # The start can be a portal itself
+                edges = start_edges + self.get_chunk_edges(self.get_chunk(node)).get(node, [])
+            else:
+                edges = self.get_chunk_edges(self.get_chunk(node)).get(node, [])
+                
+                if node in target_edges:
+                    edges = edges + [(target_node, target_edges[node])]
+            
+            for neighbour, cost in edges:
+                if neighbour in closed:
+                    continue
+                
+                g_cost = g_costs[node] + cost
+                
+                if g_cost < g_costs.get(neighbour, math.inf):
+                    g_costs[neighbour] = g_cost
+                    parents[neighbour] = node
+                    
+                    neighbour_x, neighbour_y = divmod(neighbour, height)
+                    heuristic = pathfinder.get_heuristic(neighbour_x, neighbour_y, target_x, target_y)
+                    
+                    heapq.heappush(open_heap, (g_cost + heuristic, heuristic, neighbour))
+        
+        self.expanded_nodes = len(closed)
+        
+        if self.capped and partial:
+            return self.get_node_path(parents, closest_node)
+        
+        return None
+    
+    def get_node_path(self, parents: dict[int, int|None], node: int) -> list[int]:
+        node_path = []
+        
+        while node is not None:
+            node_path.append(node)
+            node = parents[node]
+        
+        node_path.reverse()
+        
+        return node_path
+    
+    def refine_path(self, node_path: list[int]) -> list[Location]:
+        pathfinder = self.pathfinder
+        
+        path = [divmod(node_path[0], pathfinder.height)]
+        
+        for node, next_node in zip(node_path, node_path[1:]):
+            chunk = self.get_chunk(node)
+            
+            if chunk != self.get_chunk(next_node):
+                # Straight across a border
+                path.append(divmod(next_node, pathfinder.height))
+                continue
+            
+            path += pathfinder.search(node, next_node, *self.get_chunk_ranges(chunk))[1:]
+        
+        return path
+
+
+hierarchical_pathfinder = HierarchicalPathfinder(grid_pathfinder)
\ No newline at end of file
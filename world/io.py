@@ -1,3 +1,5 @@
+import os
+
 import numpy as np
 
 def save_heightmap_compressed(heightmap, filename="heightmap"):
@@ -6,3 +8,104 @@ def save_heightmap_compressed(heightmap, filename="heightmap"):
 def load_heightmap_compressed(filename="heightmap"):
     data = np.load(f"{filename}.npz")
     return data['heightmap']
+
+# Noise map cache files are a fixed size header followed by the raw map values, so the values can be memory mapped as-is.
+# Bump the version whenever the layout or the way maps are generated changes, older files are then regenerated.
+NOISE_MAP_MAGIC = b"WSNM"
+NOISE_MAP_VERSION = 1
+NOISE_MAP_HEADER_SIZE = 128
+NOISE_MAP_HEADER = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u2"),
+    ("dtype", "S8"),
+    ("method", "S16"),
+    ("seed", "<i8"),
+    ("octaves", "<u2"),
+    ("chunk_size", "<u4"),
+    ("persistence", "<f8"),
+    ("lacunarity", "<f8"),
+    ("width", "<u4"),
+    ("height", "<u4"),
+])
+
+def save_noise_map(filename, map_data: np.ndarray, seed, octaves, persistence, lacunarity, chunk_size, method, size):
+    header = np.zeros(1, dtype=NOISE_MAP_HEADER)
+    header["magic"] = NOISE_MAP_MAGIC
+    header["version"] = NOISE_MAP_VERSION
+    header["dtype"] = map_data.dtype.str.encode()
+    header["method"] = method.encode()
+    header["seed"] = seed
+    header["octaves"] = octaves
+    header["chunk_size"] = chunk_size
+    header["persistence"] = persistence
+    header["lacunarity"] = lacunarity
+    header["width"], header["height"] = size
+    
+    # Write to a temporary file first, so a reader never sees a half written map
+    temp_filename = "%s.%s.tmp" % (filename, os.getpid())
+    
+    with open(temp_filename, "wb") as writer:
+        writer.write(header.tobytes().ljust(NOISE_MAP_HEADER_SIZE, b"\0"))
+        writer.write(np.ascontiguousarray(map_data).tobytes())
+    
+    os.replace(temp_filename, filename)
+
+def read_noise_map_header(filename) -> np.void|None:
+    if not os.path.exists(filename) or os.path.getsize(filename) < NOISE_MAP_HEADER_SIZE:
+        return None
+    
+    header = np.fromfile(filename, dtype=NOISE_MAP_HEADER, count=1)[0]
+    
+    if header["magic"] != NOISE_MAP_MAGIC or header["version"] != NOISE_MAP_VERSION:
+        return None
+    
+    return header
+
+def load_noise_map(filename, seed, octaves, persistence, lacunarity, chunk_size, method, size) -> np.memmap|None:
+    header = read_noise_map_header(filename)
+    
+    if header is None:
+        return None
+    
+    # The file name already contains the parameters, but a stale or foreign file should never be reused silently
+    expected = {"seed": seed, "octaves": octaves, "persistence": persistence, "lacunarity": lacunarity, "chunk_size": chunk_size, "width": size[0], "height": size[1]}
+    
+    for key, value in expected.items():
+        if header[key] != value:
+            return None
+    
+    if header["method"].decode() != method:
+        return None
+    
+    return np.memmap(filename, dtype=np.dtype(header["dtype"].decode()), mode="r", offset=NOISE_MAP_HEADER_SIZE, shape=(size[0] * size[1],))
+
+# Chunk checkpoint files hold the chunk's tile arrays back to back in this order, followed by its colour overrides as rows of (x, y, r, g, b)
+CHUNK_STATE_ARRAYS = [
+    ("terrain_ids", np.uint8),
+    ("biome_ids", np.uint8),
+    ("resource_ids", np.uint8),
+    ("resource_amounts", np.int32),
+    ("building_ids", np.uint8),
+]
+
+def save_chunk_state(filename, arrays: dict[str, np.ndarray], colour_overrides: np.ndarray):
+    with open(filename, "wb") as writer:
+        for name, dtype in CHUNK_STATE_ARRAYS:
+            writer.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        
+        writer.write(np.ascontiguousarray(colour_overrides, dtype=np.int32).tobytes())
+
+def load_chunk_state(filename, chunk_size: int) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    data = np.fromfile(filename, dtype=np.uint8)
+    
+    arrays = {}
+    offset = 0
+    
+    for name, dtype in CHUNK_STATE_ARRAYS:
+        size = chunk_size * chunk_size * np.dtype(dtype).itemsize
+        arrays[name] = data[offset:offset + size].view(dtype).reshape(chunk_size, chunk_size)
+        offset += size
+    
+    colour_overrides = data[offset:].view(np.int32).reshape(-1, 5)
+    
+    return arrays, colour_overrides
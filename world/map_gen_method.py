@@ -2,4 +2,5 @@ import enum
 
 class MapGenerationMethod(enum.Enum):
     SERIAL = "serial"
-    CONCURRENT = "concurrent"
\ No newline at end of file
+    CONCURRENT = "concurrent"
+    VECTORIZED = "vectorized"
\ No newline at end of file
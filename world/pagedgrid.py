@@ -0,0 +1,113 @@
+from __future__ import annotations
+from array import array
+
+import numpy as np
+
+from object_types import Location
+
+# A world-sized grid of floats that only holds the square pages somebody wrote to, for worlds whose chunks are generated lazily.
+# Indexed by node (x * height + y) like a flat array, a cell on a page that was never written reads as fill.
+# Memory grows with the pages written, not with the size of the world.
+class PagedGrid:
+    def __init__(self, width: int, height: int, page_size: int, fill: float = np.nan):
+        self.width = width
+        self.height = height
+        self.page_size = page_size
+        self.fill = fill
+        
+        self.page_count_y = -(-height // page_size)
+        
+        # Page key (page x * page_count_y + page y) -> its cells, indexed local x * page_size + local y
+        self.pages: dict[int, array] = {}
+    
+    def get_page_key(self, x: int, y: int) -> int:
+        return (x // self.page_size) * self.page_count_y + y // self.page_size
+    
+    def __getitem__(self, node: int) -> float:
+        x, y = divmod(node, self.height)
+        page = self.pages.get((x // self.page_size) * self.page_count_y + y // self.page_size)
+        
+        if page is None:
+            return self.fill
+        
+        return page[(x % self.page_size) * self.page_size + y % self.page_size]
+    
+    def __setitem__(self, node: int, value: float):
+        x, y = divmod(node, self.height)
+        
+        self.get_page(self.get_page_key(x, y))[(x % self.page_size) * self.page_size + y % self.page_size] = value
+    
+    def get_page(self, key: int) -> array:
+        page = self.pages.get(key)
+        
+        if page is None:
+            page = self.pages[key] = array("d", [self.fill]) * (self.page_size * self.page_size)
+        
+        return page
+    
+    def get_page_array(self, page: array) -> np.ndarray:
+        # Writable numpy view on a page, indexed [local x, local y]
+        return np.frombuffer(page, dtype=np.float64).reshape((self.page_size, self.page_size))
+    
+    # Values at an array of nodes
+    def get_values(self, nodes: np.ndarray) -> np.ndarray:
+        xs, ys = np.divmod(nodes, self.height)
+        keys = (xs // self.page_size) * self.page_count_y + ys // self.page_size
+        
+        values = np.full(len(nodes), self.fill, dtype=np.float64)
+        
+        for key in np.unique(keys).tolist():
+            page = self.pages.get(key)
+            
+            if page is not None:
+                on_page = keys == key
+                values[on_page] = self.get_page_array(page)[xs[on_page] % self.page_size, ys[on_page] % self.page_size]
+        
+        return values
+    
+    # The pages a block of tiles starting at location touches, as (page key, block columns, block rows), wrapping around the world edges
+    def get_block_pages(self, location: Location, width: int, height: int) -> list[tuple[int, np.ndarray, np.ndarray]]:
+        xs = np.arange(location[0], location[0] + width) % self.width
+        ys = np.arange(location[1], location[1] + height) % self.height
+        
+        page_xs, page_ys = xs // self.page_size, ys // self.page_size
+        
+        block_pages = []
+        
+        for page_x in np.unique(page_xs).tolist():
+            columns = np.flatnonzero(page_xs == page_x)
+            
+            for page_y in np.unique(page_ys).tolist():
+                rows = np.flatnonzero(page_ys == page_y)
+                block_pages.append((page_x * self.page_count_y + page_y, columns, rows))
+        
+        return block_pages
+    
+    def get_block(self, location: Location, width: int, height: int) -> np.ndarray:
+        block = np.full((width, height), self.fill, dtype=np.float64)
+        
+        for key, columns, rows in self.get_block_pages(location, width, height):
+            page = self.pages.get(key)
+            
+            if page is not None:
+                block[np.ix_(columns, rows)] = self.get_page_array(page)[np.ix_((location[0] + columns) % self.width % self.page_size, (location[1] + rows) % self.height % self.page_size)]
+        
+        return block
+    
+    def set_block(self, location: Location, values: np.ndarray):
+        width, height = values.shape
+        
+        for key, columns, rows in self.get_block_pages(location, width, height):
+            page = self.get_page_array(self.get_page(key))
+            page[np.ix_((location[0] + columns) % self.width % self.page_size, (location[1] + rows) % self.height % self.page_size)] = values[np.ix_(columns, rows)]
+    
+    # Sets a block back to fill, without creating pages for it
+    def clear_block(self, location: Location, width: int, height: int):
+        for key, columns, rows in self.get_block_pages(location, width, height):
+            page = self.pages.get(key)
+            
+            if page is not None:
+                self.get_page_array(page)[np.ix_((location[0] + columns) % self.width % self.page_size, (location[1] + rows) % self.height % self.page_size)] = self.fill
+    
+    def get_memory_size(self) -> int:
+        return 8 * self.page_size * self.page_size * len(self.pages)
\ No newline at end of file
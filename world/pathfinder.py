@@ -0,0 +1,571 @@
+from __future__ import annotations
+from array import array
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import heapq
+import math
+
+import numpy as np
+
+from object_types import Location
+
+from .pagedgrid import PagedGrid
+from .tilestore import BUILDING_TYPES
+
+DIAGONAL_EXTRA = math.sqrt(2) - 1
+
+# Neighbour offsets with the distance of the step, diagonal steps are allowed everywhere
+NEIGHBOURS = [(-1, -1, math.sqrt(2)), (-1, 0, 1), (-1, 1, math.sqrt(2)), (0, -1, 1), (0, 1, 1), (1, -1, math.sqrt(2)), (1, 0, 1), (1, 1, math.sqrt(2))]
+
+# Per neighbour offset, the directions a jump point search continues in from a uniform tile it reached in that direction:
+# straight on, plus both straight parts of a diagonal
+JUMP_DIRECTIONS = {
+    (dx, dy, distance): [(dx, 0, 1), (0, dy, 1), (dx, dy, distance)] if dx != 0 and dy != 0 else [(dx, dy, distance)]
+    for dx, dy, distance in NEIGHBOURS
+}
+
+# A* over the pathing cost of every tile in the world, kept in one flat array indexed x * height + y.
+# The costs are filled once when the world is generated and patched when a tile's terrain or building changes, so a search only pays for the tiles it expands.
+# Worlds whose chunks are generated lazily keep their costs in pages instead (see PagedGrid), which only exist where chunks were generated.
+# Paths wrap around the world edges. Moving onto a tile costs the step distance times the tile's cost, a cost of 0 can not be entered.
+# Searches can also use jump points (see search_jump_points), which cross areas of equal cost in straight lines instead of expanding every tile.
+class GridPathfinder:
+    # Width and height in tiles of a page of costs in lazy worlds
+    cost_page_size: int = 64
+    
+    def __init__(self):
+        self.width = 0
+        self.height = 0
+        
+        self.costs: array|memoryview|PagedGrid = array("d")
+        self.terrain_costs: np.ndarray|None = None
+        self.min_cost = 1.0
+        
+        # Called with a location whose cost is not known yet (NaN), to fill in the costs around it. Used for chunks that are not generated yet.
+        self.cost_loader: Callable[[Location], None]|None = None
+        
+        # Called with the location, width and height of every block of tiles whose costs were set
+        self.change_listeners: list[Callable[[Location, int, int], None]] = []
+        
+        # Set once the costs live in shared memory, see share_costs
+        self.shared_memory: SharedMemory|None = None
+        
+        # Per tile, whether it and its eight neighbours can all be entered at the same cost. Built by the first jump point search.
+        self.uniform: np.ndarray|None = None
+        
+        # Nodes the last search expanded, and whether it gave up on reaching its target because of max_nodes or max_cost
+        self.expanded_nodes = 0
+        self.capped = False
+    
+    def reset(self, width: int, height: int, terrain_costs: np.ndarray, cost_loader: Callable[[Location], None]|None = None):
+        self.release_shared_costs()
+        
+        self.width = width
+        self.height = height
+        self.terrain_costs = terrain_costs
+        self.cost_loader = cost_loader
+        
+        # The heuristic may never overestimate, so it assumes every step is over the cheapest terrain
+        self.min_cost = float(terrain_costs[terrain_costs > 0].min())
+        
+        if cost_loader is not None:
+            self.costs = PagedGrid(width, height, self.cost_page_size)
+        else:
+            self.costs = array("d", bytes(8 * width * height))
+            self.get_cost_array()[:] = np.nan
+        
+        self.uniform = None
+    
+    # Moves the costs into shared memory, so worker processes can search the same array, and returns its name.
+    # Patches keep going to the shared array, a worker sees them from its next search on.
+    def share_costs(self) -> str:
+        if self.is_paged():
+            raise ValueError("Costs kept in pages can not be shared")
+        
+        if self.shared_memory is None:
+            shared_memory = SharedMemory(create=True, size=max(1, 8 * self.width * self.height))
+            np.ndarray((self.width * self.height,), dtype=np.float64, buffer=shared_memory.buf)[:] = np.frombuffer(self.costs, dtype=np.float64)
+            
+            self.costs = shared_memory.buf.cast("d")
+            self.shared_memory = shared_memory
+        
+        return self.shared_memory.name
+    
+    def release_shared_costs(self):
+        if self.shared_memory is None:
+            return
+        
+        costs = array("d", self.costs.tobytes())
+        
+        self.costs.release()
+        self.costs = costs
+        
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+        self.shared_memory = None
+    
+    def is_initialized(self) -> bool:
+        return self.width > 0
+    
+    def is_paged(self) -> bool:
+        return isinstance(self.costs, PagedGrid)
+    
+    def get_cost_array(self) -> np.ndarray:
+        if self.is_paged():
+            raise ValueError("Costs kept in pages have no array for the whole world, use get_cost_block")
+        
+        # Writable numpy view on the flat cost array, indexed [x, y]
+        return np.frombuffer(self.costs, dtype=np.float64).reshape((self.width, self.height))
+    
+    # Copy of the costs of a block of tiles starting at location, wrapping around the world edges. NaN where the cost is not known yet.
+    def get_cost_block(self, location: Location, width: int, height: int) -> np.ndarray:
+        if self.is_paged():
+            return self.costs.get_block(location, width, height)
+        
+        xs = np.arange(location[0], location[0] + width) % self.width
+        ys = np.arange(location[1], location[1] + height) % self.height
+        
+        return self.get_cost_array()[np.ix_(xs, ys)]
+    
+    # Costs at an array of nodes
+    def get_costs(self, nodes: np.ndarray) -> np.ndarray:
+        if self.is_paged():
+            return self.costs.get_values(nodes)
+        
+        return np.frombuffer(self.costs, dtype=np.float64)[nodes]
+    
+    def get_tile_costs(self, terrain_ids: np.ndarray, building_ids: np.ndarray) -> np.ndarray:
+        costs = self.terrain_costs[terrain_ids]
+        costs[~self.get_building_passability()[building_ids]] = 0
+        
+        return costs
+    
+    def get_building_passability(self) -> np.ndarray:
+        # Per building id, whether the building can be walked through. Id 0 is no building.
+        return np.array([getattr(building_type, "passable", True) for building_type in BUILDING_TYPES])
+    
+    # Patch the costs of a block of tiles starting at location, from their terrain and building ids
+    def set_region(self, location: Location, terrain_ids: np.ndarray, building_ids: np.ndarray):
+        if not self.is_initialized():
+            return
+        
+        width, height = terrain_ids.shape
+        
+        if self.is_paged():
+            self.costs.set_block(location, self.get_tile_costs(terrain_ids, building_ids))
+        else:
+            self.get_cost_array()[location[0]:location[0] + width, location[1]:location[1] + height] = self.get_tile_costs(terrain_ids, building_ids)
+        
+        self.update_uniform(location, width, height)
+        
+        for listener in self.change_listeners:
+            listener(location, width, height)
+    
+    def set_tile(self, location: Location, terrain_id: int, building_id: int):
+        if not self.is_initialized():
+            return
+        
+        cost = self.terrain_costs[terrain_id] if self.get_building_passability()[building_id] else 0
+        self.costs[self.get_node(location)] = float(cost)
+        self.update_uniform(location, 1, 1)
+        
+        for listener in self.change_listeners:
+            listener(location, 1, 1)
+    
+    # Whether each tile of a block, and its eight neighbours, can all be entered at the same cost. Tiles with an unknown cost never are.
+    def get_uniform_tiles(self, location: Location, width: int, height: int) -> np.ndarray:
+        costs = self.get_cost_block((location[0] - 1, location[1] - 1), width + 2, height + 2)
+        centre = costs[1:-1, 1:-1]
+        
+        uniform = centre > 0
+        for dx, dy, _ in NEIGHBOURS:
+            uniform &= costs[1 + dx:costs.shape[0] - 1 + dx, 1 + dy:costs.shape[1] - 1 + dy] == centre
+        
+        return uniform
+    
+    def get_uniform(self) -> np.ndarray:
+        if self.uniform is None:
+            self.uniform = self.get_uniform_tiles((0, 0), self.width, self.height).ravel()
+        
+        return self.uniform
+    
+    def update_uniform(self, location: Location, width: int, height: int):
+        if self.uniform is None:
+            return
+        
+        # A changed tile also changes whether its neighbours are uniform
+        location = (location[0] - 1, location[1] - 1)
+        width, height = min(width + 2, self.width), min(height + 2, self.height)
+        
+        xs = np.arange(location[0], location[0] + width) % self.width
+        ys = np.arange(location[1], location[1] + height) % self.height
+        
+        self.uniform.reshape((self.width, self.height))[np.ix_(xs, ys)] = self.get_uniform_tiles(location, width, height)
+    
+    def get_cost(self, node: int) -> float:
+        cost = self.costs[node]
+        
+        if cost != cost:
+            # NaN, the tile is not generated yet
+            if self.cost_loader is None:
+                return 0
+            
+            self.cost_loader(divmod(node, self.height))
+            cost = self.costs[node]
+            
+            if cost != cost:
+                return 0
+        
+        return cost
+    
+    def get_heuristic(self, x: int, y: int, target_x: int, target_y: int) -> float:
+        dx = abs(x - target_x)
+        dx = min(dx, self.width - dx)
+        dy = abs(y - target_y)
+        dy = min(dy, self.height - dy)
+        
+        # Octile distance, the cheapest way to cover dx and dy with straight and diagonal steps
+        return (max(dx, dy) + DIAGONAL_EXTRA * min(dx, dy)) * self.min_cost
+    
+    # Start and size of the range along one axis that covers start and target (the short way around the world) plus padding on both sides.
+    # Returns None if that range covers the whole axis.
+    def get_search_range(self, start: int, target: int, size: int, padding: int) -> tuple[int, int]|None:
+        offset = (target - start) % size
+        if offset > size // 2:
+            offset -= size
+        
+        range_size = abs(offset) + 2 * padding
+        if range_size >= size - 1:
+            return None
+        
+        return ((min(start, start + offset) - padding) % size, range_size)
+    
+    def get_node(self, location: Location) -> int:
+        return (location[0] % self.width) * self.height + location[1] % self.height
+    
+    # Locations from start to target, both included. Empty if the target can not be reached.
+    # With padding, the search stays inside the box spanned by start and target grown by padding tiles on every side.
+    # With jump_points, searches with search_jump_points instead of search. Costs kept in pages always use search, jump points need to know
+    # for every tile of the world whether it is uniform.
+    # A search expands at most max_nodes nodes and gives up once every path left would cost more than max_cost. A search that gave up returns
+    # an empty path, or with partial the path to the tile it found closest to the target.
+    def find_path(self, start: Location, target: Location, padding: int|None = None, jump_points: bool = False, max_nodes: int|None = None, max_cost: float|None = None, partial: bool = False) -> list[Location]:
+        start_node = self.get_node(start)
+        target_node = self.get_node(target)
+        
+        range_x = range_y = None
+        if padding is not None:
+            range_x = self.get_search_range(start_node // self.height, target_node // self.height, self.width, padding)
+            range_y = self.get_search_range(start_node % self.height, target_node % self.height, self.height, padding)
+        
+        if jump_points and not self.is_paged():
+            return self.search_jump_points(start_node, target_node, range_x, range_y, max_nodes, max_cost, partial)
+        
+        return self.search(start_node, target_node, range_x, range_y, max_nodes, max_cost, partial)
+    
+    # A* between two nodes. A range is the start and size of the allowed part of an axis, the search never leaves it. None allows the whole axis.
+    # max_nodes, max_cost and partial limit the search like in find_path.
+    def search(self, start_node: int, target_node: int, range_x: tuple[int, int]|None = None, range_y: tuple[int, int]|None = None, max_nodes: int|None = None, max_cost: float|None = None, partial: bool = False) -> list[Location]:
+        width, height = self.width, self.height
+        min_cost = self.min_cost
+        
+        start_x, start_y = divmod(start_node, height)
+        target_x, target_y = divmod(target_node, height)
+        
+        self.capped = False
+        
+        if self.get_cost(target_node) == 0:
+            return []
+        
+        costs = self.costs
+        
+        g_costs = {start_node: 0.0}
+        parents = {start_node: None}
+        closed = set()
+        
+        # Ties are broken on the heuristic, so the search keeps going towards the target instead of widening
+        start_heuristic = self.get_heuristic(start_x, start_y, target_x, target_y)
+        open_heap = [(start_heuristic, start_heuristic, start_node)]
+        
+        # The expanded node closest to the target, where a partial path leads
+        closest_node, closest_heuristic = start_node, start_heuristic
+        
+        while open_heap:
+            f_cost, node_heuristic, node = heapq.heappop(open_heap)
+            
+            if node in closed:
+                continue
+            
+            if node == target_node:
+                self.expanded_nodes = len(closed)
+                return self.get_path(parents, node)
+            
+            # Every node left in the heap costs at least f_cost
+            if (max_nodes is not None and len(closed) >= max_nodes) or (max_cost is not None and f_cost > max_cost):
+                self.capped = True
+                break
+            
+            closed.add(node)
+            
+            if node_heuristic < closest_heuristic:
+                closest_node, closest_heuristic = node, node_heuristic
+            
+            x, y = divmod(node, height)
+            node_g_cost = g_costs[node]
+            
+            for dx, dy, distance in NEIGHBOURS:
+                neighbour_x = (x + dx) % width
+                neighbour_y = (y + dy) % height
+                
+                if range_x is not None and (neighbour_x - range_x[0]) % width > range_x[1]:
+                    continue
+                if range_y is not None and (neighbour_y - range_y[0]) % height > range_y[1]:
+                    continue
+                
+                neighbour = neighbour_x * height + neighbour_y
+                
+                if neighbour in closed:
+                    continue
+                
+                cost = costs[neighbour]
+                if cost != cost:
+                    cost = self.get_cost(neighbour)
+                
+                if cost == 0:
+                    continue
+                
+                g_cost = node_g_cost + distance * cost
+                
+                if g_cost < g_costs.get(neighbour, math.inf):
+                    g_costs[neighbour] = g_cost
+                    parents[neighbour] = node
+                    
+                    # get_heuristic, inlined as this runs for every neighbour
+                    heuristic_x = abs(neighbour_x - target_x)
+                    if heuristic_x > width - heuristic_x:
+                        heuristic_x = width - heuristic_x
+                    heuristic_y = abs(neighbour_y - target_y)
+                    if heuristic_y > height - heuristic_y:
+                        heuristic_y = height - heuristic_y
+                    
+                    if heuristic_x > heuristic_y:
+                        heuristic = (heuristic_x + DIAGONAL_EXTRA * heuristic_y) * min_cost
+                    else:
+                        heuristic = (heuristic_y + DIAGONAL_EXTRA * heuristic_x) * min_cost
+                    
+                    heapq.heappush(open_heap, (g_cost + heuristic, heuristic, neighbour))
+        
+        self.expanded_nodes = len(closed)
+        
+        if self.capped and partial:
+            return self.get_path(parents, closest_node)
+        
+        return []
+    
+    # Jump point search, for the same paths as search with far fewer expanded nodes where many tiles in a row share a cost.
+    # A tile is uniform when it and its eight neighbours can all be entered at the same cost. Uniform tiles have no forced neighbours,
+    # so from them the search only continues in the direction it came from (and its two straight parts for a diagonal) and jumps until it reaches
+    # the target or a tile that is not uniform. Tiles that are not uniform, where costs change, are expanded in every direction like search does.
+    # The edges of the search ranges act as walls.
+    def search_jump_points(self, start_node: int, target_node: int, range_x: tuple[int, int]|None = None, range_y: tuple[int, int]|None = None, max_nodes: int|None = None, max_cost: float|None = None, partial: bool = False) -> list[Location]:
+        width, height = self.width, self.height
+        
+        start_x, start_y = divmod(start_node, height)
+        target_x, target_y = divmod(target_node, height)
+        
+        self.capped = False
+        
+        if self.get_cost(target_node) == 0:
+            return []
+        
+        # Indexing a memoryview is much faster than indexing the array
+        uniform = memoryview(self.get_uniform())
+        costs = self.costs
+        
+        g_costs = {start_node: 0.0}
+        # Node -> (parent node, direction of the jump, number of steps)
+        parents: dict[int, tuple[int, int, int, int]|None] = {start_node: None}
+        closed = set()
+        
+        min_cost = self.min_cost
+        
+        # Entries also hold the direction their node was reached in, None for the start
+        start_heuristic = self.get_heuristic(start_x, start_y, target_x, target_y)
+        open_heap = [(start_heuristic, start_heuristic, start_node, None)]
+        
+        closest_node, closest_heuristic = start_node, start_heuristic
+        
+        while open_heap:
+            f_cost, node_heuristic, node, direction = heapq.heappop(open_heap)
+            
+            if node in closed:
+                continue
+            
+            if node == target_node:
+                self.expanded_nodes = len(closed)
+                return self.get_jump_path(parents, node)
+            
+            # Every node left in the heap costs at least f_cost
+            if (max_nodes is not None and len(closed) >= max_nodes) or (max_cost is not None and f_cost > max_cost):
+                self.capped = True
+                break
+            
+            closed.add(node)
+            
+            if node_heuristic < closest_heuristic:
+                closest_node, closest_heuristic = node, node_heuristic
+            
+            x, y = divmod(node, height)
+            node_g_cost = g_costs[node]
+            
+            directions = JUMP_DIRECTIONS[direction] if direction is not None and uniform[node] else NEIGHBOURS
+            
+            for neighbour_direction in directions:
+                dx, dy, distance = neighbour_direction
+                
+                neighbour_x = (x + dx) % width
+                neighbour_y = (y + dy) % height
+                
+                if range_x is not None and (neighbour_x - range_x[0]) % width > range_x[1]:
+                    continue
+                if range_y is not None and (neighbour_y - range_y[0]) % height > range_y[1]:
+                    continue
+                
+                neighbour = neighbour_x * height + neighbour_y
+                
+                if uniform[neighbour] and neighbour != target_node:
+                    jump = self.jump(x, y, dx, dy, target_node, range_x, range_y, uniform)
+                    
+                    if jump is None:
+                        continue
+                    
+                    neighbour, steps, cost = jump
+                    neighbour_x, neighbour_y = divmod(neighbour, height)
+                else:
+                    # Where costs change the search takes single steps, like search
+                    cost = costs[neighbour]
+                    if cost != cost:
+                        cost = self.get_cost(neighbour)
+                    
+                    if cost == 0:
+                        continue
+                    
+                    steps = 1
+                
+                if neighbour in closed:
+                    continue
+                
+                g_cost = node_g_cost + steps * distance * cost
+                
+                if g_cost < g_costs.get(neighbour, math.inf):
+                    g_costs[neighbour] = g_cost
+                    parents[neighbour] = (node, dx, dy, steps)
+                    
+                    # get_heuristic, inlined as in search
+                    heuristic_x = abs(neighbour_x - target_x)
+                    if heuristic_x > width - heuristic_x:
+                        heuristic_x = width - heuristic_x
+                    heuristic_y = abs(neighbour_y - target_y)
+                    if heuristic_y > height - heuristic_y:
+                        heuristic_y = height - heuristic_y
+                    
+                    if heuristic_x > heuristic_y:
+                        heuristic = (heuristic_x + DIAGONAL_EXTRA * heuristic_y) * min_cost
+                    else:
+                        heuristic = (heuristic_y + DIAGONAL_EXTRA * heuristic_x) * min_cost
+                    
+                    heapq.heappush(open_heap, (g_cost + heuristic, heuristic, neighbour, neighbour_direction))
+        
+        self.expanded_nodes = len(closed)
+        
+        if self.capped and partial:
+            return self.get_jump_path(parents, closest_node)
+        
+        return []
+    
+    # Steps from (x, y) in direction (dx, dy) until the next jump point. Returns its node, the number of steps and the cost of every tile stepped on,
+    # or None if the direction leads nowhere: into a tile that can not be entered, out of the search ranges or all the way around the world.
+    def jump(self, x: int, y: int, dx: int, dy: int, target_node: int, range_x: tuple[int, int]|None, range_y: tuple[int, int]|None, uniform: memoryview) -> tuple[int, int, float]|None:
+        width, height = self.width, self.height
+        
+        cost = None
+        steps = 0
+        max_steps = max(width, height)
+        
+        while steps < max_steps:
+            x = (x + dx) % width
+            y = (y + dy) % height
+            steps += 1
+            
+            if range_x is not None and (x - range_x[0]) % width > range_x[1]:
+                return None
+            if range_y is not None and (y - range_y[0]) % height > range_y[1]:
+                return None
+            
+            node = x * height + y
+            
+            if cost is None:
+                # Only the first tile can differ from the tile the jump started on, every later one is a neighbour of a uniform tile
+                cost = self.get_cost(node)
+                
+                if cost == 0:
+                    return None
+            
+            if node == target_node or not uniform[node]:
+                return (node, steps, cost)
+            
+            # A diagonal jump stops where one of its straight parts finds a jump point
+            if dx != 0 and dy != 0 and (self.jump(x, y, dx, 0, target_node, range_x, range_y, uniform) is not None or self.jump(x, y, 0, dy, target_node, range_x, range_y, uniform) is not None):
+                return (node, steps, cost)
+        
+        return None
+    
+    def get_jump_path(self, parents: dict[int, tuple[int, int, int, int]|None], node: int) -> list[Location]:
+        path = []
+        
+        while parents[node] is not None:
+            parent, dx, dy, steps = parents[node]
+            x, y = divmod(node, self.height)
+            
+            # The tiles of the jump, from its end back to just after its start
+            for step in range(steps):
+                path.append(((x - step * dx) % self.width, (y - step * dy) % self.height))
+            
+            node = parent
+        
+        path.append(divmod(node, self.height))
+        path.reverse()
+        
+        return path
+    
+    def get_path(self, parents: dict[int, int|None], node: int) -> list[Location]:
+        path = []
+        
+        while node is not None:
+            path.append(divmod(node, self.height))
+            node = parents[node]
+        
+        path.reverse()
+        
+        return path
+
+
+grid_pathfinder = GridPathfinder()
+
+# Runs in a worker process: grid searches (see GridPathfinder.find_path) over the costs a GridPathfinder shared with share_costs.
+# Tiles that are not generated yet can not be entered here, the worker can not generate them.
+def find_paths_shared(shared_memory_name: str, width: int, height: int, min_cost: float, requests: list[tuple[Location, Location]], padding: int|None = None, jump_points: bool = False, max_nodes: int|None = None, max_cost: float|None = None) -> list[list[Location]]:
+    shared_memory = SharedMemory(name=shared_memory_name)
+    
+    pathfinder = GridPathfinder()
+    pathfinder.width = width
+    pathfinder.height = height
+    pathfinder.min_cost = min_cost
+    pathfinder.costs = shared_memory.buf.cast("d")
+    
+    try:
+        return [pathfinder.find_path(start, target, padding=padding, jump_points=jump_points, max_nodes=max_nodes, max_cost=max_cost, partial=True) for start, target in requests]
+    finally:
+        pathfinder.costs.release()
+        shared_memory.close()
\ No newline at end of file
@@ -0,0 +1,147 @@
+from __future__ import annotations
+from typing import Callable, TYPE_CHECKING
+
+from object_types import Location
+
+if TYPE_CHECKING:
+    import obj.worldobj.resourcenode
+
+# Spatial index of every resource node in the (loaded part of the) world, so resource lookups only look at nodes near the searched location.
+# Nodes are grouped by their node type and harvestable resource type, and within a group bucketed by square cells of bucket_size tiles.
+# Distances wrap around the world edges, like World.get_distance_between.
+class ResourceIndex:
+    def __init__(self):
+        self.width = 0
+        self.height = 0
+        self.bucket_size = 16
+        
+        # (node type, harvestable resource type) -> bucket coordinates -> location -> node
+        self.groups: dict[tuple[type, type], dict[Location, dict[Location, obj.worldobj.resourcenode.ResourceNode]]] = {}
+    
+    def reset(self, width: int, height: int, bucket_size: int):
+        self.width = width
+        self.height = height
+        self.bucket_size = bucket_size
+        self.groups = {}
+    
+    def get_group_key(self, node: obj.worldobj.resourcenode.ResourceNode) -> tuple[type, type]:
+        return (type(node), type(node.harvestable_resource))
+    
+    def get_bucket(self, location: Location) -> Location:
+        return (location[0] // self.bucket_size, location[1] // self.bucket_size)
+    
+    def add(self, location: Location, node: obj.worldobj.resourcenode.ResourceNode):
+        group = self.groups.setdefault(self.get_group_key(node), {})
+        group.setdefault(self.get_bucket(location), {})[location] = node
+    
+    def remove(self, location: Location, node: obj.worldobj.resourcenode.ResourceNode):
+        group = self.groups.get(self.get_group_key(node))
+        if group is None:
+            return
+        
+        bucket_coordinates = self.get_bucket(location)
+        bucket = group.get(bucket_coordinates)
+        if bucket is None or location not in bucket:
+            return
+        
+        del bucket[location]
+        
+        if len(bucket) == 0:
+            del group[bucket_coordinates]
+    
+    def get_groups(self, node_type: type|None = None, resource_type: type|None = None) -> list[dict]:
+        # Groups whose node type and harvestable resource type are (subclasses of) the requested types
+        return [
+            group for (group_node_type, group_resource_type), group in self.groups.items()
+            if (node_type is None or issubclass(group_node_type, node_type)) and (resource_type is None or issubclass(group_resource_type, resource_type))
+        ]
+    
+    def get_offsets(self, location: Location, other: Location) -> tuple[int, int]:
+        dx = abs(location[0] - other[0]) % self.width
+        dy = abs(location[1] - other[1]) % self.height
+        
+        return (min(dx, self.width - dx), min(dy, self.height - dy))
+    
+    def get_distance(self, location: Location, other: Location) -> int:
+        dx, dy = self.get_offsets(location, other)
+        return dx + dy
+    
+    def get_bucket_count(self) -> tuple[int, int]:
+        return (-(-self.width // self.bucket_size), -(-self.height // self.bucket_size))
+    
+    def get_buckets_in_range(self, center_bucket: int, bucket_range: int, bucket_count: int) -> list[int]:
+        # Bucket coordinates from center - range to center + range, wrapped around the world, each at most once
+        if 2 * bucket_range + 1 >= bucket_count:
+            return list(range(bucket_count))
+        
+        return [(center_bucket + offset) % bucket_count for offset in range(-bucket_range, bucket_range + 1)]
+    
+    # Nodes within distance tiles on both axes (a square around location), closest first.
+    # Returns (distance, location, node) tuples, distance being the wrapped Manhattan distance.
+    def find_within(self, location: Location, distance: int, groups: list[dict], condition: Callable|None = None) -> list[tuple[int, Location, obj.worldobj.resourcenode.ResourceNode]]:
+        bucket_count_x, bucket_count_y = self.get_bucket_count()
+        
+        # Buckets overlapping the square, the square can start and end halfway a bucket
+        bucket_xs = self.get_buckets_in_range(location[0] // self.bucket_size, distance // self.bucket_size + 1, bucket_count_x)
+        bucket_ys = self.get_buckets_in_range(location[1] // self.bucket_size, distance // self.bucket_size + 1, bucket_count_y)
+        
+        found = []
+        
+        for group in groups:
+            for bucket_x in bucket_xs:
+                for bucket_y in bucket_ys:
+                    bucket = group.get((bucket_x, bucket_y))
+                    if bucket is None:
+                        continue
+                    
+                    for node_location, node in bucket.items():
+                        dx, dy = self.get_offsets(location, node_location)
+                        
+                        if dx <= distance and dy <= distance and (condition is None or condition(node)):
+                            found.append((dx + dy, node_location, node))
+        
+        found.sort(key=lambda entry: (entry[0], entry[1]))
+        
+        return found
+    
+    # The count nodes closest to location (wrapped Manhattan distance), no further away than max_distance. Returns (distance, location, node) tuples, closest first.
+    def find_nearest(self, location: Location, count: int, groups: list[dict], max_distance: int|None = None, condition: Callable|None = None) -> list[tuple[int, Location, obj.worldobj.resourcenode.ResourceNode]]:
+        bucket_count_x, bucket_count_y = self.get_bucket_count()
+        center_x, center_y = self.get_bucket(location)
+        
+        max_ring = max(bucket_count_x, bucket_count_y) // 2 + 1
+        if max_distance is not None:
+            max_ring = min(max_ring, max_distance // self.bucket_size + 1)
+        
+        found = []
+        visited = set()
+        
+        # Search rings of buckets around the location's bucket. A node outside the first rings rings is at least ring * bucket_size + 1 tiles away,
+        # so once enough nodes are found closer than that the search can stop.
+        for ring in range(max_ring + 1):
+            for bucket_x in range(center_x - ring, center_x + ring + 1):
+                for bucket_y in range(center_y - ring, center_y + ring + 1):
+                    if max(abs(bucket_x - center_x), abs(bucket_y - center_y)) != ring:
+                        continue
+                    
+                    bucket_coordinates = (bucket_x % bucket_count_x, bucket_y % bucket_count_y)
+                    if bucket_coordinates in visited:
+                        continue
+                    visited.add(bucket_coordinates)
+                    
+                    for group in groups:
+                        for node_location, node in group.get(bucket_coordinates, {}).items():
+                            distance = self.get_distance(location, node_location)
+                            
+                            if (max_distance is None or distance <= max_distance) and (condition is None or condition(node)):
+                                found.append((distance, node_location, node))
+            
+            found.sort(key=lambda entry: (entry[0], entry[1]))
+            
+            if len(found) >= count and found[count - 1][0] <= ring * self.bucket_size:
+                break
+        
+        return found[:count]
+
+
+resource_index = ResourceIndex()
\ No newline at end of file
@@ -9,4 +9,9 @@ from .mountainpeak import MountainPeak
 from .ocean import Ocean
 from .tundra import Tundra
 from .river import River
-from .shallowcoastalwater import ShallowCoastalWater
\ No newline at end of file
+from .shallowcoastalwater import ShallowCoastalWater
+from .registry import terrain_registry
+
+# Registration order determines the terrain ids, Unland is id 0 so an empty id array reads as "no terrain"
+for terrain_type in [Unland, Ocean, ShallowCoastalWater, Plains, Hills, Mountain, MountainPeak, Desert, Tundra, Forest, River]:
+    terrain_registry.register(terrain_type)
\ No newline at end of file
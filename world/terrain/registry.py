@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import numpy as np
+
+from world.terrain.terrain import Terrain
+
+# Keeps exactly one (immutable) instance of every terrain type and gives each type a small integer id.
+# Tiles only store the id, so comparing terrains is an id or identity check instead of a dataclass field comparison.
+class TerrainRegistry:
+    def __init__(self):
+        self.terrains: list[Terrain] = []
+    
+    def register(self, terrain_type: type[Terrain]) -> Terrain:
+        if "id" in terrain_type.__dict__:
+            return self.terrains[terrain_type.id]
+        
+        terrain_type.id = len(self.terrains)
+        self.terrains.append(terrain_type())
+        
+        return self.terrains[terrain_type.id]
+    
+    def get(self, terrain_type: type[Terrain]) -> Terrain:
+        return self.terrains[terrain_type.id]
+    
+    def by_id(self, terrain_id: int) -> Terrain:
+        return self.terrains[terrain_id]
+    
+    def ids_of(self, *terrain_types: type[Terrain]) -> tuple[int, ...]:
+        return tuple(terrain_type.id for terrain_type in terrain_types)
+    
+    # Lookup table indexed by terrain id, so an array of terrain ids can be turned into an array of speeds with one indexing operation
+    def speed_multipliers(self) -> np.ndarray:
+        return np.array([terrain.speed_multiplier for terrain in self.terrains], dtype=np.float64)
+
+
+terrain_registry = TerrainRegistry()
\ No newline at end of file
@@ -1,4 +1,4 @@
-from dataclasses import field, dataclass
+from dataclasses import dataclass
 from typing import Type
 from object_types import Colour
 from obj.item.item import Item
@@ -12,14 +12,15 @@ class TerrainHeight:
     MOUNTAIN = 0.8
     MOUNTAIN_PEAK = 1
 
-@dataclass
+# Terrains are flyweights: one shared instance per type lives in the terrain registry, so they are frozen and compared by identity
+@dataclass(frozen=True, eq=False)
 class Terrain():
     name: str
     colour: Colour
     speed_multiplier: float = 1.0   
     fertility: int = 1
     can_spawn_resource: bool = False
-    possible_resources: dict[int, Type] = field(default_factory=dict)
+    possible_resources: tuple[Type, ...] = ()
     
     def get_pathing_cost(self):
         return 1 / self.speed_multiplier
\ No newline at end of file
@@ -6,7 +6,10 @@ from obj.worldobj.building import Building
 from obj.worldobj.resourcenode import NoResource
 
 from .biome import Biome
-from .terrain import Terrain
+from .terrain import Terrain, terrain_registry
+from .tilestore import RESOURCE_NODE_TYPES, BUILDING_TYPES, type_id
+from .resourceindex import resource_index
+from .pathfinder import grid_pathfinder
 
 from observer import Subject
 
@@ -21,42 +24,164 @@ if TYPE_CHECKING:
     import obj.worldobj.creatures.pop
     import obj.worldobj
     import obj.worldobj.building
+    import world.tilemanager
 
+# Shared by every tile without a resource node
+NO_RESOURCE = NoResource()
+
+def get_world_tile(location: Location) -> Tile:
+    from world.world import world
+    return world.get_tile(location)
+
+# A Tile is a light view on one cell of its chunk's TileManager, the actual data lives in the tile manager's arrays and dicts.
+# Tiles are created on demand, so two Tile objects for the same location are equal but not identical.
 class Tile(Subject):
-    pops: dict[str, obj.worldobj.creatures.pop.Pop]
-    animals: list[obj.worldobj.creatures.animal.Animal] = []
-    resourcenode: obj.worldobj.resourcenode.ResourceNode = NoResource()
-    terrain: Terrain
-    biome: Biome
-    building: Building
-    colour_override: Colour|None
-    location: Location
-    
-    def __init__(self, location: Location, local_coordinates: Location, terrain: Terrain, biome: Biome):
+    logger = Logger("Tile", logger_manager)
+    
+    def __init__(self, tile_manager: world.tilemanager.TileManager, local_coordinates: Location):
         super().__init__()
         
-        self.logger = Logger("Tile", logger_manager)
-        
-        self.location = location
+        self.tile_manager = tile_manager
         self.local_coordinates = local_coordinates # Coordinates within its chunk
         
-        self.terrain = terrain
-        self.biome = biome
-        
-        self.pops = {}
+        chunk = tile_manager.chunk
+        self.location = (chunk.location[0] + local_coordinates[0], chunk.location[1] + local_coordinates[1])
         
-        self.colour_override = None
-        self.dirty = True
+        self.register_observer(chunk)
     
     def __str__(self):
         return "Tile%s" % str(self.location)
     
+    def __eq__(self, other):
+        return isinstance(other, Tile) and self.location == other.location
+    
+    def __hash__(self):
+        return hash(self.location)
+    
+    def __reduce__(self):
+        # A tile is only a view, so a pickled tile is looked up again in the world it is loaded into
+        return (get_world_tile, (self.location,))
+    
+    # Changes whenever the terrain, resource node or building of this tile does. Shared by the tiles of a chunk, so it also changes with theirs.
+    @property
+    def version(self) -> int:
+        return self.tile_manager.version
+    
+    @property
+    def terrain_id(self) -> int:
+        return int(self.tile_manager.terrain_ids[self.local_coordinates])
+    
+    @property
+    def terrain(self) -> Terrain:
+        return terrain_registry.terrains[self.tile_manager.terrain_ids[self.local_coordinates]]
+    
+    @terrain.setter
+    def terrain(self, terrain: Terrain):
+        self.tile_manager.terrain_ids[self.local_coordinates] = terrain.id
+        self.tile_manager.unsaved = True
+        self.tile_manager.version += 1
+        
+        self.update_pathing_cost()
+    
+    @property
+    def biome(self) -> Biome:
+        return terrain_registry.terrains[self.tile_manager.biome_ids[self.local_coordinates]]
+    
+    @biome.setter
+    def biome(self, biome: Biome):
+        self.tile_manager.biome_ids[self.local_coordinates] = biome.id
+        self.tile_manager.unsaved = True
+    
+    @property
+    def pops(self) -> dict[str, obj.worldobj.creatures.pop.Pop]:
+        return self.tile_manager.pops.get(self.local_coordinates, {})
+    
+    @property
+    def animals(self) -> list[obj.worldobj.creatures.animal.Animal]:
+        return self.tile_manager.animals.get(self.local_coordinates, [])
+    
+    @property
+    def resourcenode(self) -> obj.worldobj.resourcenode.ResourceNode:
+        return self.tile_manager.resourcenodes.get(self.local_coordinates, NO_RESOURCE)
+    
+    @resourcenode.setter
+    def resourcenode(self, node: obj.worldobj.resourcenode.ResourceNode):
+        previous_node = self.tile_manager.resourcenodes.get(self.local_coordinates)
+        if previous_node is not None:
+            resource_index.remove(self.location, previous_node)
+        
+        self.tile_manager.resourcenodes[self.local_coordinates] = node
+        if not isinstance(node, NoResource):
+            resource_index.add(self.location, node)
+        
+        self.tile_manager.resource_ids[self.local_coordinates] = type_id(RESOURCE_NODE_TYPES, node)
+        self.tile_manager.resource_amounts[self.local_coordinates] = node.resource_amount
+        self.tile_manager.unsaved = True
+        self.tile_manager.version += 1
+    
+    @resourcenode.deleter
+    def resourcenode(self):
+        node = self.tile_manager.resourcenodes.pop(self.local_coordinates, None)
+        if node is not None:
+            resource_index.remove(self.location, node)
+        
+        self.tile_manager.resource_ids[self.local_coordinates] = 0
+        self.tile_manager.resource_amounts[self.local_coordinates] = 0
+        self.tile_manager.unsaved = True
+        self.tile_manager.version += 1
+    
+    @property
+    def building(self) -> Building|None:
+        return self.tile_manager.buildings.get(self.local_coordinates)
+    
+    @building.setter
+    def building(self, building: Building):
+        self.tile_manager.buildings[self.local_coordinates] = building
+        self.tile_manager.building_ids[self.local_coordinates] = type_id(BUILDING_TYPES, building)
+        self.tile_manager.unsaved = True
+        self.tile_manager.version += 1
+        
+        self.update_pathing_cost()
+    
+    @building.deleter
+    def building(self):
+        self.tile_manager.buildings.pop(self.local_coordinates, None)
+        self.tile_manager.building_ids[self.local_coordinates] = 0
+        self.tile_manager.unsaved = True
+        self.tile_manager.version += 1
+        
+        self.update_pathing_cost()
+    
+    @property
+    def colour_override(self) -> Colour|None:
+        return self.tile_manager.colour_overrides.get(self.local_coordinates)
+    
+    @colour_override.setter
+    def colour_override(self, colour: Colour|None):
+        self.tile_manager.unsaved = True
+        
+        if colour is None:
+            self.tile_manager.colour_overrides.pop(self.local_coordinates, None)
+        else:
+            self.tile_manager.colour_overrides[self.local_coordinates] = colour
+    
+    @property
+    def dirty(self) -> bool:
+        return bool(self.tile_manager.dirty[self.local_coordinates])
+    
+    @dirty.setter
+    def dirty(self, dirty: bool):
+        self.tile_manager.dirty[self.local_coordinates] = dirty
+    
     def add_pop(self, pop):
         if len(self.pops) == 0:
             self.notify_observers()
         
-        if pop not in self.pops:
-            self.pops[pop.id] = pop
+        pops = self.tile_manager.pops.setdefault(self.local_coordinates, {})
+        
+        if pop.id not in pops:
+            pops[pop.id] = pop
+            self.tile_manager.pop_counts[self.local_coordinates] += 1
             self.colour_override = pop.colour
         else:
             print("Pop %s already exists in tile %s" % (pop, self))
@@ -65,19 +190,24 @@ class Tile(Subject):
         if len(self.pops) > 0:
             self.notify_observers()
         
-        del self.pops[pop.id]
+        pops = self.tile_manager.pops[self.local_coordinates]
+        del pops[pop.id]
+        self.tile_manager.pop_counts[self.local_coordinates] -= 1
+        
+        if len(pops) == 0:
+            del self.tile_manager.pops[self.local_coordinates]
     
     def add_animal(self, animal: obj.worldobj.creatures.animal.Animal):
         if len(self.animals) == 0:
             self.notify_observers()
         
-        self.animals.append(animal)
+        self.tile_manager.animals.setdefault(self.local_coordinates, []).append(animal)
     
     def remove_animal(self, animal):
         if len(self.animals) > 0:
             self.notify_observers()
         
-        self.animals.remove(animal)
+        self.tile_manager.animals[self.local_coordinates].remove(animal)
     
     def add_resourcenode(self, node):
         if self.resourcenode is not None:
@@ -93,8 +223,20 @@ class Tile(Subject):
             self.notify_observers()
             del self.resourcenode
     
+    def has_resourcenode(self):
+        return self.tile_manager.resource_ids[self.local_coordinates] != 0
+    
+    def harvest_resource(self, amount):
+        resourcenode = self.resourcenode
+        item_stack = resourcenode.harvest(amount)
+        
+        self.tile_manager.resource_amounts[self.local_coordinates] = resourcenode.resource_amount
+        self.tile_manager.unsaved = True
+        
+        return item_stack
+    
     def has_building(self):
-        return hasattr(self, "building") and self.building is not None
+        return self.building is not None
     
     def build(self, building: obj.worldobj.building.Building, pop: obj.worldobj.creatures.pop.Pop):
         inventory = pop.inventory
@@ -121,5 +263,8 @@ class Tile(Subject):
     def has_colour_override(self):
         return self.colour_override is not None
     
+    def update_pathing_cost(self):
+        grid_pathfinder.set_tile(self.location, self.tile_manager.terrain_ids[self.local_coordinates], self.tile_manager.building_ids[self.local_coordinates])
+    
     def get_pathing_cost(self):
         return self.terrain.get_pathing_cost()
\ No newline at end of file
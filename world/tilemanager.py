@@ -1,47 +1,137 @@
 from __future__ import annotations
 
+import numpy as np
+
 from world.tile import Tile
+from world.tilestore import RESOURCE_NODE_TYPES, BUILDING_TYPES
+from world.resourceindex import resource_index
+from world.pathfinder import grid_pathfinder
 
 from typing import List, TYPE_CHECKING
 
+from object_types import Location
+
 if TYPE_CHECKING:
     import world
+    import world.tilestore
 
 class TileManager:
-    tiles: list[list[Tile]]
-    dirty: bool = True
+    dirty: np.ndarray
     
-    def __init__(self, chunk: world.Chunk):
+    def __init__(self, chunk: world.Chunk, store: world.tilestore.TileStore):
         self.chunk = chunk
-        tiles: list[list[Tile]] = []
-        for i in range(chunk.size):
-            tiles_row = []
-            for j in range(chunk.size):
-                tiles_row.append(0)
-            tiles.append(tiles_row)
-        self.tiles = tiles
-    
-    def add_tile(self, tile: Tile):
-        if len(self.tiles) < tile.local_coordinates[0] or len(self.tiles[0]) < tile.local_coordinates[1]:
-            print("Tile	location out of bounds:", tile.get_local_coordinates()[0], tile.get_local_coordinates()[1])
-            return
-        self.tiles[tile.local_coordinates[0]][tile.local_coordinates[1]] = tile
-    
-    def remove_tile(self, tile: Tile):
-        self.tiles.remove(tile)
+        
+        # Per-tile arrays are views into the world's tile store
+        region = store.region(chunk.location[0], chunk.location[1], chunk.size, chunk.size)
+        
+        self.terrain_ids: np.ndarray = region["terrain_ids"]
+        self.biome_ids: np.ndarray = region["biome_ids"]
+        self.resource_ids: np.ndarray = region["resource_ids"]
+        self.resource_amounts: np.ndarray = region["resource_amounts"]
+        self.building_ids: np.ndarray = region["building_ids"]
+        self.pop_counts: np.ndarray = region["pop_counts"]
+        self.dirty: np.ndarray = region["dirty"]
+        
+        # Objects only a few tiles have, keyed by local coordinates
+        self.resourcenodes = {}
+        self.buildings = {}
+        self.pops = {}
+        self.animals = {}
+        self.colour_overrides = {}
+        
+        # Resources as they were generated, see has_modified_resources
+        self.generated_resource_ids: np.ndarray|None = None
+        self.generated_resource_amounts: np.ndarray|None = None
+        
+        # True if the chunk changed since it was last written to a checkpoint
+        self.unsaved = True
+        
+        # Goes up with every change to a tile's terrain, resource node or building, see Tile.version
+        self.version = 0
+    
+    def mark_generated(self):
+        self.generated_resource_ids = self.resource_ids.copy()
+        self.generated_resource_amounts = self.resource_amounts.copy()
+        
+        # A chunk that is exactly as generated can be generated again, it does not need to be saved
+        self.unsaved = False
+    
+    # True if a resource node was added, removed or harvested since the chunk was generated, such a chunk can not simply be generated again
+    def has_modified_resources(self) -> bool:
+        if self.generated_resource_ids is None:
+            return True
+        
+        return not (np.array_equal(self.resource_ids, self.generated_resource_ids) and np.array_equal(self.resource_amounts, self.generated_resource_amounts))
+    
+    # Everything about the chunk's tiles that is not derived from pops, as stored in a checkpoint
+    def get_state(self) -> tuple[dict[str, np.ndarray], np.ndarray]:
+        arrays = {
+            "terrain_ids": self.terrain_ids,
+            "biome_ids": self.biome_ids,
+            "resource_ids": self.resource_ids,
+            "resource_amounts": self.resource_amounts,
+            "building_ids": self.building_ids,
+        }
+        
+        colour_overrides = np.array([(x, y, *colour[:3]) for (x, y), colour in self.colour_overrides.items()], dtype=np.int32).reshape(-1, 5)
+        
+        return arrays, colour_overrides
+    
+    def load_state(self, arrays: dict[str, np.ndarray], colour_overrides: np.ndarray):
+        self.terrain_ids[:] = arrays["terrain_ids"]
+        self.biome_ids[:] = arrays["biome_ids"]
+        self.resource_ids[:] = arrays["resource_ids"]
+        self.resource_amounts[:] = arrays["resource_amounts"]
+        self.building_ids[:] = arrays["building_ids"]
+        
+        # Resource nodes and buildings are rebuilt from their type ids, a node only keeps its amount
+        self.remove_resourcenodes_from_index()
+        self.resourcenodes = {}
+        for x, y in np.argwhere(self.resource_ids != 0):
+            node = RESOURCE_NODE_TYPES[self.resource_ids[x, y]]()
+            node.resource_amount = int(self.resource_amounts[x, y])
+            self.resourcenodes[(int(x), int(y))] = node
+        self.add_resourcenodes_to_index()
+        
+        self.buildings = {}
+        for x, y in np.argwhere(self.building_ids != 0):
+            self.buildings[(int(x), int(y))] = BUILDING_TYPES[self.building_ids[x, y]]()
+        
+        self.colour_overrides = {(int(x), int(y)): (int(r), int(g), int(b)) for x, y, r, g, b in colour_overrides}
+        self.version += 1
+        
+        grid_pathfinder.set_region(self.chunk.location, self.terrain_ids, self.building_ids)
+        
+        # Pops are put back on their tiles separately
+        self.pops = {}
+        self.pop_counts[:] = 0
+        
+        self.dirty[:] = True
+    
+    def get_location(self, local_coordinates: Location) -> Location:
+        return (self.chunk.location[0] + local_coordinates[0], self.chunk.location[1] + local_coordinates[1])
+    
+    def add_resourcenodes_to_index(self):
+        for local_coordinates, node in self.resourcenodes.items():
+            resource_index.add(self.get_location(local_coordinates), node)
+    
+    def remove_resourcenodes_from_index(self):
+        for local_coordinates, node in self.resourcenodes.items():
+            resource_index.remove(self.get_location(local_coordinates), node)
+    
+    @property
+    def tiles(self) -> list[list[Tile]]:
+        width, height = self.terrain_ids.shape
+        return [[Tile(self, (x, y)) for y in range(height)] for x in range(width)]
     
     def get_dirty_tiles(self) -> List[List[Tile]]:
         dirty_tiles = []
-        for tile_row in self.tiles:
-            dirty_row = []
-            for tile in tile_row:
-                if tile.dirty:
-                    dirty_row.append(tile)
-            dirty_tiles.append(dirty_row)
+        for x, dirty_row in enumerate(self.dirty):
+            dirty_tiles.append([Tile(self, (x, int(y))) for y in np.flatnonzero(dirty_row)])
         return dirty_tiles
     
-    def get_tile(self, location) -> Tile:
-        return self.tiles[location[0]][location[1]]
+    def get_tile(self, location: Location) -> Tile:
+        return Tile(self, location)
     
     def get_tiles_within_radius(self, location, radius) -> List[Tile]:
         tiles = []
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import numpy as np
+
+from obj.worldobj.resourcenode import NoResource, Oak, Cactus, AppleTree, StoneResource
+
+# Lookup tables between the id arrays and the object types they stand for, index 0 is the "nothing" entry.
+# Terrain ids come from the terrain registry instead.
+RESOURCE_NODE_TYPES: list[type] = [NoResource, Oak, Cactus, AppleTree, StoneResource]
+BUILDING_TYPES: list[type] = [type(None)]
+
+def type_id(types: list[type], obj) -> int:
+    return register_type(types, type(obj))
+
+def register_type(types: list[type], obj_type: type) -> int:
+    if obj_type not in types:
+        types.append(obj_type)
+    
+    return types.index(obj_type)
+
+# Structure-of-arrays storage for all per-tile data in the world. Every array is indexed as [x, y], like the tiles in a TileManager.
+# Chunks work on views of these arrays (see region), so writing to a chunk writes straight into the world store.
+# A store can also cover only part of the world, its origin is the world location of its [0, 0] tile.
+class TileStore:
+    def __init__(self, width: int, height: int, origin: tuple[int, int] = (0, 0)):
+        self.width = width
+        self.height = height
+        self.origin = origin
+        
+        shape = (width, height)
+        
+        self.terrain_ids = np.zeros(shape, dtype=np.uint8)
+        self.biome_ids = np.zeros(shape, dtype=np.uint8)
+        self.resource_ids = np.zeros(shape, dtype=np.uint8)
+        self.resource_amounts = np.zeros(shape, dtype=np.int32)
+        self.building_ids = np.zeros(shape, dtype=np.uint8)
+        self.pop_counts = np.zeros(shape, dtype=np.uint16)
+        self.dirty = np.ones(shape, dtype=bool)
+    
+    def region(self, x: int, y: int, width: int, height: int) -> dict[str, np.ndarray]:
+        x, y = x - self.origin[0], y - self.origin[1]
+        area = (slice(x, x + width), slice(y, y + height))
+        
+        return {
+            "terrain_ids": self.terrain_ids[area],
+            "biome_ids": self.biome_ids[area],
+            "resource_ids": self.resource_ids[area],
+            "resource_amounts": self.resource_amounts[area],
+            "building_ids": self.building_ids[area],
+            "pop_counts": self.pop_counts[area],
+            "dirty": self.dirty[area],
+        }
\ No newline at end of file
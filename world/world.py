@@ -1,11 +1,11 @@
 from __future__ import annotations
-from typing import List
+from typing import Callable, List
+from collections import OrderedDict
 
 import random
+import numpy as np
 import pygame
 
-from pathfinding.core.grid import Grid
-from pathfinding.finder.a_star import AStarFinder, DiagonalMovement
 
 from object_types import Location
 from world.terrain import Terrain, TerrainHeight
@@ -16,21 +16,28 @@ from world.chunkmanager import ChunkManager
 from managers.pop_move_manager import PopMoveManager
 from managers.pop_move_manager import pop_move_manager as PopMoveManagerInstance
 from managers.pop_manager import pop_manager as PopManager
+from managers.checkpoint_manager import checkpoint_manager
+from managers.path_request_manager import path_request_manager
 
 from obj.item import Item
 
 from obj.worldobj.resourcenode import NoResource, ResourceNode
 
-from .generator import MapGenerator
+from .generator import MapGenerator, MapRequest, generate_maps
 from .tile import Tile
+from .tilestore import TileStore
+from .resourceindex import resource_index
+from .pathfinder import grid_pathfinder
+from .hierarchicalpathfinder import hierarchical_pathfinder
+from .components import connected_components
+from .distancefield import DistanceField
+from .classification import BIOME_TYPES, classify_terrain, classify_biome_types
 from .chunk import Chunk
 
 from utils.tilerenderer import TileRenderer
 from utils.renderoutput import RenderOutput
 from utils.rendertype import MapRenderType
 
-from path.path import Path
-from path.popmove import PopMove
 
 from utils.logger import Logger
 
@@ -40,27 +47,82 @@ from observer import RenderableObserver
 
 from .map_gen_method import MapGenerationMethod
 
+WATER_TERRAIN_IDS = terrain_registry.ids_of(Ocean, ShallowCoastalWater)
+
 # Longterm TODO: Make singleton possible with multiple 'Worlds'
 class World(RenderableObserver):
     width: int
     height: int
     seed: int
     pop_move_manager: PopMoveManager
+    tile_store: TileStore|None
     terrain: List[float]
     temperature: List[float] = []
     biomes: List[float] = []
+    resource_density: List[float] = []
     font: pygame.Font
     
+    # Paths are searched in the box around start and target grown by this many tiles, a detour further out than that is not worth the search
+    path_search_padding: int = 8
+    
+    # Whether grid searches use jump points by default, see GridPathfinder.search_jump_points.
+    # Generated terrain changes cost every few tiles, where jump points expand about as many nodes as plain A* and take a little longer, see benchmarks/path_search.py.
+    jump_point_search: bool = False
+    
+    # A grid search gives up after expanding this many nodes, or once every path it has left would cost more than max_path_cost (None for no limit).
+    # A search that gave up still moves the pop closer: it gets the path to the tile the search found closest to the target, which is not cached.
+    max_path_search_nodes: int|None = 4096
+    max_path_cost: float|None = None
+    
+    # Paths to a target this many chunks away or further are planned over chunk portals first, see HierarchicalPathfinder
+    hierarchical_path_chunk_distance: int = 2
+    
+    # A portal search gives up after expanding this many portals, or like a grid search once its paths would cost more than max_path_cost.
+    # Expanding a portal can generate the chunks around it, which in lazy worlds is what a target that can not be reached would otherwise do to the whole world.
+    max_portal_search_nodes: int|None = 1024
+    
+    # Number of paths kept in the path cache, the least recently used path is dropped first
+    max_cached_paths: int = 2048
+    
+    # Number of distance fields kept, the least recently used field is dropped first
+    max_distance_fields: int = 32
+    
+    # A distance field is only computed for a set of goal locations asked for this many times. Before that, find_closest_location takes
+    # the closest candidate in a straight line, which costs nothing for the many goal sets that are only asked for once.
+    distance_field_min_requests: int = 2
+    
+    # A distance field covers the box spanned by the pop asking for it and the goals, grown by this many tiles on every side
+    distance_field_padding: int = 8
+    
     def __init__(self):
         if hasattr(self, "terrain"): raise ValueError("Somehow got initialized twice")
         self.chunk_manager = ChunkManager(world=self)
-        self.pathfinder = AStarFinder(diagonal_movement=DiagonalMovement.always)
-        self.pathfinder_prepped = False
+        self.pathing_cost_table = None
         self.render_mode = None
         
         self.logger = Logger("world", logger_manager)
         
-        self.paths = {}
+        # Path cache: (start, target) -> locations of the path as an (n, 2) array, in least recently used order
+        self.paths: OrderedDict[tuple[Location, Location], np.ndarray] = OrderedDict()
+        # Chunk coordinates -> keys of the cached paths that go through the chunk
+        self.path_chunks: dict[Location, set[tuple[Location, Location]]] = {}
+        
+        self.path_cache_hits = 0
+        self.path_cache_misses = 0
+        
+        # Distance fields by their set of goal locations, in least recently used order
+        self.distance_fields: OrderedDict[frozenset[Location], DistanceField] = OrderedDict()
+        # Goal sets without a field yet -> number of times they were asked for, in least recently used order
+        self.distance_field_requests: OrderedDict[frozenset[Location], int] = OrderedDict()
+        
+        # A cached path is dropped as soon as the cost of a tile in one of its chunks changes
+        grid_pathfinder.change_listeners.append(self.invalidate_paths)
+        # A distance field is dropped as soon as the cost of a tile in its box changes
+        grid_pathfinder.change_listeners.append(self.invalidate_distance_fields)
+    
+    def __reduce__(self):
+        # Pickled references to the world (from pops, goals and actions) load as the running world
+        return "world"
     
     def get_size(self):
         return (self.width, self.height)
@@ -84,47 +146,86 @@ class World(RenderableObserver):
     def prepare(self):
         # Placeholder for any setup that needs to be done before the simulation starts
         self.logger.debug("Preparing world", printMessage=True)
-        self.logger.debug("Generating terrain map", printMessage=True)
-        self.generate_terrain()
-        self.logger.debug("Generating temperature map", printMessage=True)
-        self.generate_temperature()
+        resource_index.reset(self.width, self.height, self.chunk_size)
+        grid_pathfinder.reset(self.width, self.height, self.get_pathing_cost_table(), cost_loader=self.load_pathing_costs if self.chunk_manager.lazy else None)
+        hierarchical_pathfinder.reset(self.chunk_size)
+        connected_components.reset()
+        PopMoveManagerInstance.reset_tile_speeds(self.width, self.height)
+        self.clear_path_cache()
+        self.distance_fields.clear()
+        self.distance_field_requests.clear()
+        
+        if self.chunk_manager.lazy:
+            # Chunks are generated from the seed when they are first used, see generate_chunk
+            self.logger.debug("Initializing lazy chunk manager", printMessage=True)
+            self.tile_store = None
+            self.map_requests = [self.get_terrain_map_request(), self.get_temperature_map_request(), self.get_resource_density_map_request()]
+            self.chunk_manager.initialize_chunks()
+            return
+        
+        self.logger.debug("Generating terrain, temperature and resource density maps", printMessage=True)
+        self.generate_noise_maps()
         
         self.logger.debug("Initializing chunk manager", printMessage=True)
+        self.tile_store = TileStore(self.width, self.height)
         self.chunk_manager.initialize_chunks()
         
         self.logger.debug("Generating map", printMessage=True)
         self.generate_map()
+        grid_pathfinder.set_region((0, 0), self.tile_store.terrain_ids, self.tile_store.building_ids)
         self.logger.debug("Generating resource nodes", printMessage=True)
         self.generate_resourcenodes()
     
+    def get_terrain_map_request(self) -> MapRequest:
+        return MapRequest(MapGenerator(seed=self.seed, impl=MapGenerationMethod.CONCURRENT), total_map_size=(self.height, self.width), chunk_size=self.chunk_size, octaves=5, name="terrain")
+    
+    def get_temperature_map_request(self) -> MapRequest:
+        return MapRequest(MapGenerator(seed=self.seed + 1, impl=MapGenerationMethod.CONCURRENT), total_map_size=(self.height, self.width), chunk_size=self.chunk_size, octaves=3, name="temperature")
+    
+    def get_resource_density_map_request(self) -> MapRequest:
+        # One value per chunk
+        return MapRequest(MapGenerator(seed=self.seed + 2, impl=MapGenerationMethod.CONCURRENT), total_map_size=(self.width // self.chunk_size, self.height // self.chunk_size), chunk_size=1, octaves=5, name="resource_density")
+    
+    def generate_noise_maps(self):
+        # All three maps share one worker pool
+        self.terrain, self.biomes, self.resource_density = generate_maps([self.get_terrain_map_request(), self.get_temperature_map_request(), self.get_resource_density_map_request()])
+    
     def generate_terrain(self):
-        self.terrain = MapGenerator(seed=self.seed, impl=MapGenerationMethod.CONCURRENT).generate_map(total_map_size=(self.height, self.width), chunk_size=self.chunk_size, octaves=5, name="terrain")
+        self.terrain = generate_maps([self.get_terrain_map_request()])[0]
 
     def generate_temperature(self):
-        self.biomes = MapGenerator(seed=self.seed + 1, impl=MapGenerationMethod.CONCURRENT).generate_map(total_map_size=(self.height, self.width), chunk_size=self.chunk_size, octaves=3, name="temperature")
+        self.biomes = generate_maps([self.get_temperature_map_request()])[0]
+    
+    # Map values are stored as float32, round them back to the one decimal they were generated with before comparing them to thresholds one by one
+    def get_map_value(self, map_data, x, y) -> float:
+        return round(float(map_data[y * self.width + x]), 1)
+    
+    def get_map_array(self, map_data) -> np.ndarray:
+        # Generated maps are stored row by row (index y * width + x), turn them into an [x, y] array like the tile store
+        return np.asarray(map_data).reshape(self.height, self.width).T
     
     def get_terrain_obj_at(self, x, y) -> Terrain:
-        terrain_value = self.terrain[y * self.width + x]
+        terrain_value = self.get_map_value(self.terrain, x, y)
         
         if terrain_value < TerrainHeight.SHALLOW_COASTAL_WATER:
-            return Ocean()
+            return terrain_registry.get(Ocean)
         elif terrain_value >= TerrainHeight.SHALLOW_COASTAL_WATER and terrain_value < TerrainHeight.LAND:
-            return ShallowCoastalWater()
+            return terrain_registry.get(ShallowCoastalWater)
         elif terrain_value >= TerrainHeight.LAND and terrain_value < TerrainHeight.HILLS:
-            return Plains()
+            return terrain_registry.get(Plains)
         elif terrain_value >= TerrainHeight.HILLS and terrain_value < TerrainHeight.MOUNTAIN:
-            return Hills()
+            return terrain_registry.get(Hills)
         elif terrain_value >= TerrainHeight.MOUNTAIN and terrain_value < TerrainHeight.MOUNTAIN_PEAK:
-            return Mountain()
+            return terrain_registry.get(Mountain)
         elif terrain_value >= TerrainHeight.MOUNTAIN_PEAK:
-            return MountainPeak()
+            return terrain_registry.get(MountainPeak)
         else:
             self.logger.debug("Invalid terrain value: " + str(terrain_value))
-            return Unland()
+            return terrain_registry.get(Unland)
     
     def get_biome_type_at(self, x, y) -> BiomeType:
-        land_height = self.terrain[y * self.width + x]
-        temperature = self.biomes[y * self.width + x]
+        land_height = self.get_map_value(self.terrain, x, y)
+        temperature = self.get_map_value(self.biomes, x, y)
         
         if land_height > TerrainHeight.LAND and temperature < Temperature.COLD:
             return BiomeType.ARCTIC
@@ -137,13 +238,13 @@ class World(RenderableObserver):
     
     def get_biome(self, biome_type: BiomeType):
         if biome_type == BiomeType.ARCTIC:
-            return Tundra()
+            return terrain_registry.get(Tundra)
         elif biome_type == BiomeType.TEMPERATE:
-            return Plains()
+            return terrain_registry.get(Plains)
         elif biome_type == BiomeType.TROPICAL:
-            return Plains()
+            return terrain_registry.get(Plains)
         elif biome_type == BiomeType.DESERT:
-            return Desert()
+            return terrain_registry.get(Desert)
         else:
             self.logger.debug("Invalid biome type: " + biome_type)
             return None
@@ -152,118 +253,155 @@ class World(RenderableObserver):
         # Placeholder for getting harvestable resources
         return None
     
+    def get_chunk_resource_density(self, chunk: Chunk) -> float:
+        # Chunk's location in world
+        chunk_x = int(chunk.location[0] / self.chunk_size)
+        chunk_y = int(chunk.location[1] / self.chunk_size)
+        
+        if self.chunk_manager.lazy:
+            # The density map is indexed chunk_x * rows + chunk_y, so the chunk's x is the map's row
+            resource_density = self.map_requests[2].generate_chunk((chunk_y, chunk_x))[0, 0]
+        else:
+            resource_map_coordinate = chunk_x * int(self.height / self.chunk_size) + chunk_y
+            resource_density = self.resource_density[resource_map_coordinate]
+        
+        # Density of chunk
+        return (round(float(resource_density), 1) + 1) / 2
+    
     def generate_resourcenodes(self):
         chunks = self.chunk_manager.chunks
         
-        resource_density_map = MapGenerator(seed=self.seed + 2, impl=MapGenerationMethod.CONCURRENT).generate_map(total_map_size=(len(chunks), len(chunks[0])), chunk_size=1, octaves=5, name="resource_density")
         # resource_type_map = MapGenerator(seed=self.seed + 3, impl=MapGenerationMethod.ASYNC).generate_map((len(chunks), len(chunks[0])), octaves=4, name="resource_type")
         
+        resources_added = {}
+        failed_adding = 0
+        
+        # Create resource nodes
+        for chunk_row in chunks:
+            for chunk in chunk_row:
+                failed_adding += self.generate_chunk_resourcenodes(chunk, random, resources_added)
+        
+        if failed_adding > 0:
+            self.logger.debug("Failed adding resources:", failed_adding)
+    
+    # Adds resource nodes to one chunk, drawing from rng (the random module or a random.Random). Returns the number of nodes that could not be added.
+    def generate_chunk_resourcenodes(self, chunk: Chunk, rng, resources_added: dict) -> int:
         max_resource_per_chunk = 5 # TODO: Make this variable
         resources_amount_to_add = 0
         
         max_attempts = 100
         
-        resources_added = {}
+        failed_adding = 0
         
-        # Create resource nodes
-        for chunk_row in chunks:
-            for chunk in chunk_row:
-                # Chunk's location in world
-                chunk_x = int(chunk.location[0] / self.chunk_size)
-                chunk_y = int(chunk.location[1] / self.chunk_size)
+        density = self.get_chunk_resource_density(chunk)
+        
+        # If the chunk has enough resource density, add resources
+        # TODO: Make this variable
+        # TODO: Make this a function of the biome
+        if density > 0.15:
+            # Resource count is determined by the density of the chunk, scale 0 to 2 to get 0 to max_resource_per_chunk
+            resources_amount_to_add = max_resource_per_chunk * density * 4
+            
+            tile_manager = chunk.tile_manager
+            
+            attempts = 0
+            
+            # Add resources to the chunk
+            while int(resources_amount_to_add) > 0:
+                attempts += 1
                 
-                resource_map_coordinate = chunk_x * int(self.height / self.chunk_size) + chunk_y
-                # Density of chunk
-                density = (resource_density_map[resource_map_coordinate] + 1) / 2
+                if attempts > max_attempts:
+                    self.logger.debug("Failed adding resources after %s attempts" % str(attempts))
+                    break
+                # Resource type to spawn in chunk, currently arbitrary
+                # resource = Oak() if density > 0 else StoneResource()
                 
-                # If the chunk has enough resource density, add resources
-                # TODO: Make this variable
-                # TODO: Make this a function of the biome
-                if density > 0.15:
-                    # Resource count is determined by the density of the chunk, scale 0 to 2 to get 0 to max_resource_per_chunk
-                    resources_amount_to_add = max_resource_per_chunk * density * 4
-                    
-                    failed_adding = 0
-                    
-                    tile_manager = chunk.tile_manager
-                    
-                    attempts = 0
-                    
-                    # Add resources to the chunk
-                    while int(resources_amount_to_add) > 0:
-                        attempts += 1
-                        
-                        if attempts > max_attempts:
-                            self.logger.debug("Failed adding resources after %s attempts" % str(attempts))
-                            break
-                        # Resource type to spawn in chunk, currently arbitrary
-                        # resource = Oak() if density > 0 else StoneResource()
-                        
-                        # Random location in chunk
-                        resource_x = random.randint(0, chunk.size - 1)
-                        resource_y = random.randint(0, chunk.size - 1)
-                        
-                        tile = tile_manager.get_tile((resource_x, resource_y))
-                        
-                        if type(tile.resourcenode) is not type(NoResource()):
-                            # If the tile already has a resource node, skip this tile
-                            continue
-                        
-                        if len(tile.terrain.possible_resources) == 0:
-                            # If the terrain does not have any possible resources, skip this tile
-                            resources_amount_to_add = 0
-                            continue
-                        
-                        resource = tile.terrain.possible_resources[random.randint(0, len(tile.terrain.possible_resources) - 1)] if density > 0 else None
-                        
-                        if resource is None:
-                            continue
-                        
-                        added_resource = tile.resourcenode = resource()
-                        
-                        if resources_added.get(resource().name) is None:
-                            resources_added[resource().name] = 1
-                        else:
-                            resources_added[resource().name] += 1
-                        
-                        if added_resource:
-                            resources_amount_to_add -= 1
-                        else:
-                            # If the resource node could not be added, try again
-                            failed_adding += 1
-                            continue
+                # Random location in chunk
+                resource_x = rng.randint(0, chunk.size - 1)
+                resource_y = rng.randint(0, chunk.size - 1)
+                
+                tile = tile_manager.get_tile((resource_x, resource_y))
+                
+                if tile.has_resourcenode():
+                    # If the tile already has a resource node, skip this tile
+                    continue
+                
+                if len(tile.terrain.possible_resources) == 0:
+                    # If the terrain does not have any possible resources, skip this tile
+                    resources_amount_to_add = 0
+                    continue
+                
+                resource = tile.terrain.possible_resources[rng.randint(0, len(tile.terrain.possible_resources) - 1)] if density > 0 else None
+                
+                if resource is None:
+                    continue
+                
+                added_resource = tile.resourcenode = resource()
+                
+                if resources_added.get(resource().name) is None:
+                    resources_added[resource().name] = 1
+                else:
+                    resources_added[resource().name] += 1
+                
+                if added_resource:
+                    resources_amount_to_add -= 1
+                else:
+                    # If the resource node could not be added, try again
+                    failed_adding += 1
+                    continue
         
-        if failed_adding > 0:
-            self.logger.debug("Failed adding resources:", failed_adding)
+        return failed_adding
 
     def generate_animals(self):
         # TODO
         pass
     
+    def get_biome_terrain_ids(self) -> np.ndarray:
+        # Terrain id of every biome type, in the order classify_biome_types numbers them
+        return np.array([self.get_biome(biome_type).id for biome_type in BIOME_TYPES], dtype=np.uint8)
+    
+    # Generates a single chunk from the seed, used instead of generate_map and generate_resourcenodes when chunks are lazy.
+    # Terrain and biomes match the eagerly generated world, resource nodes come from a random generator of the chunk's own so they do not depend on the order chunks are loaded in.
+    def generate_chunk(self, chunk: Chunk):
+        chunk.initialise()
+        chunk.register_observer(self)
+        
+        terrain_request, temperature_request, _ = self.map_requests
+        
+        height_map = terrain_request.generate_chunk(chunk.location)
+        temperature_map = temperature_request.generate_chunk(chunk.location)
+        
+        tile_manager = chunk.tile_manager
+        tile_manager.terrain_ids[:] = classify_terrain(height_map)
+        tile_manager.biome_ids[:] = self.get_biome_terrain_ids()[classify_biome_types(height_map, temperature_map)]
+        
+        rng = random.Random("%s_%s_%s" % (self.seed, chunk.location[0], chunk.location[1]))
+        self.generate_chunk_resourcenodes(chunk, rng, {})
+        
+        # A chunk that was changed before the last checkpoint comes back as it was saved
+        checkpoint_manager.restore_chunk(self, chunk)
+        
+        grid_pathfinder.set_region(chunk.location, tile_manager.terrain_ids, tile_manager.building_ids)
+        
+        tile_manager.mark_generated()
+    
     # Generate map 2d array that implements terrain and biome maps and adds trees and animals
     def generate_map(self):
         chunk_manager = self.chunk_manager
+        tile_store = self.tile_store
         
         self.logger.debug("Generating map chunks")
-        for x in range(self.width):
-            for y in range(self.height):
-                chunk = None
-                if chunk_manager.has_chunk_at((x, y)) == False:
-                    chunk = Chunk(location=(x, y), size=self.chunk_size).initialise()
-                    chunk.register_observer(self)
-                    chunk_manager.add_chunk(chunk)
-                    
-                else:
-                    chunk = chunk_manager.get_chunk_at((x, y))
-                tile_manager = chunk.tile_manager
-                new_tile = Tile(
-                    location=(x, y),
-                    local_coordinates=(x % self.chunk_size, y % self.chunk_size),
-                    terrain=self.get_terrain_obj_at(x, y),
-                    biome=self.get_biome(self.get_biome_type_at(x, y))
-                )
-                new_tile.register_observer(chunk)
-                tile_manager.add_tile(new_tile)
+        for chunk_row in chunk_manager.chunks:
+            for chunk in chunk_row:
+                chunk.initialise()
+                chunk.register_observer(self)
+        
+        # Classify the whole map at once, the chunks see the result through their views on the tile store
+        height_map = self.get_map_array(self.terrain)
+        temperature_map = self.get_map_array(self.biomes)
+        
+        tile_store.terrain_ids[:] = classify_terrain(height_map)
+        tile_store.biome_ids[:] = self.get_biome_terrain_ids()[classify_biome_types(height_map, temperature_map)]
         
         # I'll turn this off for now, as it's not necessary for the current implementation, it also takes a lot of time
         # self.logger.debug("Preparing pathing tiles")
@@ -278,7 +416,7 @@ class World(RenderableObserver):
     def is_land_tile(self, location: Location) -> bool:
         tile = self.get_tile(location)
         
-        return tile.terrain != Ocean() and tile.terrain != ShallowCoastalWater()
+        return tile.terrain_id not in WATER_TERRAIN_IDS
     
     def get_closest_land_tile_location(self, location: Location) -> Location:
         distance = 1
@@ -306,16 +444,13 @@ class World(RenderableObserver):
     
     # Find a tile with the given terrain type
     def find_tiles_with_terrain(self, terrain_type) -> List[Tile]:
-        chunks = self.chunk_manager.chunks
         found_tiles = []
         
-        for chunk_row in chunks:
-            for chunk in chunk_row:
-                tiles = chunk.tile_manager.tiles
-                for tile_row in tiles:
-                    for tile in tile_row:
-                        if tile.terrain == terrain_type:
-                            found_tiles.append(tile)
+        # With lazy chunks only the chunks generated so far are searched
+        for chunk in self.chunk_manager.get_loaded_chunks():
+            tile_manager = chunk.tile_manager
+            for local_x, local_y in np.argwhere(tile_manager.terrain_ids == terrain_type.id):
+                found_tiles.append(tile_manager.get_tile((int(local_x), int(local_y))))
         
         return found_tiles
     
@@ -357,7 +492,7 @@ class World(RenderableObserver):
                         
                         resource_node = tile.resourcenode
                         
-                        if resource_node is not None and type(resource_node) is not type(NoResource()):
+                        if tile.has_resourcenode():
                             font = pygame.font.SysFont('robotoregular', 8)
                             resource_text = font.render(resource_node.harvestable_resource.name[0], True, (255, 255, 255))
                             surface.blit(resource_text, (tile.location[0] * scale, tile.location[1] * scale))
@@ -395,193 +530,239 @@ class World(RenderableObserver):
         if max_distance == 0:
             max_distance = self.width
         
-        closest_location = None
-        closest_distance = self.width
+        candidates = [location for location in location_list if self.get_distance_between(start, location) <= max_distance]
         
-        use_pathfinding = False
+        if len(candidates) == 0:
+            return None
         
-        for location in location_list:
-            if self.get_distance_between(start, location) > max_distance:
-                # self.logger.warn("Location", location, "is too far away from", start, actor=entity)
-                continue
+        # The candidate with the cheapest path, the field is shared with every other pop heading for the same locations
+        field = self.get_distance_field(candidates, start)
+        
+        if field is not None:
+            closest_location = field.get_nearest_goal(start)
+            
+            if closest_location is not None:
+                return closest_location
+        
+        # No field for these candidates yet, or none of them can be reached over the known terrain, fall back on the straight line distance
+        return min(candidates, key=lambda location: self.get_distance_between(start, location))
+    
+    # Distance field towards the given goal locations that covers start, kept until the pathing costs in its box change.
+    # None while the goals have been asked for fewer than distance_field_min_requests times.
+    def get_distance_field(self, goals: List[Location], start: Location) -> DistanceField|None:
+        key = frozenset(tuple(goal) for goal in goals)
+        
+        field = self.distance_fields.get(key)
+        if field is not None and field.contains(start):
+            self.distance_fields.move_to_end(key)
+            return field
+        
+        if field is None:
+            requests = self.distance_field_requests.pop(key, 0) + 1
             
-            if use_pathfinding:
-                path = self.pathfind(entity, location)
-                distance = len(path.moves)
+            if requests < self.distance_field_min_requests:
+                self.distance_field_requests[key] = requests
+                
+                # Remembering a goal set is cheap next to its field, a few times as many are kept
+                while len(self.distance_field_requests) > 8 * self.max_distance_fields:
+                    self.distance_field_requests.popitem(last=False)
+                
+                return None
+        
+        # A field whose box does not reach start grows to reach it, so the pops it already routes keep their paths
+        origin, width, height = self.get_distance_field_box(start, key, field)
+        
+        field = DistanceField(key)
+        field.compute(grid_pathfinder.get_cost_block(origin, width, height), origin=origin, world_size=(self.width, self.height))
+        
+        self.distance_fields[key] = field
+        self.distance_fields.move_to_end(key)
+        
+        while len(self.distance_fields) > self.max_distance_fields:
+            self.distance_fields.popitem(last=False)
+        
+        return field
+    
+    # The box spanned by start and the goals, grown by distance_field_padding, as (origin, width, height). Wraps around the world edges like paths do.
+    # With a field, the box holding the field's box and start grown by distance_field_padding, the field's box already holds the goals.
+    def get_distance_field_box(self, start: Location, goals: frozenset[Location], field: DistanceField|None = None) -> tuple[Location, int, int]:
+        padding = self.distance_field_padding
+        box = []
+        
+        for axis, size in enumerate((self.width, self.height)):
+            if field is None:
+                offsets = (np.array([goal[axis] for goal in goals]) - start[axis]) % size
+                offsets[offsets > size // 2] -= size
+                
+                low = min(0, int(offsets.min())) - padding
+                high = max(0, int(offsets.max())) + padding
             else:
-                distance = self.get_distance_between(start, location)
+                field_start, field_size = field.origin[axis], (field.width, field.height)[axis]
+                
+                # The field's box lies after start or, around the world edge, before it, whichever makes the smaller box
+                field_offset = (field_start - start[axis]) % size
+                spans = [(min(field_low, -padding), max(field_low + field_size - 1, padding)) for field_low in (field_offset, field_offset - size)]
+                low, high = min(spans, key=lambda span: span[1] - span[0])
             
-            if closest_location is None or distance < closest_distance:
-                closest_location = location
-                closest_distance = distance
+            if high - low + 1 >= size:
+                box.append((0, size))
+            else:
+                box.append(((start[axis] + low) % size, high - low + 1))
         
-        return closest_location
+        return (box[0][0], box[1][0]), box[0][1], box[1][1]
     
-    def find_tiles_with_resourcenodes_near(self, location: Location, resourcenode_type: ResourceNode, distance: int = 5) -> List[Tile]:
-        search_chunks = self.get_chunks_within_distance(location=location, distance=distance)
+    def invalidate_distance_fields(self, location: Location, width: int, height: int):
+        for key in [key for key, field in self.distance_fields.items() if field.overlaps(location, width, height)]:
+            del self.distance_fields[key]
+    
+    # The path to target along a cached distance field, if target is the nearest goal of one. None if there is no such field.
+    def find_distance_field_path(self, start: Location, target: Location) -> list[Location]|None:
+        field = self.find_distance_field(start, target)
         
-        resourcenode_tiles = []
+        return field.get_path(start) if field is not None else None
+    
+    # A cached distance field whose path from start leads to target
+    def find_distance_field(self, start: Location, target: Location) -> DistanceField|None:
+        for field in self.distance_fields.values():
+            if target in field.goals and field.get_nearest_goal(start) == target:
+                return field
         
-        for chunk in search_chunks:
-            tiles = chunk.tile_manager.tiles
-            for tiles_row in tiles:
-                for tile in tiles_row:
-                    # If the tile is within the distance, add its resource nodes to the list
-                    if abs(tile.location[0] - location[0]) <= distance and abs(tile.location[1] - location[1]) <= distance:
-                        resourcenode = tile.resourcenode
-                        
-                        if isinstance(resourcenode, type(resourcenode_type)):
-                            resourcenode_tiles.append(tile)
+        return None
+    
+    def find_tiles_with_resourcenodes_near(self, location: Location, resourcenode_type: ResourceNode, distance: int = 5) -> List[Tile]:
+        groups = resource_index.get_groups(node_type=type(resourcenode_type))
+        
+        return [self.get_tile(node_location) for _, node_location, _ in resource_index.find_within(location, distance, groups)]
+    
+    def get_resource_query(self, resource_type: Item|type) -> tuple[list[dict], Callable|None]:
+        if isinstance(resource_type, Item):
+            # An item only matches nodes that still have something to harvest
+            return (resource_index.get_groups(resource_type=type(resource_type)), lambda node: node.resource_amount > 0)
         
-        return resourcenode_tiles
+        # If the resource type is not an item, check if the resource node is a type of item
+        return (resource_index.get_groups(resource_type=resource_type), None)
     
+    # Tiles within distance on both axes, wrapping around the world edges, closest first
     def find_tiles_with_resource_near(self, location: Location, resource_type: Item, distance: int = 5) -> List[Tile]:
-        search_chunks = self.get_chunks_within_distance(location=location, distance=distance)
-        
-        resourcenode_tiles = []
-        
-        for chunk in search_chunks:
-            tiles = chunk.tile_manager.tiles
-            for tiles_row in tiles:
-                for tile in tiles_row:
-                    # If the tile is within the distance, add its resource nodes to the list
-                    if abs(tile.location[0] - location[0]) <= distance and abs(tile.location[1] - location[1]) <= distance:
-                        if tile.resourcenode is not None:
-                            if isinstance(resource_type, Item):
-                                if isinstance(tile.resourcenode.harvestable_resource, type(resource_type)):
-                                    if tile.resourcenode.resource_amount > 0:
-                                        resourcenode_tiles.append(tile)
-                                    # resourcenode_tiles.append(tile)
-                            else:
-                                # If the resource type is not an item, check if the resource node is a type of item
-                                if isinstance(tile.resourcenode.harvestable_resource, resource_type):
-                                    resourcenode_tiles.append(tile)
-        
-        return resourcenode_tiles
-    
-    def pathfind_pop(self, pop, target_location: Location):
-        # Generate the chunk grid if it's not already generated
-        chunkgrid = self.get_chunk_based_pathing_grid()
-        
-        # Create a grid object for the pathfinder
-        chunkgrid_nodes = Grid(width=len(chunkgrid[0]), height=len(chunkgrid), matrix=chunkgrid, grid_id=1)
-        
-        # Find a path between the pop's location and the target location
-        chunk_nodepath = self.pathfind(pop, target_location, grid=chunkgrid_nodes)
-        
-        path = Path(pop)
-    
-    def pathfind(self, pop, target_location: Location, grid=None):
-        if grid is None:
-            grid, offsets = self.prep_pathfinder(pop.location, target_location)
-        
-        nodepath = None
-        
-        while nodepath is None:
-            try:
-                start_node = ((pop.location[0] - offsets[0]) % self.width, (pop.location[1] - offsets[1]) % self.width)
-                end_node = ((target_location[0] - offsets[0]) % self.height, (target_location[1] - offsets[1]) % self.height)
-                nodepath, runs = self.pathfinder.find_path(start=grid.node((pop.location[0] - offsets[0]) % self.width, (pop.location[1] - offsets[1]) % self.width), end=grid.node((target_location[0] - offsets[0]) % self.height, (target_location[1] - offsets[1]) % self.height), graph=grid)
-            except Exception as e:
-                self.logger.debug("Error finding path:", e, actor=pop)
-        
-        self.logger.debug("Created path from", pop.location, "to tile:", target_location, "with length:", len(nodepath), actor=pop)
-        
-        path = Path(pop)
-        
-        for node in nodepath:
-            x = node.x + offsets[0]
-            y = node.y + offsets[1]
-            
-            move = PopMove(pop, self.get_tile((x, y)))
-            path.add_move(move)
+        groups, condition = self.get_resource_query(resource_type)
         
-        return path
+        return [self.get_tile(node_location) for _, node_location, _ in resource_index.find_within(location, distance, groups, condition)]
     
-    def prep_pathfinder(self, start_location: Location, target_location: Location):
-        # Padding to make sure the pathfinder can find a path to the target
-        padding = 4
+    # The count tiles closest to location (Manhattan distance, wrapping around the world edges), closest first
+    def find_nearest_tiles_with_resource(self, location: Location, resource_type: Item, count: int = 1, max_distance: int|None = None) -> List[Tile]:
+        groups, condition = self.get_resource_query(resource_type)
         
-        # The grid is created based off the start and target location compared to the actual 0,0 location, determine the offset between the two
-        # The offset is based on the location closest to the 0,0 location
+        return [self.get_tile(node_location) for _, node_location, _ in resource_index.find_nearest(location, count, groups, max_distance, condition)]
+    
+    # Locations of the path from start to target as an (n, 2) array, both included, from the path cache if possible.
+    # jump_points picks the grid search for this query, None uses jump_point_search.
+    def find_path_locations(self, start: Location, target: Location, jump_points: bool|None = None) -> np.ndarray:
+        key = (tuple(start), tuple(target))
         
-        # If the difference is larger than self.width / 2 or self.height / 2, the offset is the location farthest from the 0,0 location (- padding)
-        # because we are wrapping around the world
-        if abs(start_location[0] - target_location[0]) > self.width / 2:
-            # Wrapping around, so pick the location farthest from the 0,0 location
-            offset_x = max(start_location[0], target_location[0]) - padding
-            grid_width = padding*2 + self.width - abs(start_location[0] - target_location[0])
-        else:
-            # No wrapping, pick the closest location to the 0,0 location
-            offset_x = min(start_location[0], target_location[0]) - padding
-            grid_width = padding*2 + abs(start_location[0] - target_location[0])
-        
-        if abs(start_location[1] - target_location[1]) > self.height / 2:
-            # Wrapping around, so pick the location farthest from the 0,0 location
-            offset_y = max(start_location[1], target_location[1]) - padding
-            grid_height = padding*2 + self.height - abs(start_location[1] - target_location[1])
-        else:
-            # No wrapping, pick the closest location to the 0,0 location
-            offset_y = min(start_location[1], target_location[1]) - padding
-            grid_height = padding*2 + abs(start_location[1] - target_location[1])
+        # Start and target in different components answer without a search
+        if not connected_components.is_reachable(start, target):
+            return np.zeros((0, 2), dtype=np.int32)
         
-        offsets = (offset_x % self.width, offset_y % self.height)
+        locations = self.paths.get(key)
+        if locations is not None:
+            self.path_cache_hits += 1
+            self.paths.move_to_end(key)
+            return locations
         
-        gridnodes = [[1 for j in range(grid_width)] for i in range(grid_height)]
+        self.path_cache_misses += 1
         
-        chunk_tiles = {}
+        # Following a distance field is cheaper than any search
+        locations = self.find_distance_field_path(start, target)
         
-        # Make the tiles around the target location passable and adjust the value based on the tile's speed multiplier
-        for x in range(grid_height):
-            for y in range(grid_width):
-                global_x = (start_location[0] + x) % self.width
-                global_y = (start_location[1] + y) % self.height
-                
-                if chunk_tiles.get((global_x // self.chunk_size, global_y // self.chunk_size)) is None:
-                    chunk = self.chunk_manager.get_chunk_at((global_x, global_y))
-                    chunk_tiles[(global_x // self.chunk_size, global_y // self.chunk_size)] = chunk.tile_manager.tiles
-                
-                chunk_x = global_x // self.chunk_size
-                chunk_y = global_y // self.chunk_size
-                
-                local_x = global_x % self.chunk_size
-                local_y = global_y % self.chunk_size
-                
-                tile = chunk_tiles[(chunk_x, chunk_y)][local_x][local_y]
-                
-                if tile.terrain is Ocean() or tile.terrain is ShallowCoastalWater():
-                    pathing_prio = 1000
-                else:
-                    pathing_prio = (1 / tile.terrain.speed_multiplier if tile.terrain.speed_multiplier > 0 else 0)
-                
-                gridnodes[x][y] = pathing_prio
+        if locations is None:
+            if self.uses_hierarchical_path(start, target):
+                locations = hierarchical_pathfinder.find_path(start, target, max_nodes=self.max_portal_search_nodes, max_cost=self.max_path_cost, partial=True)
+            else:
+                locations = grid_pathfinder.find_path(
+                    start, target, padding=self.path_search_padding, jump_points=self.jump_point_search if jump_points is None else jump_points,
+                    max_nodes=self.max_path_search_nodes, max_cost=self.max_path_cost, partial=True
+                )
         
-        grid = Grid(width=len(gridnodes), height=len(gridnodes[0]), matrix=gridnodes, grid_id=0)
+        locations = np.array(locations, dtype=np.int32).reshape((-1, 2))
         
-        self.pathfinder_prepped = True
+        if self.is_full_path(locations, target):
+            self.add_cached_path(key, locations)
         
-        return grid, offsets
+        return locations
     
-    def get_chunk_based_pathing_grid(self):
-        chunks = self.chunk_manager.chunks
+    # Whether locations lead all the way to target. A target that can not be reached is searched again next time,
+    # nothing on the path tells when that changes, and a partial path from a search that gave up is no path to cache.
+    def is_full_path(self, locations: np.ndarray, target: Location) -> bool:
+        return len(locations) > 0 and tuple(locations[-1].tolist()) == tuple(target)
+    
+    def uses_hierarchical_path(self, start: Location, target: Location) -> bool:
+        return hierarchical_pathfinder.get_chunk_distance(start, target) >= self.hierarchical_path_chunk_distance
+    
+    # Whether find_path_locations would run a grid search for this path, rather than use the cache, a distance field or the portal graph
+    def needs_grid_search(self, start: Location, target: Location) -> bool:
+        if (tuple(start), tuple(target)) in self.paths or not connected_components.is_reachable(start, target):
+            return False
         
-        grid = []
+        return self.find_distance_field(start, target) is None and not self.uses_hierarchical_path(start, target)
+    
+    def get_path_chunks(self, locations: np.ndarray) -> list[Location]:
+        return [(chunk_x, chunk_y) for chunk_x, chunk_y in np.unique(locations // self.chunk_size, axis=0).tolist()]
+    
+    def add_cached_path(self, key: tuple[Location, Location], locations: np.ndarray):
+        self.paths[key] = locations
         
-        for chunk_row in chunks:
-            grid_row = []
-            for chunk in chunk_row:
-                average_cost = chunk.get_average_pathing_cost()
-                
-                # If the pathing cost is too high, make the chunk impassable, to ease up on the pathfinding calculations
-                grid_row.append(average_cost)
-                # grid_row.append(1 if average_cost < 4 else 0)
-            grid.append(grid_row)
+        for chunk in self.get_path_chunks(locations):
+            self.path_chunks.setdefault(chunk, set()).add(key)
+        
+        while len(self.paths) > self.max_cached_paths:
+            self.remove_cached_path(next(iter(self.paths)))
+    
+    def remove_cached_path(self, key: tuple[Location, Location]):
+        locations = self.paths.pop(key)
         
-        return grid
+        for chunk in self.get_path_chunks(locations):
+            keys = self.path_chunks[chunk]
+            keys.discard(key)
+            
+            if len(keys) == 0:
+                del self.path_chunks[chunk]
+    
+    def invalidate_paths(self, location: Location, width: int, height: int):
+        if len(self.path_chunks) == 0:
+            return
+        
+        for chunk_x in range(location[0] // self.chunk_size, (location[0] + width - 1) // self.chunk_size + 1):
+            for chunk_y in range(location[1] // self.chunk_size, (location[1] + height - 1) // self.chunk_size + 1):
+                for key in list(self.path_chunks.get((chunk_x, chunk_y), [])):
+                    self.remove_cached_path(key)
+    
+    def clear_path_cache(self):
+        self.paths.clear()
+        self.path_chunks = {}
+    
+    # Generates the chunk holding location, which fills in the pathing costs of its tiles
+    def load_pathing_costs(self, location: Location):
+        self.chunk_manager.load_chunk(location[0] // self.chunk_size, location[1] // self.chunk_size)
+    
+    def get_pathing_cost_table(self) -> np.ndarray:
+        # Pathing cost per terrain id, water is made very expensive and impassable terrain gets a cost of 0
+        if self.pathing_cost_table is None:
+            speed_multipliers = terrain_registry.speed_multipliers()
+            
+            pathing_costs = np.zeros(len(speed_multipliers))
+            np.divide(1, speed_multipliers, out=pathing_costs, where=speed_multipliers > 0)
+            pathing_costs[list(WATER_TERRAIN_IDS)] = 1000
+            
+            self.pathing_cost_table = pathing_costs
+        
+        return self.pathing_cost_table
     
     def update(self):
         PopManager.update()
         
+        # Paths the pops asked for during their update are planned together, before anyone moves
+        path_request_manager.solve(self)
+        
         PopMoveManagerInstance.handle_moves()
 
 world = World()
\ No newline at end of file